@@ -12,6 +12,7 @@ from typing import Optional
 from discord import VoiceClient
 
 from db import get_event_channel
+from matchup import win_probability
 from utils import resolve_display_data 
 
 SOUNDS_DIR = None
@@ -66,9 +67,10 @@ async def send_killstreak_announcement(
     killer: str,
     streak_count: int,
     guild: Optional[discord.Guild] = None,
-    event_id: Optional[int] = None
+    event_id: Optional[int] = None,
+    victim: Optional[str] = None
 ):
-    """📣 Announcement about killstreaks (double kill, triple kill, etc.)"""
+    """📣 Announcement about killstreaks (double kill, triple kill, etc.), with the odds of the kill if victim is given"""
 
     logging.info(f"[KILLSTREAK] called for killer={killer}, streak={streak_count}, event_id={event_id}")
 
@@ -108,6 +110,12 @@ async def send_killstreak_announcement(
     # Title by fixed map; fallback to generic if missing
     title = KILLSTREAK_TITLES.get(streak_count, f"🔥 {streak_count} KILL STREAK!")
     description = f"**{name.upper()}** is on a killstreak: `{streak_count}`"
+    if victim:
+        try:
+            # ratings are read before this kill is recorded: the odds the killer had going in
+            description += f"\n🎲 Expected to beat **{victim}**: `{win_probability(killer, victim, event_id):.0%}`"
+        except Exception as e:
+            logging.warning(f"[KILLSTREAK] ⚠️ Could not compute win probability {killer} vs {victim}: {e}")
     embed = discord.Embed(title=title, description=description, color=color)
     if avatar_url:
         embed.set_thumbnail(url=avatar_url)
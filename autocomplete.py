@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+# autocomplete.py
+#
+# Autocomplete for the character, @user and event options of the slash commands. Names are kept in
+# sorted in-memory prefix indexes: every known character, the characters of each event (loaded on
+# first use), the events, and the members of each guild. Frags, links and new events keep them
+# current through db.add_change_listener, member events through main.py. A lookup is a binary
+# search plus at most MAX_CHOICES steps, so it answers well inside Discord's 3 s budget.
+
+import asyncio
+import threading
+
+from bisect import bisect_left
+from typing import Hashable, Iterable, Optional
+
+import discord
+from discord import app_commands, Interaction
+
+from db import (
+    add_change_listener, get_character_names, get_event_character_names, list_event_ids, get_setting
+)
+
+MAX_CHOICES = 25  # Discord's limit per autocomplete response
+
+class PrefixIndex:
+    """Sorted (key, value) pairs; search() returns the values of the keys starting with a prefix."""
+
+    def __init__(self, items: Iterable[tuple[str, Hashable]] = ()):
+        self._items = sorted(set(items))
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, key: str, value: Hashable):
+        item = (key, value)
+        i = bisect_left(self._items, item)
+        if i == len(self._items) or self._items[i] != item:
+            self._items.insert(i, item)
+
+    def discard(self, key: str, value: Hashable):
+        item = (key, value)
+        i = bisect_left(self._items, item)
+        if i < len(self._items) and self._items[i] == item:
+            del self._items[i]
+
+    def search(self, prefix: str, limit: int = MAX_CHOICES) -> list:
+        # (prefix,) sorts before every (key, value) whose key starts with prefix
+        values = []
+        items = self._items
+        i = bisect_left(items, (prefix,))
+        while i < len(items) and len(values) < limit and items[i][0].startswith(prefix):
+            if items[i][1] not in values:
+                values.append(items[i][1])
+            i += 1
+        return values
+
+def names_index(names: Iterable[str]) -> PrefixIndex:
+    return PrefixIndex((name, name) for name in names)
+
+# --- Indexes ---
+# Built on first use in a worker thread; the change listener may run in one too (imports, replays)
+
+_lock = threading.Lock()
+_characters: Optional[PrefixIndex] = None           # every character
+_event_characters: dict[int, PrefixIndex] = {}      # event_id -> characters with frags in it
+_events: Optional[dict[str, int]] = None            # event name -> id
+_event_names: Optional[PrefixIndex] = None
+_members: dict[int, PrefixIndex] = {}               # guild_id -> (lowercased name, member id)
+
+async def _all_characters() -> PrefixIndex:
+    global _characters
+    if _characters is None:
+        index = names_index(await asyncio.to_thread(get_character_names))
+        with _lock:
+            if _characters is None:
+                _characters = index
+    return _characters
+
+async def _characters_of(event_id: int) -> PrefixIndex:
+    index = _event_characters.get(event_id)
+    if index is None:
+        index = names_index(await asyncio.to_thread(get_event_character_names, event_id))
+        with _lock:
+            index = _event_characters.setdefault(event_id, index)
+    return index
+
+async def _event_index() -> tuple[dict[str, int], PrefixIndex]:
+    global _events, _event_names
+    if _events is None:
+        events = {name: event_id for event_id, name in await asyncio.to_thread(list_event_ids)}
+        with _lock:
+            _events, _event_names = events, names_index(events)
+    return _events, _event_names
+
+def _member_keys(member: discord.Member) -> set[str]:
+    return {name.lower() for name in (member.display_name, member.name) if name}
+
+def _member_index(guild: discord.Guild) -> PrefixIndex:
+    index = _members.get(guild.id)
+    if index is None:
+        index = _members[guild.id] = PrefixIndex(
+            (key, member.id) for member in guild.members for key in _member_keys(member)
+        )
+    return index
+
+# --- Keeping them current ---
+
+def _on_change(kind: str, event_id: Optional[int] = None, characters: Optional[list[str]] = None):
+    global _characters, _events, _event_names
+    with _lock:
+        if kind in ("frag", "owners") and characters is not None:
+            for name in characters:
+                name = name.lower()
+                if _characters is not None:
+                    _characters.add(name, name)
+                if kind == "frag" and event_id in _event_characters:
+                    _event_characters[event_id].add(name, name)
+        elif kind == "owners" or kind == "event":
+            # links replaced or frags imported: reload on next use
+            _characters = None
+            if kind == "event":
+                if event_id is None:
+                    _event_characters.clear()
+                else:
+                    _event_characters.pop(event_id, None)
+        elif kind == "events":
+            _events = _event_names = None
+
+add_change_listener(_on_change)
+
+def member_changed(before: Optional[discord.Member], after: Optional[discord.Member]):
+    """A member joined (before=None), left (after=None) or changed their names (main.py)."""
+    member = after or before
+    index = _members.get(member.guild.id)
+    if index is None:
+        return
+    if before is not None:
+        for key in _member_keys(before):
+            index.discard(key, before.id)
+    if after is not None:
+        for key in _member_keys(after):
+            index.add(key, after.id)
+
+def user_changed(before: discord.User, after: discord.User):
+    """A user's username or global name changed: their entries in every guild index (main.py)."""
+    if (before.name, before.global_name) == (after.name, after.global_name):
+        return
+    for key in {name.lower() for name in (before.name, before.global_name) if name}:
+        for index in _members.values():
+            index.discard(key, after.id)
+    for guild in after.mutual_guilds:
+        member = guild.get_member(after.id)
+        if member is not None and guild.id in _members:
+            for key in _member_keys(member):
+                _members[guild.id].add(key, member.id)
+
+# --- Choices ---
+
+def _query(current: str) -> str:
+    return current.strip().lower()
+
+def _character_choices(names: list[str]) -> list[app_commands.Choice[str]]:
+    return [app_commands.Choice(name=name, value=name) for name in names]
+
+def _member_choices(guild: Optional[discord.Guild], query: str, limit: int) -> list[app_commands.Choice[str]]:
+    if guild is None or limit <= 0:
+        return []
+    choices = []
+    for member_id in _member_index(guild).search(query, limit):
+        member = guild.get_member(member_id)
+        if member is not None:
+            choices.append(app_commands.Choice(name=f"@{member.display_name}", value=member.mention))
+    return choices
+
+async def _event_characters_for(interaction: Interaction) -> PrefixIndex:
+    """Characters of the event chosen in the command's event option so far (default event if none)."""
+    events, _ = await _event_index()
+    name = getattr(interaction.namespace, "event", None) or get_setting("default_event") or "arena"
+    event_id = events.get(str(name).strip().lower())
+    return await _characters_of(event_id) if event_id is not None else await _all_characters()
+
+async def event_choices(interaction: Interaction, current: str) -> list[app_commands.Choice[str]]:
+    _, names = await _event_index()
+    return _character_choices(names.search(_query(current)))
+
+async def character_choices(interaction: Interaction, current: str) -> list[app_commands.Choice[str]]:
+    """Characters of the event first, then any other known character."""
+    query = _query(current)
+    names = (await _event_characters_for(interaction)).search(query)
+    if len(names) < MAX_CHOICES:
+        names += [name for name in (await _all_characters()).search(query) if name not in names][:MAX_CHOICES - len(names)]
+    return _character_choices(names)
+
+async def target_choices(interaction: Interaction, current: str) -> list[app_commands.Choice[str]]:
+    """Options taking a character or an @user: characters, then members ("@..." for members only)."""
+    query = _query(current)
+    if query.startswith("@"):
+        return _member_choices(interaction.guild, query[1:], MAX_CHOICES)
+    choices = await character_choices(interaction, current)
+    return choices + _member_choices(interaction.guild, query, MAX_CHOICES - len(choices))
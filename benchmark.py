@@ -0,0 +1,539 @@
+# -*- coding: utf-8 -*-
+# benchmark.py
+#
+# Reproducible performance baseline (cli.py generate / cli.py bench).
+#
+# generate_database() fills an empty bot database with synthetic but realistically shaped data:
+# heavy-tailed player activity, players joining and leaving over time, skill-driven outcomes,
+# evening-heavy play, several events with their own rosters, linked characters, manual adjustments,
+# deathless streaks, roles and (by default) ratings rebuilt from the frags.
+#
+# run_suite() times every public db.py helper, the data gathering of /top, /topmmr, /stats and
+# /mmrsync (the Discord rendering is left out) and the autocomplete prefix index on AUTOCOMPLETE_NAMES
+# synthetic names, and returns a JSON-able report; compare_reports()
+# diffs two of them. The command cases mirror the queries the commands make: keep them in step
+# when a command's data access changes.
+
+import inspect
+import json
+import logging
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import time
+
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+import numpy as np
+
+import db
+from db import *
+from leaderboard import top_players
+from autocomplete import names_index
+
+# Fraction of each hour's share of the day's fights (UTC), peaking in the evening
+DIURNAL = np.array([
+    3, 2, 1.5, 1, 1, 1, 1.5, 2, 2.5, 3, 3.5, 4,
+    4.5, 5, 5, 5.5, 6, 7, 8, 9, 9.5, 9, 7, 5,
+], dtype=np.float64)
+WEEKEND_BOOST = 1.4
+ACTIVITY_CAP = 200  # most active player vs the least active (the Pareto tail is cut here)
+
+EVENT_NAMES = ("arena", "duels", "tournament", "siege", "skirmish", "ladder", "cup", "league")
+EVENT_ROSTER = 0.3  # share of all players who take part in each event besides the default one
+
+_SYLLABLES = (
+    "ar", "bo", "da", "el", "fen", "gar", "hel", "in", "jor", "ka", "lo", "mir", "nor", "ol", "ra",
+    "sig", "tor", "ulf", "val", "yr", "bjorn", "eir", "frey", "grim", "haf", "ing", "kol", "run",
+)
+_REASONS = ("Tournament prize", "Penalty", "Event bonus", "Manual adjustment", "Bug compensation")
+
+AUTOCOMPLETE_NAMES = 100_000  # size of the synthetic prefix index the autocomplete cases search
+
+# --- Generator ---
+
+def _character_names(rng: np.random.Generator, n: int) -> list[str]:
+    names, seen = [], set()
+    for i in range(n):
+        name = "".join(rng.choice(_SYLLABLES, size=int(rng.integers(2, 4))))
+        if name in seen:
+            name = f"{name}{i}"
+        seen.add(name)
+        names.append(name)
+    return names
+
+def _timestamps(seconds: np.ndarray) -> list[str]:
+    """Unix microseconds -> ISO strings as add_frag() stores them."""
+    return [s + "+00:00" for s in np.datetime_as_string(seconds.astype("datetime64[us]"), unit="us").tolist()]
+
+def _drop_frag_indexes(conn: sqlite3.Connection):
+    """Bulk inserts run faster without the frags indexes; init_db() creates them again."""
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'frags' AND sql IS NOT NULL").fetchall():
+        conn.execute(f"DROP INDEX {name}")
+
+def generate_database(
+    players: int = 3000,
+    frags: int = 1_000_000,
+    events: int = 3,
+    days: int = 365,
+    linked: float = 0.6,
+    adjustments: Optional[int] = None,
+    self_kills: float = 0.005,
+    ratings: bool = True,
+    workers: Optional[int] = None,
+    seed: int = 1,
+    end: Optional[datetime] = None,
+    progress: Optional[Callable[[str, int], None]] = None,
+) -> dict[str, int]:
+    """
+    Fills the current (empty) database; the same arguments always produce the same rows.
+    Frags span the `days` whole days before `end` (default now). `linked` is the share of characters
+    linked to a Discord user; adjustments defaults to one per 2,000 frags.
+    Returns the number of rows written per table.
+    """
+    rng = np.random.default_rng(seed)
+    end = end or datetime.now(timezone.utc)
+    first_day = int(end.timestamp()) // 86400 - days
+    events = max(1, min(events, len(EVENT_NAMES)))
+    adjustments = frags // 2000 if adjustments is None else adjustments
+    counts: dict[str, int] = {}
+
+    # --- players: name, skill, activity, active span, event rosters ---
+    names = _character_names(rng, players)
+    skill = rng.normal(0.0, 0.8, players)  # logit scale: P(a kills b) = 1 / (1 + e^-(skill_a - skill_b))
+    activity = np.minimum(rng.pareto(1.5, players) + 1, ACTIVITY_CAP)  # a few players fight far more than the rest
+    joined = np.where(rng.random(players) < 0.3, 0, rng.integers(0, days, players))
+    left = np.minimum(joined + rng.exponential(days / 2, players).astype(np.int64) + 7, days)
+    rosters = np.ones((events, players), dtype=bool)
+    rosters[1:] = rng.random((events - 1, players)) < EVENT_ROSTER
+    shares = 1 / np.arange(1, events + 1)  # the default event is the busiest
+
+    set_setting("default_event", EVENT_NAMES[0])
+    event_ids = [(get_event_by_name(name) or (create_event(name, "Generated"),))[0] for name in EVENT_NAMES[:events]]
+
+    with get_connection() as conn:
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.executemany("INSERT INTO characters (id, name) VALUES (?, ?)", enumerate(names, start=1))
+        counts["characters"] = players
+
+        # --- frags, day by day in time order ---
+        _drop_frag_indexes(conn)
+        day_numbers = np.arange(days)
+        alive = (joined[None, :] <= day_numbers[:, None]) & (day_numbers[:, None] < left[None, :])
+        weekday = (first_day + day_numbers + 3) % 7  # 1970-01-01 was a Thursday; 5, 6 = weekend
+        day_weight = (alive * activity).sum(axis=1) * np.where(weekday >= 5, WEEKEND_BOOST, 1.0) * rng.uniform(0.7, 1.3, days)
+        per_day = rng.multinomial(frags, day_weight / day_weight.sum())
+        hour_p = DIURNAL / DIURNAL.sum()
+        streaks = np.zeros((events, players), dtype=np.int64)
+        written = 0
+        for day in range(days):
+            weights = [activity * alive[day] * rosters[e] for e in range(events)]
+            event_weight = np.array([shares[e] * w.sum() for e, w in enumerate(weights)])
+            if not per_day[day] or not event_weight.sum():
+                continue
+            chunks = []
+            for e, n in enumerate(rng.multinomial(per_day[day], event_weight / event_weight.sum()).tolist()):
+                if not n or np.count_nonzero(weights[e]) < 2:
+                    continue
+                p = weights[e] / weights[e].sum()
+                a = rng.choice(players, n, p=p)
+                b = rng.choice(players, n, p=p)
+                while (same := a == b).any():
+                    b[same] = rng.choice(players, int(same.sum()), p=p)
+                a_wins = rng.random(n) < 1 / (1 + np.exp(skill[b] - skill[a]))
+                killer, victim = np.where(a_wins, a, b), np.where(a_wins, b, a)
+                suicide = rng.random(n) < self_kills
+                victim[suicide] = killer[suicide]
+                seconds = (first_day + day) * 86400 + rng.choice(24, n, p=hour_p) * 3600 + rng.integers(0, 3600, n)
+                micros = seconds * 1_000_000 + rng.integers(0, 1_000_000, n)
+                chunks.append((micros, killer, victim, np.full(n, e)))
+            if not chunks:
+                continue
+            micros, killer, victim, event = (np.concatenate(c) for c in zip(*chunks))
+            order = np.argsort(micros, kind="stable")
+            micros, killer, victim, event = micros[order], killer[order], victim[order], event[order]
+
+            # deathless streaks: kills since the last death, per event (a self-kill resets, then counts,
+            # as update_deathless_streaks() does)
+            for e in np.unique(event).tolist():
+                k, v = killer[event == e], victim[event == e]
+                idx = np.arange(len(k))
+                last_death = np.full(players, -1)
+                np.maximum.at(last_death, v, idx)
+                kills = np.bincount(k[idx >= last_death[k]], minlength=players)
+                streaks[e] = np.where(last_death >= 0, kills, streaks[e] + kills)
+
+            ids = np.asarray(event_ids)[event]
+            conn.executemany(
+                "INSERT INTO frags (killer_id, victim_id, timestamp, event_id) VALUES (?, ?, ?, ?)",
+                zip((killer + 1).tolist(), (victim + 1).tolist(), _timestamps(micros), ids.tolist())
+            )
+            written += len(killer)
+            if progress and (day % 30 == 29 or day == days - 1):
+                progress("frags", written)
+        counts["frags"] = written
+
+        conn.executemany(
+            "INSERT INTO deathless_streaks (character_id, count, event_id) VALUES (?, ?, ?)",
+            ((int(p) + 1, int(streaks[e, p]), event_ids[e]) for e, p in zip(*np.nonzero(streaks)))
+        )
+        counts["deathless_streaks"] = int(np.count_nonzero(streaks))
+
+        # --- owners: linked characters spread over users, 1.6 characters each on average ---
+        owned = np.flatnonzero(rng.random(players) < linked)
+        users = max(1, int(len(owned) / 1.6))
+        discord_ids = np.unique(rng.integers(10 ** 17, 10 ** 18, users + 16))[:users]
+        owner = discord_ids[rng.integers(0, users, len(owned))]
+        conn.executemany(
+            "INSERT INTO character_map (character, discord_id) VALUES (?, ?)",
+            zip((names[i] for i in owned.tolist()), owner.tolist())
+        )
+        counts["character_map"] = len(owned)
+
+        # --- manual adjustments ---
+        who = rng.choice(players, adjustments, p=activity / activity.sum())
+        when = (first_day + rng.integers(0, days, adjustments)) * 86400 + rng.integers(0, 86400, adjustments)
+        conn.executemany(
+            "INSERT INTO manual_adjustments (character_id, adjustment, reason, timestamp, event_id) VALUES (?, ?, ?, ?, ?)",
+            zip(
+                (who + 1).tolist(),
+                rng.choice([-5, -2, -1, 1, 2, 3, 5, 10], adjustments).tolist(),
+                rng.choice(_REASONS, adjustments).tolist(),
+                [s.replace("T", " ") for s in np.datetime_as_string(when.astype("datetime64[s]"), unit="s").tolist()],
+                np.asarray(event_ids)[rng.choice(events, adjustments, p=shares / shares.sum())].tolist(),
+            )
+        )
+        counts["manual_adjustments"] = adjustments
+
+        # --- roles and channels ---
+        conn.executemany("INSERT OR REPLACE INTO rank_roles (wins_threshold, role_name) VALUES (?, ?)",
+                         [(10, "Recruit"), (50, "Warrior"), (150, "Veteran"), (500, "Champion"), (1500, "Legend")])
+        conn.executemany("INSERT OR REPLACE INTO mmr_roles (threshold, role_name) VALUES (?, ?)",
+                         [(1400, "Bronze"), (1550, "Silver"), (1700, "Gold"), (1850, "Diamond")])
+        for i, event_id in enumerate(event_ids):
+            conn.executemany(
+                "INSERT OR REPLACE INTO event_channels (event_id, channel_id, channel_type) VALUES (?, ?, ?)",
+                [(event_id, 10 ** 17 + 2 * i, "track"), (event_id, 10 ** 17 + 2 * i + 1, "announce")]
+            )
+        conn.commit()
+
+    init_db()  # indexes back
+    if ratings and written:
+        from jobs import rebuild_events
+        rebuild_events(event_ids, workers=workers)
+        with get_connection() as conn:
+            for table in ("glicko_ratings", "rating_history", "glicko_checkpoints"):
+                counts[table] = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    return counts
+
+# --- Suite ---
+
+# Helpers not timed, and why (everything else public in db.py must have a case)
+SKIPPED = {
+    "set_db_path": "configuration",
+    "clear_rank_roles": "destructive",
+    "clear_mmr_roles": "destructive",
+    "clear_deathless_streaks": "destructive",
+    "add_change_listener": "configuration",
+    "notify_change": "callback dispatch (timed through the writes that call it)",
+}
+
+class Sample:
+    """Representative inputs picked from the database, so cases run against real rows."""
+
+    def __init__(self):
+        self.event_id = get_default_event_id()
+        with get_connection() as conn:
+            by_kills = conn.execute("""
+                SELECT ch.name FROM (
+                    SELECT killer_id, COUNT(*) AS n FROM frags WHERE event_id = ? GROUP BY killer_id
+                ) t JOIN characters ch ON ch.id = t.killer_id
+                ORDER BY t.n DESC, ch.name
+            """, (self.event_id,)).fetchall()
+            owners = conn.execute("""
+                SELECT discord_id FROM character_map GROUP BY discord_id ORDER BY COUNT(*) DESC, discord_id LIMIT 1
+            """).fetchone()
+            latest = conn.execute("SELECT MAX(timestamp) FROM frags").fetchone()[0]
+            self.rows = {
+                table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("characters", "frags", "character_map", "manual_adjustments", "glicko_ratings", "rating_history")
+            }
+        names = [name for (name,) in by_kills]
+        if not names:
+            raise ValueError("The database has no frags in the default event (see cli.py generate).")
+        self.heavy = names[0]  # most kills
+        self.typical = names[len(names) // 2]
+        self.characters = names[:: max(1, len(names) // 50)][:50]  # 50 characters across the activity range
+        self.user_id = owners[0] if owners else None
+        self.channel_id = get_event_channel(self.event_id, "track") or 0
+        self.event_name = dict(list_event_ids())[self.event_id]
+        self.latest = latest
+        self.now = datetime.now(timezone.utc)
+        self.since = self.now - timedelta(days=30)
+
+# --- Command data gathering (mirrors commands.py, without Discord) ---
+
+def top_data(event_id: int, days: int = 1, count: int = 10) -> list:
+    """/top: the whole leaderboard in one query."""
+    return get_top_points(event_id, datetime.now(timezone.utc) - timedelta(days=days), count)
+
+def topmmr_data(event_id: int, days: int = 30, count: int = 10) -> list:
+    """/topmmr (Glicko-2): the best players from the in-memory leaderboard (loaded by the first call)."""
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    rows = top_players(event_id, since, count)
+    rows.sort(key=lambda x: (-x[2], -x[4], str(x[0])))
+    return rows[:count]
+
+def stats_data(characters: list[str], event_id: int, days: int = 30, user_id: Optional[int] = None) -> dict:
+    """/stats: per-opponent wins and losses of the active characters, MMR, points and the first page's owners."""
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    fights = get_fight_stats_bulk(characters, since, event_id)
+    characters = [ch for ch in characters if fights[ch][2] > 0]
+    opponents = get_opponent_stats_bulk(characters, since, event_id)
+    first_page = sorted(opponents, key=lambda o: (opponents[o][0] / sum(opponents[o]), o))[:10]
+    owners = get_character_owners_bulk(first_page)
+    rated = get_user_characters(user_id) if user_id else characters
+    mmrs = [rating for rating, _, _, _ in get_glicko_ratings_bulk(rated, event_id).values()]
+    manual = sum(m for m, _ in get_win_sources_bulk(characters, event_id).values())
+    return {"opponents": opponents, "owners": owners, "mmr": mmrs, "manual": manual}
+
+def mmrsync_data(event_id: int):
+    """/mmrsync's worker: every frag of the event replayed (the save is timed separately)."""
+    from replay import replay_event
+    return replay_event(event_id)
+
+# --- Cases ---
+
+def _cases(s: Sample, writes: bool) -> list[tuple[str, str, Callable[[], object]]]:
+    """(name, group, call); a name's part before '[' is the helper it covers."""
+    e, ch, heavy, uid = s.event_id, s.typical, s.heavy, s.user_id
+    chars = s.characters
+    stored = get_glicko_rating_extended(ch, e, decay=False)
+
+    # built once, by the first autocomplete case that runs (its first_ms includes the generation)
+    synthetic = {}
+    def synthetic_names() -> list[str]:
+        if "names" not in synthetic:
+            synthetic["names"] = _character_names(np.random.default_rng(0), AUTOCOMPLETE_NAMES)
+        return synthetic["names"]
+    def big_index():
+        if "index" not in synthetic:
+            synthetic["index"] = names_index(synthetic_names())
+        return synthetic["index"]
+    added = iter(range(10 ** 9))
+    def add_name():
+        name = f"kol{next(added)}"  # a fresh name in a crowded part of the index
+        big_index().add(name, name)
+    cases = [
+        # configuration and lookups
+        ("get_db_path", "read", get_db_path),
+        ("get_connection", "read", lambda: get_connection().close()),
+        ("init_db", "read", init_db),
+        ("ensure_default_event", "read", ensure_default_event),
+        ("init_rank_roles_table", "read", init_rank_roles_table),
+        ("init_mmr_roles_table", "read", init_mmr_roles_table),
+        ("load_profiler_settings", "read", load_profiler_settings),
+        ("get_setting", "read", lambda: get_setting("default_event")),
+        ("get_character_id", "read", lambda: get_character_id(ch)),
+        ("get_default_event_id", "read", get_default_event_id),
+        ("get_event_by_name", "read", lambda: get_event_by_name(s.event_name)),
+        ("get_event_id_by_name", "read", lambda: get_event_id_by_name(s.event_name)),
+        ("get_event_id_by_channel", "read", lambda: get_event_id_by_channel(s.channel_id)),
+        ("get_event_channel", "read", lambda: get_event_channel(e, "announce")),
+        ("list_events", "read", list_events),
+        ("list_event_ids", "read", list_event_ids),
+        ("get_all_rank_roles", "read", get_all_rank_roles),
+        ("get_all_mmr_roles", "read", get_all_mmr_roles),
+        # owners
+        ("get_user_characters", "read", lambda: get_user_characters(uid)),
+        ("get_character_owner", "read", lambda: get_character_owner(ch)),
+        ("get_discord_id_by_character", "read", lambda: get_discord_id_by_character(ch)),
+        ("get_character_owners_bulk", "read", lambda: get_character_owners_bulk(chars)),
+        ("get_user_characters_bulk", "read", lambda: get_user_characters_bulk([uid] if uid else [])),
+        # frags
+        ("get_frag_generation", "read", lambda: get_frag_generation(e)),
+        ("get_activity_grid[event]", "read", lambda: get_activity_grid(None, e, s.since)),
+        ("get_activity_grid[character]", "read", lambda: get_activity_grid([heavy], e)),
+        ("get_top_players", "read", lambda: get_top_players(10, 30)),
+        ("get_top_points", "read", lambda: get_top_points(e, s.since)),
+        ("get_total_wins", "read", lambda: get_total_wins(heavy, 30, e)),
+        ("get_total_wins_for_user", "read", lambda: get_total_wins_for_user(uid, 30, e)),
+        ("get_win_sources", "read", lambda: get_win_sources(heavy, e)),
+        ("get_win_sources_bulk", "read", lambda: get_win_sources_bulk(chars, e)),
+        ("get_fight_stats[heavy]", "read", lambda: get_fight_stats(heavy, s.since, e)),
+        ("get_fight_stats[typical]", "read", lambda: get_fight_stats(ch, s.since, e)),
+        ("get_fight_stats_bulk", "read", lambda: get_fight_stats_bulk(chars, s.since, e)),
+        ("get_opponent_stats_bulk", "read", lambda: get_opponent_stats_bulk([heavy], s.since, e)),
+        ("get_last_active_iso", "read", lambda: get_last_active_iso(heavy, e)),
+        ("get_last_active_day", "read", lambda: get_last_active_day(heavy, e)),
+        ("get_last_active_bulk", "read", lambda: get_last_active_bulk(chars, e)),
+        ("get_deathless_streak", "read", lambda: get_deathless_streak(heavy, e)),
+        ("get_all_players", "read", lambda: get_all_players(e)),
+        # ratings
+        ("get_glicko_rating", "read", lambda: get_glicko_rating(ch)),
+        ("get_glicko_rating_extended", "read", lambda: get_glicko_rating_extended(ch, e)),
+        ("effective_rd", "read", lambda: effective_rd(stored[1], stored[3])),
+        ("get_glicko_ratings_bulk", "read", lambda: get_glicko_ratings_bulk(chars, e)),
+        ("get_engine_scores_bulk", "read", lambda: get_engine_scores_bulk("elo", chars, e)),
+        ("get_user_glicko_mmr", "read", lambda: get_user_glicko_mmr(uid, e)),
+        ("get_user_glicko_rating", "read", lambda: get_user_glicko_rating(uid)),
+        ("get_top_glicko", "read", lambda: get_top_glicko(10)),
+        ("get_rating_at", "read", lambda: get_rating_at(heavy, s.now - timedelta(days=60), e)),
+        ("get_rating_series", "read", lambda: get_rating_series(heavy, e, s.since)),
+        # command data gathering
+        ("/top", "command", lambda: top_data(e, 30)),
+        ("/topmmr", "command", lambda: topmmr_data(e, 30)),
+        ("/stats[character]", "command", lambda: stats_data([heavy], e, 30)),
+        ("/stats[user]", "command", lambda: stats_data(get_user_characters(uid), e, 30, uid)),
+        ("/mmrsync", "command", lambda: mmrsync_data(e)),
+        # autocomplete: index loads, then lookups on a 100k-name index (Discord allows 3 s)
+        ("get_character_names", "autocomplete", get_character_names),
+        ("get_event_character_names", "autocomplete", lambda: get_event_character_names(e)),
+        ("names_index[100k]", "autocomplete", lambda: names_index(synthetic_names())),
+        ("PrefixIndex.search[1 char]", "autocomplete", lambda: big_index().search("k")),
+        ("PrefixIndex.search[3 chars]", "autocomplete", lambda: big_index().search("kol")),
+        ("PrefixIndex.search[miss]", "autocomplete", lambda: big_index().search("qx")),
+        ("PrefixIndex.add", "autocomplete", add_name),
+    ]
+    if not writes:
+        return cases
+
+    def record_history():
+        # the upsert itself, rolled back so repeated runs measure the same write
+        with get_connection() as conn:
+            record_rating_history(conn, e, int(s.now.timestamp()) // HISTORY_PERIOD, [(get_character_id(ch), *stored[:3])])
+            conn.rollback()
+
+    bench_event = "benchmark"
+
+    def bench_channel(call):
+        if not get_event_by_name(bench_event):
+            create_event(bench_event, "cli.py bench")
+        return call(bench_event)
+
+    run = iter(range(1, 10 ** 9))
+    cases += [
+        ("set_setting", "write", lambda: set_setting("benchmark", "1")),
+        ("intern_character", "write", lambda: intern_character("benchmark")),
+        ("add_frag", "write", lambda: add_frag(heavy, ch)),
+        ("update_glicko_ratings", "write", lambda: update_glicko_ratings(heavy, ch, e)),
+        ("set_glicko_rating", "write", lambda: set_glicko_rating(ch, *stored[:3], event_id=e)),
+        ("record_rating_history", "write", record_history),
+        ("compact_rating_history", "write", compact_rating_history),
+        ("update_deathless_streaks", "write", lambda: update_deathless_streaks(heavy, ch, e)),
+        ("increment_deathless_streak", "write", lambda: increment_deathless_streak("benchmark", e)),
+        ("reset_deathless_streak", "write", lambda: reset_deathless_streak("benchmark", e)),
+        ("adjust_wins", "write", lambda: adjust_wins("benchmark", 1, "benchmark", e)),
+        ("link_character", "write", lambda: link_character("benchmark", 1)),
+        ("unlink_character", "write", lambda: unlink_character("benchmark")),
+        ("set_character_owner", "write", lambda: set_character_owner("benchmark", 1)),
+        ("remove_character_owner", "write", lambda: remove_character_owner("benchmark")),
+        ("set_rank_role", "write", lambda: set_rank_role(10 ** 9, "Benchmark")),
+        ("set_mmr_role", "write", lambda: set_mmr_role(10 ** 9, "Benchmark")),
+        ("create_event", "write", lambda: create_event(f"{bench_event}-{time.time_ns()}-{next(run)}")),
+        ("set_event_channel", "write", lambda: bench_channel(lambda name: set_event_channel(name, 1))),
+        ("clear_event_channels", "write", lambda: bench_channel(clear_event_channels)),
+        ("recalculate_glicko_recent", "write", lambda: recalculate_glicko_recent(7, e)),
+    ]
+    return cases
+
+def _git_version() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "describe", "--always", "--dirty"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=5
+        )
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def time_call(call: Callable[[], object], repeat: int = 5, budget: float = 2.0) -> dict:
+    """
+    Times one cold call (traced, for its SQL statement count), then up to `repeat` warm calls
+    or as many as fit in `budget` seconds (at least one).
+    """
+    from profiler import command_trace
+    with command_trace("benchmark", sql_budget=None, http_budget=None, repeat_limit=None) as trace:
+        call()
+    times = []
+    deadline = time.perf_counter() + budget
+    while len(times) < repeat and (not times or time.perf_counter() < deadline):
+        start = time.perf_counter()
+        call()
+        times.append((time.perf_counter() - start) * 1000)
+    return {
+        "runs": len(times),
+        "first_ms": round(trace.elapsed_ms, 3),
+        "min_ms": round(min(times), 3),
+        "median_ms": round(statistics.median(times), 3),
+        "mean_ms": round(statistics.fmean(times), 3),
+        "sql_calls": trace.sql_calls,
+    }
+
+def run_suite(
+    repeat: int = 5,
+    budget: float = 2.0,
+    writes: bool = False,
+    only: Optional[str] = None,
+    on_case: Optional[Callable[[str, dict], None]] = None,
+) -> dict:
+    """
+    Times every case (names containing `only`, if given) on the current database. Write cases
+    change the database and run only with writes=True: use a generated copy.
+    """
+    sample = Sample()
+    cases = _cases(sample, writes)
+    results = {}
+    for name, group, call in cases:
+        if only and only not in name:
+            continue
+        try:
+            result = {"group": group, **time_call(call, repeat, budget)}
+        except Exception as e:
+            logging.exception(f"❌ Benchmark case {name} failed")
+            result = {"group": group, "error": f"{type(e).__name__}: {e}"}
+        results[name] = result
+        if on_case:
+            on_case(name, result)
+
+    covered = {name.split("[")[0] for name, _, _ in _cases(sample, True)}
+    public = sorted(
+        name for name, fn in inspect.getmembers(db, inspect.isfunction)
+        if fn.__module__ == "db" and not name.startswith("_")
+    )
+    return {
+        "meta": {
+            "version": _git_version(),
+            "created": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "database": os.path.abspath(get_db_path()),
+            "rows": sample.rows,
+            "latest_frag": sample.latest,
+            "sample": {"event_id": sample.event_id, "heavy": sample.heavy, "typical": sample.typical, "user_id": sample.user_id},
+            "repeat": repeat,
+            "budget_s": budget,
+            "writes": writes,
+        },
+        "cases": results,
+        "skipped": SKIPPED,
+        "uncovered": [name for name in public if name not in covered and name not in SKIPPED],
+    }
+
+def compare_reports(old: dict, new: dict, stat: str = "median_ms") -> list[tuple[str, Optional[float], Optional[float], Optional[float]]]:
+    """(case, old ms, new ms, new/old) for every case in either report, slowest change first."""
+    rows = []
+    for name in sorted(set(old["cases"]) | set(new["cases"])):
+        a = old["cases"].get(name, {}).get(stat)
+        b = new["cases"].get(name, {}).get(stat)
+        rows.append((name, a, b, b / a if a and b is not None else None))
+    rows.sort(key=lambda r: -(r[3] or 0))
+    return rows
+
+def load_report(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
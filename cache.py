@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+# cache.py
+#
+# Results of the leaderboard commands (/top, /topmmr, /stats, /mystats), reused while nothing they
+# show has changed. Keys carry the event's data generation, which every write bumps through
+# db.add_change_listener, so a frag or a rating edit makes the event's old entries unreachable; they
+# age out least recently used, and after CACHE_TTL at the latest (windows like "last N days" move with
+# the clock). Identical requests arriving together share one computation (single flight).
+#
+# Also the Discord display data of characters (utils.resolve_display_data), per guild: links and
+# rank-role edits invalidate it through the same listener, member and role updates from the gateway
+# through main.py; members that are not in the guild are cached too, for a shorter time.
+
+import asyncio
+import time
+
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable, Optional, TypeVar
+
+from db import add_change_listener
+
+CACHE_ENTRIES = 256
+CACHE_TTL = 60.0  # seconds
+
+T = TypeVar("T")
+
+# Per-event generation counters; _ALL is bumped by changes not tied to one event (links, /reset)
+_ALL = None
+_generations: dict[Optional[int], int] = {}
+
+def generation(event_id: Optional[int]) -> tuple[int, int]:
+    return _generations.get(event_id, 0), _generations.get(_ALL, 0)
+
+def _on_change(kind: str, event_id: Optional[int] = None, characters: Optional[list[str]] = None):
+    _generations[event_id] = _generations.get(event_id, 0) + 1
+    if kind == "owners":
+        display_cache.invalidate_characters(characters)
+    elif kind == "roles":
+        display_cache.clear()
+
+add_change_listener(_on_change)
+
+class ResultCache:
+    """LRU + TTL map of computed results with single-flight misses and hit/miss counters."""
+
+    def __init__(self, max_entries: int = CACHE_ENTRIES, ttl: float = CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, object]] = OrderedDict()  # key -> (expiry, result)
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0       # served from the cache
+        self.shared = 0     # joined a computation already in flight
+        self.misses = 0     # computed
+        self.evictions = 0
+        self.expirations = 0
+        self.since = time.time()
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.shared + self.misses
+        return (self.hits + self.shared) / lookups if lookups else 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def get_or_compute(self, key: Hashable, compute: Callable[[], Awaitable[T]], event_id: Optional[int] = None) -> T:
+        """
+        The cached result for key (with event_id's data generation), else compute()'s. Concurrent
+        callers with the same key await the same computation; an exception reaches all of them and
+        is not cached. A caller cancelled while waiting does not cancel the computation.
+        """
+        key = (key, generation(event_id))
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+            self.expirations += 1
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.shared += 1
+        else:
+            self.misses += 1
+            # Runs in the starter's trace (if any); what outlives that command is not billed to it
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._store(key, t))
+        return await asyncio.shield(task)
+
+    def _store(self, key: Hashable, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, task.result())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def summary(self) -> str:
+        return (
+            f"{len(self._entries)}/{self.max_entries} entries, TTL {self.ttl:.0f}s | "
+            f"hit rate **{self.hit_rate:.0%}** ({self.hits} hits, {self.shared} shared, {self.misses} computed) | "
+            f"{self.evictions} evicted, {self.expirations} expired"
+        )
+
+# Leaderboard command results (see commands.py)
+result_cache = ResultCache()
+
+DISPLAY_ENTRIES = 4096
+DISPLAY_TTL = 600.0          # seconds; a safety net, updates arrive through invalidation
+DISPLAY_NEGATIVE_TTL = 120.0  # linked member not found in the guild
+
+class DisplayCache:
+    """
+    LRU + TTL map of (guild_id, character) -> display data, with an index of the entries each
+    (guild_id, discord_id) member backs so member updates drop only theirs.
+    """
+
+    def __init__(self, max_entries: int = DISPLAY_ENTRIES, ttl: float = DISPLAY_TTL, negative_ttl: float = DISPLAY_NEGATIVE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # (guild_id, character) -> (expiry, discord_id or None, display data, member not found)
+        self._entries: OrderedDict[tuple[int, str], tuple[float, Optional[int], dict, bool]] = OrderedDict()
+        self._members: dict[tuple[int, int], set[str]] = {}  # (guild_id, discord_id) -> characters
+        # Bumped by every invalidation: a lookup that started before one must not store its result
+        self.version = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.negative_hits = 0  # hits on a member that was not found
+        self.misses = 0
+        self.invalidations = 0  # entries dropped by an update
+        self.evictions = 0
+        self.expirations = 0
+        self.since = time.time()
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, guild_id: int, character: str) -> Optional[dict]:
+        key = (guild_id, character)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                if entry[3]:
+                    self.negative_hits += 1
+                return entry[2]
+            self._drop(key)
+            self.expirations += 1
+        self.misses += 1
+        return None
+
+    def put(self, guild_id: int, character: str, discord_id: Optional[int], data: dict, version: int, negative: bool = False):
+        """Store data unless an invalidation happened since version was read."""
+        if version != self.version:
+            return
+        key = (guild_id, character)
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (time.monotonic() + (self.negative_ttl if negative else self.ttl), discord_id, data, negative)
+        if discord_id:
+            self._members.setdefault((guild_id, discord_id), set()).add(character)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _drop(self, key: tuple[int, str]):
+        discord_id = self._entries.pop(key)[1]
+        if discord_id:
+            characters = self._members.get((key[0], discord_id))
+            if characters is not None:
+                characters.discard(key[1])
+                if not characters:
+                    del self._members[(key[0], discord_id)]
+
+    def _invalidate(self, keys):
+        self.version += 1
+        for key in list(keys):
+            if key in self._entries:
+                self._drop(key)
+                self.invalidations += 1
+
+    def invalidate_member(self, guild_id: int, discord_id: int):
+        """Nickname, avatar or roles of a member changed, or they joined or left."""
+        characters = self._members.get((guild_id, discord_id), ())
+        self._invalidate([(guild_id, character) for character in characters])
+
+    def invalidate_user(self, discord_id: int):
+        """Global name or avatar changed: the user's entries in every guild."""
+        self._invalidate([(guild_id, c) for (guild_id, d), chars in self._members.items() if d == discord_id for c in chars])
+
+    def invalidate_guild(self, guild_id: int):
+        """A role of the guild changed (name, color)."""
+        self._invalidate([key for key in self._entries if key[0] == guild_id])
+
+    def invalidate_characters(self, characters: Optional[list[str]] = None):
+        """Characters were linked or unlinked (None: possibly any)."""
+        if characters is None:
+            self.clear()
+            return
+        names = {name.lower() for name in characters}
+        self._invalidate([key for key in self._entries if key[1].lower() in names])
+
+    def clear(self):
+        self._invalidate(self._entries)
+
+    def summary(self) -> str:
+        return (
+            f"{len(self._entries)}/{self.max_entries} entries, TTL {self.ttl:.0f}s | "
+            f"hit rate **{self.hit_rate:.0%}** ({self.hits} hits, {self.negative_hits} not in guild, {self.misses} resolved) | "
+            f"{self.invalidations} invalidated, {self.evictions} evicted, {self.expirations} expired"
+        )
+
+# Character display data (see utils.resolve_display_data)
+display_cache = DisplayCache()
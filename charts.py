@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+# charts.py
+#
+# PNG charts for /mmrchart and /activity. The data comes from indexed queries run on a thread of the
+# bot process; matplotlib draws in a small process pool, so a plot never blocks the event loop.
+# Images are cached on disk (CHART_CACHE_DIR), keyed by what they show and a generation of the data
+# behind them, and evicted least recently used once the cache outgrows CACHE_MAX_BYTES.
+
+import asyncio
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from db import get_activity_grid, get_frag_generation, get_rating_series
+from settings import CHART_CACHE_DIR
+
+# One rendering process keeps matplotlib imported without competing with rating rebuilds for cores
+CHART_WORKERS = 1
+
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+# --- Rendering (worker process) ---
+
+def _init_renderer():
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot  # noqa: F401 (imported once per worker, not per chart)
+
+def _png(fig) -> bytes:
+    import matplotlib.pyplot as plt
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=100, bbox_inches="tight")
+    plt.close(fig)
+    return buf.getvalue()
+
+def render_rating_chart(title: str, series: dict[str, list[tuple[float, float, float]]]) -> bytes:
+    """Rating over time with a ±RD band per character; series maps name -> [(unix time, rating, rd)]."""
+    import matplotlib.pyplot as plt
+    import numpy as np
+
+    fig, ax = plt.subplots(figsize=(8, 4))
+    for name, points in series.items():
+        t = [datetime.fromtimestamp(p[0], timezone.utc) for p in points]
+        rating = np.array([p[1] for p in points])
+        rd = np.array([p[2] for p in points])
+        # a rating holds until the next snapshot
+        line, = ax.plot(t, rating, drawstyle="steps-post", marker="o" if len(t) == 1 else None, label=name)
+        ax.fill_between(t, rating - rd, rating + rd, step="post", alpha=0.15, color=line.get_color())
+    ax.set_title(title)
+    ax.set_ylabel("Rating (±RD)")
+    ax.grid(alpha=0.3)
+    if len(series) > 1:
+        ax.legend(loc="best", fontsize="small")
+    fig.autofmt_xdate()
+    return _png(fig)
+
+def render_activity_heatmap(title: str, grid: list[list[int]]) -> bytes:
+    """Kills per weekday × UTC hour (see db.get_activity_grid)."""
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(10, 3.6))
+    image = ax.imshow(grid, aspect="auto", cmap="magma", interpolation="nearest", vmin=0)
+    ax.set_title(title)
+    ax.set_xticks(range(24))
+    ax.set_xticklabels([f"{h:02d}" for h in range(24)], fontsize="small")
+    ax.set_yticks(range(7))
+    ax.set_yticklabels(WEEKDAYS)
+    ax.set_xlabel("Hour (UTC)")
+    fig.colorbar(image, ax=ax, label="Kills")
+    return _png(fig)
+
+# --- Cache ---
+
+class ChartCache:
+    """PNG files in a directory, evicted least recently used by total size (file mtime is the recency)."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._files: Optional[OrderedDict[str, int]] = None  # file name -> size, oldest first
+        self._lock = threading.Lock()
+
+    def _index(self) -> OrderedDict:
+        if self._files is None:
+            os.makedirs(self.directory, exist_ok=True)
+            entries = [e for e in os.scandir(self.directory) if e.name.endswith(".png")]
+            entries.sort(key=lambda e: e.stat().st_mtime)
+            self._files = OrderedDict((e.name, e.stat().st_size) for e in entries)
+            self.size = sum(self._files.values())
+        return self._files
+
+    def get(self, key: str) -> Optional[bytes]:
+        name = key + ".png"
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            files = self._index()
+            if name not in files:
+                return None
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                os.utime(path)
+            except OSError:
+                self.size -= files.pop(name)
+                return None
+            files.move_to_end(name)
+            return data
+
+    def put(self, key: str, data: bytes):
+        name = key + ".png"
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            files = self._index()
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(path + ".tmp", path)
+            self.size += len(data) - files.pop(name, 0)
+            files[name] = len(data)
+            while self.size > self.max_bytes and len(files) > 1:
+                oldest, size = files.popitem(last=False)
+                self.size -= size
+                try:
+                    os.remove(os.path.join(self.directory, oldest))
+                except OSError:
+                    pass
+
+_cache = ChartCache(CHART_CACHE_DIR, CACHE_MAX_BYTES)
+_pool: Optional[ProcessPoolExecutor] = None
+_pending: dict[str, asyncio.Task] = {}  # key -> render in progress (concurrent requests share it)
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        ctx = multiprocessing.get_context("spawn")
+        _pool = ProcessPoolExecutor(CHART_WORKERS, mp_context=ctx, initializer=_init_renderer)
+    return _pool
+
+async def _render(key: str, render: Callable[..., bytes], load: Callable[[], Optional[tuple]]) -> Optional[bytes]:
+    args = await asyncio.to_thread(load)
+    if args is None:
+        return None
+    start = time.perf_counter()
+    data = await asyncio.get_running_loop().run_in_executor(_get_pool(), render, *args)
+    await asyncio.to_thread(_cache.put, key, data)
+    logging.info(f"📊 Rendered {render.__name__} ({len(data) // 1024} KiB) in {time.perf_counter() - start:.2f}s")
+    return data
+
+async def _chart(key_parts: tuple, render: Callable[..., bytes], load: Callable[[], Optional[tuple]]) -> Optional[bytes]:
+    """
+    The cached PNG for key_parts, or render(*load()) in the pool on a miss (None if load() returns None).
+    key_parts must include everything the image depends on, including a generation of its data.
+    """
+    key = hashlib.sha1(repr(key_parts).encode("utf-8")).hexdigest()
+    data = await asyncio.to_thread(_cache.get, key)
+    if data is not None:
+        return data
+    task = _pending.get(key)
+    if task is None:
+        task = asyncio.get_running_loop().create_task(_render(key, render, load))
+        _pending[key] = task
+        task.add_done_callback(lambda _: _pending.pop(key, None))
+    return await asyncio.shield(task)
+
+# --- Charts ---
+
+async def rating_chart(characters: list[str], event_id: int, days: Optional[int], title: str) -> Optional[bytes]:
+    """
+    PNG of the characters' rating history (rating_history) over the last `days` days (all if None),
+    or None if none of them has any in the range.
+    """
+    since = datetime.now(timezone.utc) - timedelta(days=days) if days else None
+
+    def load_series():
+        return {
+            ch: [(ts.timestamp(), rating, rd) for ts, rating, rd, _ in get_rating_series(ch, event_id, since)]
+            for ch in characters
+        }
+
+    series = {ch: points for ch, points in (await asyncio.to_thread(load_series)).items() if points}
+    if not series:
+        return None
+    # the plotted points are their own generation: one index range read per character
+    digest = hashlib.sha1(repr(series).encode("utf-8")).hexdigest()
+    return await _chart(("mmr", title, event_id, days, digest), render_rating_chart, lambda: (title, series))
+
+async def activity_chart(characters: Optional[list[str]], event_id: int, days: Optional[int], title: str) -> Optional[bytes]:
+    """
+    PNG heatmap of the characters' kills (every kill in the event if characters is None) per weekday
+    and hour over the last `days` days (all if None), or None if there are none.
+    """
+    now = datetime.now(timezone.utc)
+    since = now - timedelta(days=days) if days else None
+    generation = await asyncio.to_thread(get_frag_generation, event_id)
+    # frags also age out of a sliding window, so it is keyed to the hour as well
+    window = now.strftime("%Y%m%d%H") if days else None
+
+    def load():
+        grid = get_activity_grid(characters, event_id, since)
+        return (title, grid) if any(map(any, grid)) else None
+
+    key = ("activity", title, characters, event_id, days, generation, window)
+    return await _chart(key, render_activity_heatmap, load)
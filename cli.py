@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+# cli.py
+#
+# Offline maintenance commands that work on the bot database without Discord:
+#   python cli.py export --event arena --out exports/arena.jsonl.zst
+#   python cli.py import --event staging --file exports/arena.jsonl.zst --replace
+#   python cli.py sync --workers 4                  (every event; --event may be repeated)
+#   python cli.py tune --rd0 250:350:5 --c 20,35,50 --vol 0.04:0.08:5 --top 10
+#   python cli.py --db bench.db generate --players 20000 --frags 10000000
+#   python cli.py --db bench.db bench --out bench.json --baseline previous.json
+
+import argparse
+import logging
+import sys
+import time
+
+from settings import get_db_file_path
+from db import set_db_path, init_db, ensure_default_event, get_event_by_name, create_event, get_setting, list_event_ids
+
+def _progress(label: str):
+    start = time.perf_counter()
+
+    def report(table: str, done: int):
+        elapsed = time.perf_counter() - start
+        rate = done / elapsed if elapsed else 0.0
+        print(f"  {label}: {done:,} rows ({table}) — {rate:,.0f} rows/s", file=sys.stderr)
+    return report
+
+def _event_name(name) -> str:
+    return (name or get_setting("default_event") or "arena").strip().lower()
+
+def _event_id(name: str, create: bool = False) -> int:
+    event = get_event_by_name(name)
+    if event:
+        return event[0]
+    if create:
+        return create_event(name, "Imported")
+    sys.exit(f"❌ Event `{name}` not found.")
+
+def cmd_export(args):
+    from transfer import export_event
+    name = _event_name(args.event)
+    counts = export_event(_event_id(name), name, args.out, progress=_progress("export"))
+    print(f"✅ Exported {sum(counts.values()):,} rows to {args.out}: {counts}")
+
+def cmd_import(args):
+    from transfer import import_event
+    name = _event_name(args.event)
+    counts = import_event(args.file, _event_id(name, create=True), replace=args.replace, progress=_progress("import"))
+    print(f"✅ Imported {sum(counts.values()):,} rows into `{name}`: {counts}")
+
+def cmd_sync(args):
+    from jobs import rebuild_events
+    names = dict(list_event_ids())
+    if args.event:
+        names = {_event_id(_event_name(n)): _event_name(n) for n in args.event}
+    start = time.perf_counter()
+
+    def done(event_id: int, result, seconds: float):
+        print(f"  {names[event_id]}: {result.frags:,} frags, {len(result)} players in {seconds:.2f}s", file=sys.stderr)
+
+    timings = rebuild_events(list(names), period=args.period, workers=args.workers, on_event=done)
+    print(
+        f"✅ Rebuilt {len(timings)} events in {time.perf_counter() - start:.2f}s "
+        f"({sum(timings.values()):.2f}s of replay work, saved in one transaction)"
+    )
+
+def cmd_tune(args):
+    import numpy as np
+    import tuning
+    names = dict(list_event_ids())
+    if args.event:
+        names = {_event_id(_event_name(n)): _event_name(n) for n in args.event}
+    values = [tuning.parse_spec(spec) for spec in (args.rd0, args.c, args.vol)]
+    if args.random:
+        configs = tuning.random_configs(args.random, *values, seed=args.seed)
+    else:
+        configs = tuning.grid(*values)
+    # the live constants are always scored, as the reference
+    current = np.array(tuning.CURRENT)
+    if not (configs == current).all(axis=1).any():
+        configs = np.vstack((configs, current))
+
+    start = time.perf_counter()
+    history = tuning.load_history(list(names), warmup=args.warmup)
+    if not history.scored.any():
+        sys.exit("❌ Not enough frags to score.")
+    print(
+        f"  {len(history):,} frags of {len(names)} events, {history.players:,} players, "
+        f"{len(history.bounds) - 1:,} waves, loaded in {time.perf_counter() - start:.2f}s",
+        file=sys.stderr
+    )
+
+    start = time.perf_counter()
+
+    def progress(done: int, total: int):
+        elapsed = time.perf_counter() - start
+        print(f"  tune: {done:,}/{total:,} configs — {done / elapsed * 60:,.0f} configs/min", file=sys.stderr)
+
+    log_loss, accuracy = tuning.tune(history, configs, workers=args.workers, on_batch=progress)
+    ranked = np.lexsort((-accuracy, log_loss))
+    reference = int(np.flatnonzero((configs[ranked] == current).all(axis=1))[0])
+
+    print(f"{'rank':>5} {'rd0':>8} {'c':>8} {'vol':>8} {'log-loss':>9} {'accuracy':>9}")
+    for rank, i in enumerate(ranked.tolist(), start=1):
+        if rank <= args.top or rank == reference + 1:
+            marker = "  ← current" if rank == reference + 1 else ""
+            rd0, c, vol = configs[i]
+            print(f"{rank:>5} {rd0:>8.1f} {c:>8.2f} {vol:>8.4f} {log_loss[i]:>9.5f} {accuracy[i]:>8.2%}{marker}")
+    if args.csv:
+        with open(args.csv, "w", encoding="utf-8") as f:
+            f.write(",".join(("rank", *tuning.PARAMS, "log_loss", "accuracy")) + "\n")
+            for rank, i in enumerate(ranked.tolist(), start=1):
+                f.write(",".join(map(str, (rank, *configs[i].tolist(), log_loss[i], accuracy[i]))) + "\n")
+    print(f"✅ Scored {len(configs):,} configs on {int(history.scored.sum()):,} kills in {time.perf_counter() - start:.2f}s")
+
+def cmd_generate(args):
+    from benchmark import generate_database
+    from db import get_connection
+    with get_connection() as conn:
+        if conn.execute("SELECT 1 FROM frags LIMIT 1").fetchone():
+            sys.exit("❌ The database already has frags: generate into a new file (--db).")
+    start = time.perf_counter()
+    counts = generate_database(
+        players=args.players, frags=args.frags, events=args.events, days=args.days, linked=args.linked,
+        adjustments=args.adjustments, ratings=not args.no_ratings, workers=args.workers, seed=args.seed,
+        progress=_progress("generate"),
+    )
+    print(f"✅ Generated {counts} in {time.perf_counter() - start:.2f}s")
+
+def cmd_bench(args):
+    import json
+    from benchmark import run_suite, compare_reports, load_report
+
+    def case(name: str, result: dict):
+        if "error" in result:
+            print(f"  {name:<36} ❌ {result['error']}", file=sys.stderr)
+        else:
+            print(f"  {name:<36} {result['median_ms']:>10.2f} ms  ({result['runs']} runs, {result['sql_calls']} SQL)", file=sys.stderr)
+
+    report = run_suite(repeat=args.repeat, budget=args.budget, writes=args.writes, only=args.only, on_case=case)
+    if report["uncovered"]:
+        print(f"⚠️ Public db.py helpers without a benchmark case: {', '.join(report['uncovered'])}", file=sys.stderr)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✅ Wrote {len(report['cases'])} cases to {args.out}")
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.baseline:
+        baseline = load_report(args.baseline)
+        print(f"Compared with {args.baseline} ({baseline['meta']['version']}):")
+        for name, old, new, ratio in compare_reports(baseline, report):
+            if new is None and args.only:
+                continue
+            if ratio is None:
+                print(f"  {name:<36} {'—' if old is None else f'{old:.2f}':>10} → {'—' if new is None else f'{new:.2f}'}")
+            else:
+                print(f"  {name:<36} {old:>10.2f} → {new:>10.2f} ms  ×{ratio:.2f}")
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Valheim bot database tools")
+    parser.add_argument("--db", default=None, help="Path to the database (default: frags.db next to the bot)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("export", help="Stream an event to .jsonl/.csv (optionally .gz/.zst)")
+    p.add_argument("--event", default=None, help="Event name (default event if omitted)")
+    p.add_argument("--out", required=True, help="Output file, e.g. default.jsonl.zst")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("import", help="Stream an export file into an event (created if missing)")
+    p.add_argument("--event", default=None, help="Target event name (default event if omitted)")
+    p.add_argument("--file", required=True, help="File produced by export")
+    p.add_argument("--replace", action="store_true", help="Delete the event's data and overwrite links first")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("sync", help="Rebuild ratings of every event from frags, events in parallel")
+    p.add_argument("--event", action="append", help="Only this event (repeatable; default: all events)")
+    p.add_argument("--period", choices=("hour", "day", "session"), default=None,
+                   help="Glicko-2 rating period (default: every kill, like /mmrsync)")
+    p.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    p.set_defaults(func=cmd_sync)
+
+    p = sub.add_parser("tune", help="Rank Glicko-2 constants by how well they predict each next kill")
+    p.add_argument("--event", action="append", help="Only this event (repeatable; default: all events)")
+    p.add_argument("--rd0", default="200:400:5", help="Initial RD, also the decay cap: 'a,b,c' or 'lo:hi:n'")
+    p.add_argument("--c", default="0:60:7", help="RD decay per idle day: 'a,b,c' or 'lo:hi:n'")
+    p.add_argument("--vol", default="0.02:0.1:5", help="Volatility (fixed per kill; TAU does not apply): 'a,b,c' or 'lo:hi:n'")
+    p.add_argument("--random", type=int, default=0, help="Sample this many configs within the ranges instead of the grid")
+    p.add_argument("--seed", type=int, default=None, help="Seed for --random")
+    p.add_argument("--warmup", type=float, default=0.2, help="Fraction of each event's kills rated but not scored")
+    p.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    p.add_argument("--top", type=int, default=20, help="Rows of the ranking to print")
+    p.add_argument("--csv", default=None, help="Also write the full ranking to this CSV file")
+    p.set_defaults(func=cmd_tune)
+
+    p = sub.add_parser("generate", help="Fill an empty database with synthetic data for benchmarks")
+    p.add_argument("--players", type=int, default=3000, help="Characters")
+    p.add_argument("--frags", type=int, default=1_000_000, help="Frags across all events")
+    p.add_argument("--events", type=int, default=3, help="Events (the first one is the default)")
+    p.add_argument("--days", type=int, default=365, help="Days of history, ending now")
+    p.add_argument("--linked", type=float, default=0.6, help="Share of characters linked to a Discord user")
+    p.add_argument("--adjustments", type=int, default=None, help="Manual adjustments (default: one per 2,000 frags)")
+    p.add_argument("--no-ratings", action="store_true", help="Skip rebuilding ratings from the generated frags")
+    p.add_argument("--workers", type=int, default=None, help="Worker processes for the rating rebuild (default: CPU count)")
+    p.add_argument("--seed", type=int, default=1, help="Random seed (same seed, same data)")
+    p.set_defaults(func=cmd_generate)
+
+    p = sub.add_parser("bench", help="Time the db.py helpers and command queries; JSON report")
+    p.add_argument("--out", default=None, help="Write the JSON report here (default: stdout)")
+    p.add_argument("--baseline", default=None, help="Earlier report to compare with")
+    p.add_argument("--repeat", type=int, default=5, help="Timed runs per case after the first")
+    p.add_argument("--budget", type=float, default=2.0, help="Stop repeating a case after this many seconds")
+    p.add_argument("--only", default=None, help="Only cases whose name contains this")
+    p.add_argument("--writes", action="store_true", help="Also time helpers that modify the database")
+    p.set_defaults(func=cmd_bench)
+
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname).1s | %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
+    set_db_path(args.db or get_db_file_path())
+    init_db()
+    ensure_default_event()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
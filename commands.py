@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 # commands.py
 
+import io
 import os
 import re
 import sqlite3
@@ -22,7 +23,14 @@ from db import *
 from roles import *
 from announcer import *
 from utils import *
-from glicko2 import Player
+from profiler import sql_profiler, recent_traces, untraced
+from matchup import matchup_matrix, roster_ratings, seeding
+from charts import activity_chart, rating_chart
+from jobs import MAX_WORKERS, submit_rebuild, submit_rebuild_all
+from engines import ENGINES
+from leaderboard import top_players, player_rank
+from cache import result_cache, display_cache
+from autocomplete import event_choices, character_choices, target_choices
 
 def setup_commands(bot: commands.Bot):
     
@@ -51,6 +59,7 @@ def setup_commands(bot: commands.Bot):
 
     @bot.tree.command(name="link", description="Link a game character to a Discord user")
     @app_commands.describe(character="Character's name", user="Discord User")
+    @app_commands.autocomplete(character=character_choices)
     async def link(interaction: Interaction, character: str, user: discord.Member):
         if not await require_admin(interaction):
             return
@@ -98,6 +107,7 @@ def setup_commands(bot: commands.Bot):
 
     @bot.tree.command(name="unlink", description="Remove the connection between the character and the user")
     @app_commands.describe(character="Character's name")
+    @app_commands.autocomplete(character=character_choices)
     async def unlink(interaction: Interaction, character: str):
         if not await require_admin(interaction):
             return
@@ -226,6 +236,7 @@ def setup_commands(bot: commands.Bot):
         reason="Reason (optional)",
         event="Event name (optional)"
     )
+    @app_commands.autocomplete(target=target_choices, event=event_choices)
     async def points(interaction: Interaction, target: str, amount: int, reason: str = "Manual adjustment", event: Optional[str] = None):
         
         if not isinstance(interaction.user, discord.Member) or not interaction.user.guild_permissions.administrator:
@@ -289,6 +300,7 @@ def setup_commands(bot: commands.Bot):
 
     @bot.tree.command(name="pointlog", description="Show manual adjustment history")
     @app_commands.describe(target="Character name or @user", event="Event name (optional)")
+    @app_commands.autocomplete(target=target_choices, event=event_choices)
     async def pointlog(interaction: Interaction, target: str, event: Optional[str] = None):
         
         if not isinstance(interaction.user, discord.Member) or not interaction.user.guild_permissions.administrator:
@@ -310,14 +322,15 @@ def setup_commands(bot: commands.Bot):
             characters = [target.lower()]
 
         # Collecting the history of adjustments
-        with sqlite3.connect(get_db_path()) as conn:
+        with get_connection() as conn:
             c = conn.cursor()
             placeholders = ",".join("?" for _ in characters)
             query = f"""
-                SELECT character, adjustment, reason, timestamp
-                FROM manual_adjustments
-                WHERE character IN ({placeholders}) AND event_id = ?
-                ORDER BY timestamp DESC
+                SELECT ch.name, m.adjustment, m.reason, m.timestamp
+                FROM manual_adjustments m
+                JOIN characters ch ON ch.id = m.character_id
+                WHERE ch.name IN ({placeholders}) AND m.event_id = ?
+                ORDER BY m.timestamp DESC
                 LIMIT 20
             """
             c.execute(query, (*characters, event_id))
@@ -402,9 +415,10 @@ def setup_commands(bot: commands.Bot):
                     await channel.connect(timeout=30.0, reconnect=True)
                     await interaction.followup.send(f"🔈 Connected to **{channel.name}**")
                     
-                    # 🎵 Start playback tasks
-                    asyncio.create_task(audio_queue_worker(bot, interaction.guild))
-                    asyncio.create_task(start_heartbeat_loop(bot, interaction.guild))
+                    # 🎵 Start playback tasks (they outlive the command: keep them out of its trace)
+                    with untraced():
+                        asyncio.create_task(audio_queue_worker(bot, interaction.guild))
+                        asyncio.create_task(start_heartbeat_loop(bot, interaction.guild))
                     
                     break
                 except discord.errors.ConnectionClosed as e:
@@ -454,6 +468,7 @@ def setup_commands(bot: commands.Bot):
                 if os.path.exists(db_path):
                     os.rename(db_path, backup_file)
                 init_db()
+                notify_change("event")
                 await interaction.response.send_message(
                     "✅ Database has been reset.\n\n"
                     f"✅ Backup saved:\n {backup_file}\n\n"
@@ -474,6 +489,7 @@ def setup_commands(bot: commands.Bot):
                     os.remove(get_db_file_path())
                 os.replace(backup_path, get_db_file_path())
                 init_db()
+                notify_change("event")
                 await interaction.response.send_message(
                     "✅ Database restored from backup\n\n"
                     "**❗ Please restart the bot manually!**",
@@ -490,10 +506,195 @@ def setup_commands(bot: commands.Bot):
             logging.exception(f"❌ Unexpected error during reset: {e}")
             await interaction.response.send_message("❌ An unexpected error occurred during reset.", ephemeral=True)
 
+    @bot.tree.command(name="dbstats", description="Admin: SQL profiler — slowest statements and settings")
+    @app_commands.describe(
+        count="Number of statements to show",
+        sort="Sort by: total, max, avg, calls, steps",
+        enable="Turn profiling on/off",
+        sample="Share of connections to profile (0..1)",
+        slow_ms="Slow query log threshold in ms (0 = off)",
+        trace="Count SQL/REST calls per slash command and flag N+1 patterns",
+        reset="Clear collected stats"
+    )
+    async def dbstats(
+        interaction: Interaction,
+        count: int = 10,
+        sort: str = "total",
+        enable: Optional[bool] = None,
+        sample: Optional[float] = None,
+        slow_ms: Optional[float] = None,
+        trace: Optional[bool] = None,
+        reset: bool = False
+    ):
+        if not await require_admin(interaction):
+            return
+        if not await check_positive(interaction, count=count):
+            return
+        sort = sort.lower()
+        if sort not in ("total", "max", "avg", "calls", "steps"):
+            await interaction.response.send_message("❌ Sort must be one of: total, max, avg, calls, steps.", ephemeral=True)
+            return
+        if sample is not None and not 0 <= sample <= 1:
+            await interaction.response.send_message("❌ Sample must be between 0 and 1.", ephemeral=True)
+            return
+
+        if enable is not None or sample is not None or slow_ms is not None or trace is not None:
+            sql_profiler.configure(enabled=enable, sample_rate=sample, slow_ms=slow_ms, trace_commands=trace)
+            set_setting("db_profile", "1" if sql_profiler.enabled else "0")
+            set_setting("db_profile_sample", str(sql_profiler.sample_rate))
+            set_setting("db_slow_ms", str(sql_profiler.slow_ms))
+            set_setting("db_trace", "1" if sql_profiler.trace_commands else "0")
+        if reset:
+            sql_profiler.reset()
+            recent_traces.clear()
+            result_cache.reset_stats()
+            display_cache.reset_stats()
+
+        since = datetime.fromtimestamp(sql_profiler.since, timezone.utc)
+        embed = discord.Embed(
+            title="🩺 SQL Profiler",
+            description=(
+                f"Status: **{'on' if sql_profiler.enabled else 'off'}** | "
+                f"sample: **{sql_profiler.sample_rate:.2f}** | "
+                f"slow log: **{sql_profiler.slow_ms:.0f} ms** | "
+                f"command trace: **{'on' if sql_profiler.trace_commands else 'off'}**\n"
+                f"Collected since {since.strftime('%Y-%m-%d %H:%M')} UTC, sorted by **{sort}**"
+            ),
+            color=discord.Color.dark_teal()
+        )
+
+        stats = sql_profiler.top(min(count, 10), sort)  # embeds cap at 6000 chars
+        if not stats:
+            embed.add_field(name="—", value="No statements recorded yet.", inline=False)
+        for i, s in enumerate(stats, 1):
+            avg = s.total / s.calls if s.calls else 0.0
+            sql = s.sql if len(s.sql) <= 300 else s.sql[:297] + "..."
+            embed.add_field(
+                name=f"{i}. {s.calls} calls | total {s.total:.0f} ms | max {s.max:.1f} ms | avg {avg:.1f} ms",
+                value=f"steps: {s.steps} | top caller: `{s.top_caller}`\n```sql\n{sql}\n```",
+                inline=False
+            )
+
+        flagged = [t for t in reversed(recent_traces) if t.flags][:5]
+        if flagged:
+            lines = [
+                f"`/{t.command}` {t.sql_calls} SQL, {t.http_calls} REST, {t.elapsed_ms:.0f} ms — {t.flags[0][:80]}"
+                for t in flagged
+            ]
+            embed.add_field(name="🐌 Over budget (latest)", value="\n".join(lines), inline=False)
+
+        embed.add_field(name="🗃️ Result cache (/top, /topmmr, /stats)", value=result_cache.summary(), inline=False)
+        embed.add_field(name="🪪 Display cache (names, avatars, role colors)", value=display_cache.summary(), inline=False)
+
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    def transfer_progress(interaction: Interaction, verb: str):
+        """Progress callback for transfer.py running in a worker thread: edits the deferred reply."""
+        loop = asyncio.get_running_loop()
+
+        def report(table: str, done: int):
+            if table == "done":
+                return
+            asyncio.run_coroutine_threadsafe(
+                interaction.edit_original_response(content=f"⏳ {verb}: {done:,} rows ({table})..."), loop
+            )
+        return report
+
+    @bot.tree.command(name="export", description="Admin: export an event's data to a compressed JSONL/CSV file")
+    @app_commands.describe(
+        event="Event name (optional)",
+        fmt="File format: jsonl or csv",
+        compression="Compression: zst, gz or none"
+    )
+    @app_commands.autocomplete(event=event_choices)
+    async def export(interaction: Interaction, event: Optional[str] = None, fmt: str = "jsonl", compression: str = "zst"):
+        if not await require_admin(interaction):
+            return
+        fmt, compression = fmt.lower(), compression.lower()
+        if fmt not in ("jsonl", "csv") or compression not in ("zst", "gz", "none"):
+            await interaction.response.send_message("❌ Format must be jsonl/csv, compression zst/gz/none.", ephemeral=True)
+            return
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        event_id = get_event_id_by_name(event) if event else get_default_event_id()
+        if not event_id:
+            await interaction.followup.send(f"❌ Event `{event}` not found.", ephemeral=True)
+            return
+        event_name = (event or get_setting("default_event") or "arena").strip().lower()
+
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        suffix = f".{fmt}" + ("" if compression == "none" else f".{compression}")
+        path = os.path.join(EXPORT_DIR, f"{event_name}_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}{suffix}")
+
+        from transfer import export_event
+        try:
+            counts = await asyncio.to_thread(export_event, event_id, event_name, path, transfer_progress(interaction, "Exporting"))
+        except Exception as e:
+            logging.exception(f"❌ Export failed: {e}")
+            await interaction.followup.send(f"❌ Export failed: {e}", ephemeral=True)
+            return
+
+        summary = ", ".join(f"{table}: {n:,}" for table, n in counts.items()) or "no rows"
+        limit = interaction.guild.filesize_limit if interaction.guild else 10 * 1024 * 1024
+        if os.path.getsize(path) <= limit:
+            await interaction.followup.send(f"✅ Exported `{event_name}` ({summary})", file=discord.File(path), ephemeral=True)
+        else:
+            await interaction.followup.send(f"✅ Exported `{event_name}` ({summary})\n📁 Too large to attach, saved to `{path}`", ephemeral=True)
+
+    @bot.tree.command(name="import", description="Admin: import an exported JSONL/CSV file into an event")
+    @app_commands.describe(
+        file="Export file to upload (optional)",
+        filename=f"Or the name of a file already in the {EXPORT_DIR} folder",
+        event="Target event name (created if missing; default event if omitted)",
+        replace="Delete the event's frags, points and ratings before importing"
+    )
+    @app_commands.autocomplete(event=event_choices)
+    async def import_(
+        interaction: Interaction,
+        file: Optional[discord.Attachment] = None,
+        filename: Optional[str] = None,
+        event: Optional[str] = None,
+        replace: bool = False
+    ):
+        if not await require_admin(interaction):
+            return
+        if (file is None) == (filename is None):
+            await interaction.response.send_message("❌ Provide either a file or a filename.", ephemeral=True)
+            return
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        path = os.path.join(EXPORT_DIR, os.path.basename(file.filename if file else filename))
+        if file is not None:
+            await file.save(path)
+        elif not os.path.exists(path):
+            await interaction.followup.send(f"❌ File `{filename}` not found in `{EXPORT_DIR}`.", ephemeral=True)
+            return
+
+        try:
+            event_id = get_event_id_by_name(event) if event else get_default_event_id()
+            if not event_id:
+                event_id = create_event(event, "Imported")
+
+            from transfer import import_event
+            counts = await asyncio.to_thread(import_event, path, event_id, replace, transfer_progress(interaction, "Importing"))
+        except Exception as e:
+            logging.exception(f"❌ Import failed: {e}")
+            await interaction.followup.send(f"❌ Import failed: {e}", ephemeral=True)
+            return
+
+        summary = ", ".join(f"{table}: {n:,}" for table, n in counts.items()) or "no rows"
+        await interaction.followup.send(
+            f"✅ Imported into `{(event or get_setting('default_event') or 'arena').strip().lower()}` ({summary})\n"
+            "ℹ️ Run `/mmrsync` if ratings should be rebuilt from the imported frags.",
+            ephemeral=True
+        )
+
 # --- User Commands ---
 
     @bot.tree.command(name="top", description="Top players by total points (frags + adjustments)")
     @app_commands.describe(count="Number of top players", days="Days", event="Event name (optional)", public="Publish?")
+    @app_commands.autocomplete(event=event_choices)
     async def top(interaction: Interaction, count: int = 10, days: int = 1, event: Optional[str] = None, public: bool = False):
         if not await check_positive(interaction, count=count, days=days):
             return
@@ -514,111 +715,101 @@ def setup_commands(bot: commands.Bot):
             await interaction.followup.send(f"❌ Event `{event}` not found.", ephemeral=True)
             return
 
-        since = datetime.now(timezone.utc) - timedelta(days=days)
-        with sqlite3.connect(get_db_path()) as conn:
-            c = conn.cursor()
-            c.execute("""
-                SELECT killer, COUNT(*) as count FROM frags
-                WHERE timestamp >= ? AND event_id = ?
-                GROUP BY killer
-            """, (since, event_id))
-            raw_stats = c.fetchall()
-
-        # 📊 Aggregate frags and manual points (event-aware)
-        user_points = {}
-        for character, frags in raw_stats:
-            manual, _ = get_win_sources(character, event_id=event_id)
-            discord_id = get_character_owner(character)
-            key = discord_id if discord_id else character
-
-            if key not in user_points:
-                user_points[key] = {"characters": set(), "frags": 0, "manual": 0}
-
-            user_points[key]["characters"].add(character)
-            user_points[key]["frags"] += frags
-            user_points[key]["manual"] += manual
-
-        aggregated_stats = [
-            (key, data["characters"], data["frags"], data["manual"], data["frags"] + data["manual"])
-            for key, data in user_points.items()
-        ]
-        sorted_stats = sorted(aggregated_stats, key=lambda x: x[4], reverse=True)[:count]
+        guild = interaction.guild
 
-        if not sorted_stats:
-            await interaction.followup.send(f"❌ No data for last {days} day(s).", ephemeral=not public)
-            return
+        async def build_pages() -> LazyPages:
+            # 📊 Frags in the window + manual points, grouped by owner, with MMR: one query
+            since = datetime.now(timezone.utc) - timedelta(days=days)
+            sorted_stats = get_top_points(event_id, since, count)
+            if not sorted_stats:
+                return LazyPages(0, None)
 
-        # Get event name for display
-        event_name = event if event else "arena"
-        if not event:
-            try:
-                default_event_name = get_setting("default_event")
-                if default_event_name:
-                    event_name = default_event_name
-            except Exception:
-                pass
-        
-        medals = {1: "🥇", 2: "🥈", 3: "🥉"}
-        author_text = f"🏆 Top-{count} in {days} day(s) - Event: {event_name}"
-        page_size = 10
-        embeds = []
-
-        # 🖼️ Top user info
-        top_key = sorted_stats[0][0]
-        if isinstance(top_key, int):
-            member = interaction.guild.get_member(top_key)
-            top_display = {
-                "display_name": member.display_name if member else f"User {top_key}",
-                "avatar_url": member.display_avatar.url if member else None,
-                "color": member.top_role.color if member and member.top_role else discord.Color.default()
-            }
-        else:
-            top_display = await resolve_display_data(top_key, interaction.guild)
+            # Get event name for display
+            event_name = event if event else "arena"
+            if not event:
+                try:
+                    default_event_name = get_setting("default_event")
+                    if default_event_name:
+                        event_name = default_event_name
+                except Exception:
+                    pass
+            
+            medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+            author_text = f"🏆 Top-{count} in {days} day(s) - Event: {event_name}"
+
+            # 🖼️ Top user info
+            top_key = sorted_stats[0][0]
+            if isinstance(top_key, int):
+                member = guild.get_member(top_key)
+                top_display = {
+                    "display_name": member.display_name if member else f"User {top_key}",
+                    "avatar_url": member.display_avatar.url if member else None,
+                    "color": member.top_role.color if member and member.top_role else discord.Color.default()
+                }
+            else:
+                top_display = await resolve_display_data(top_key, guild)
+
+            # 📄 Leaderboard pages, rendered when shown
+            async def render(page: int) -> discord.Embed:
+                start = page * PAGE_SIZE
+                rows = sorted_stats[start:start + PAGE_SIZE]
+                display = await resolve_display_data_bulk([key for key, *_ in rows if not isinstance(key, int)], guild)
+
+                embed = discord.Embed(color=top_display.get("color", discord.Color.dark_grey()))
+                embed.set_author(name=author_text)
+                if top_display.get("avatar_url"):
+                    embed.set_thumbnail(url=top_display["avatar_url"])
+
+                for i, (key, characters, frags, manual, total, mmr) in enumerate(rows, start + 1):
+                    if isinstance(key, int):
+                        member = guild.get_member(key)
+                        display_data = {
+                            "display_name": member.display_name if member else f"User {key}",
+                            "avatar_url": member.display_avatar.url if member else None
+                        }
+                    else:
+                        display_data = display[key]
+
+                    medal = medals.get(i, "")
+                    char_list = ", ".join(characters)
+                    line = (
+                        f"Characters: `{char_list}`\n"
+                        f"Points: `{total}` (`{frags}` + `{manual}`)\n"
+                        f"MMR: `{mmr}`"
+                    )
 
-        # 📄 Build paginated leaderboard
-        for start in range(0, len(sorted_stats), page_size):
-            embed = discord.Embed(color=top_display.get("color", discord.Color.dark_grey()))
-            embed.set_author(name=author_text)
-            if top_display.get("avatar_url"):
-                embed.set_thumbnail(url=top_display["avatar_url"])
+                    embed.add_field(
+                        name=f"**{i}. {medal} {display_data['display_name'].upper()}**",
+                        value=line,
+                        inline=False
+                    )
+                return embed
 
-            for i, (key, characters, frags, manual, total) in enumerate(sorted_stats[start:start + page_size], start + 1):
-                if isinstance(key, int):
-                    member = interaction.guild.get_member(key)
-                    display_data = {
-                        "display_name": member.display_name if member else f"User {key}",
-                        "avatar_url": member.display_avatar.url if member else None
-                    }
-                    mmr = get_user_glicko_mmr(key, event_id)
-                else:
-                    display_data = await resolve_display_data(key, interaction.guild)
-                    rating_data = get_glicko_rating_extended(key, event_id)
-                    mmr = rating_data[0] if rating_data else "—"
-
-                medal = medals.get(i, "")
-                char_list = ", ".join(characters)
-                line = (
-                    f"Characters: `{char_list}`\n"
-                    f"Points: `{total}` (`{frags}` + `{manual}`)\n"
-                    f"MMR: `{mmr}`"
-                )
+            async def locate(user_id: int) -> int | str:
+                # linked players are keyed by their Discord id
+                for i, (key, *_) in enumerate(sorted_stats):
+                    if key == user_id:
+                        return i // PAGE_SIZE
+                return f"📍 You're not in this top-{count}."
 
-                embed.add_field(
-                    name=f"**{i}. {medal} {display_data['display_name'].upper()}**",
-                    value=line,
-                    inline=False
-                )
+            return LazyPages(page_count(len(sorted_stats)), render, locate)
 
-            embeds.append(embed)
+        pages = await result_cache.get_or_compute(
+            ("top", interaction.guild.id, event_id, event, days, count), build_pages, event_id
+        )
+        if not pages:
+            await interaction.followup.send(f"❌ No data for last {days} day(s).", ephemeral=not public)
+            return
 
-        if len(embeds) == 1:
-            await interaction.followup.send(embed=embeds[0], ephemeral=not public)
+        if len(pages) == 1:
+            await interaction.followup.send(embed=await pages.page(0), ephemeral=not public)
         else:
-            view = PaginatedStatsView(embeds, ephemeral=not public)
+            view = PaginatedStatsView(pages, ephemeral=not public)
             await view.send_initial(interaction)
 
     @bot.tree.command(name="mystats", description="Show your stats (all linked characters)")
     @app_commands.describe(days="Days", event="Event name (optional)", public="Publish?")
+    @app_commands.autocomplete(event=event_choices)
     async def mystats(interaction: Interaction, days: int = 1, event: Optional[str] = None, public: bool = False):
         if public and (not isinstance(interaction.user, discord.Member) or not interaction.user.guild_permissions.administrator):
             await interaction.response.send_message("⚠️ Admin only", ephemeral=True)
@@ -641,35 +832,29 @@ def setup_commands(bot: commands.Bot):
             return
 
         avatar_url = interaction.user.display_avatar.url if hasattr(interaction.user, "display_avatar") else None
-        # filter characters by activity in this event and time window
-        since = datetime.now(timezone.utc) - timedelta(days=days)
-        filtered_characters = []
-        for ch in characters:
-            w, l, t = get_fight_stats(ch, since, event_id)
-            if t > 0:
-                filtered_characters.append(ch)
-
-        if not filtered_characters:
-            await interaction.followup.send("❌ No stats available for this player.", ephemeral=not public)
-            return
 
-        embeds = await generate_stats_embeds(
-            interaction,
-            filtered_characters,
-            days,
-            event_id=event_id,
-            avatar_url=avatar_url,
-            target_user_id=user_id
-        )
+        async def build_pages() -> Optional[LazyPages]:
+            # characters without fights in the window are left out by generate_stats_pages
+            return await generate_stats_pages(
+                interaction,
+                characters,
+                days,
+                event_id=event_id,
+                avatar_url=avatar_url,
+                target_user_id=user_id
+            )
 
-        if not embeds:
+        pages = await result_cache.get_or_compute(
+            ("mystats", interaction.guild_id, event_id, days, tuple(characters), user_id), build_pages, event_id
+        )
+        if not pages:
             await interaction.followup.send("❌ No stats available for this player.", ephemeral=not public)
             return
 
-        if len(embeds) == 1:
-            await interaction.followup.send(embed=embeds[0], ephemeral=not public)
+        if len(pages) == 1:
+            await interaction.followup.send(embed=await pages.page(0), ephemeral=not public)
         else:
-            view = PaginatedStatsView(embeds, ephemeral=not public)
+            view = PaginatedStatsView(pages, ephemeral=not public)
             await view.send_initial(interaction)
 
     @bot.tree.command(name="stats", description="Show player stats")
@@ -679,6 +864,7 @@ def setup_commands(bot: commands.Bot):
         event="Event name (optional)",
         public="Publish?"
     )
+    @app_commands.autocomplete(player=target_choices, event=event_choices)
     async def stats(interaction: Interaction, player: str, days: int = 1, event: Optional[str] = None, public: bool = False):
         # 🛡️ Admin check
         if public and (not isinstance(interaction.user, discord.Member) or not interaction.user.guild_permissions.administrator):
@@ -695,7 +881,6 @@ def setup_commands(bot: commands.Bot):
             await interaction.followup.send(f"❌ Event `{event}` not found.", ephemeral=True)
             return
 
-        avatar_url = None
         characters = []
         user_id = None
 
@@ -705,47 +890,205 @@ def setup_commands(bot: commands.Bot):
             if not characters:
                 await interaction.followup.send("❌ No characters linked to this user.", ephemeral=True)
                 return
-            try:
-                user = await bot.fetch_user(user_id)
-                avatar_url = user.display_avatar.url if hasattr(user, "display_avatar") else None
-            except Exception:
-                avatar_url = None
         else:
             characters = [player.lower()]
 
-        # filter characters by activity in this event and time window
-        since = datetime.now(timezone.utc) - timedelta(days=days)
-        filtered_characters = []
-        for ch in characters:
-            w, l, t = get_fight_stats(ch, since, event_id)
-            if t > 0:
-                filtered_characters.append(ch)
+        async def build_pages() -> Optional[LazyPages]:
+            avatar_url = None
+            if user_id is not None:
+                try:
+                    user = await bot.fetch_user(user_id)
+                    avatar_url = user.display_avatar.url if hasattr(user, "display_avatar") else None
+                except Exception:
+                    avatar_url = None
+
+            # characters without fights in the window are left out by generate_stats_pages
+            return await generate_stats_pages(
+                interaction,
+                characters,
+                days,
+                event_id=event_id,
+                avatar_url=avatar_url,
+                target_user_id=user_id
+            )
 
-        if not filtered_characters:
+        pages = await result_cache.get_or_compute(
+            ("stats", interaction.guild_id, event_id, days, tuple(characters), user_id), build_pages, event_id
+        )
+        if not pages:
             await interaction.followup.send("❌ No stats available for this player.", ephemeral=not public)
             return
 
-        embeds = await generate_stats_embeds(
-            interaction,
-            filtered_characters,
-            days,
-            event_id=event_id,
-            avatar_url=avatar_url,
-            target_user_id=user_id
-        )
+        if len(pages) == 1:
+            await interaction.followup.send(embed=await pages.page(0), ephemeral=not public)
+        else:
+            view = PaginatedStatsView(pages, ephemeral=not public)
+            await view.send_initial(interaction)
 
-        if not embeds:
-            await interaction.followup.send("❌ No stats available for this player.", ephemeral=not public)
+    MATCHUP_MATRIX_MAX = 8  # larger rosters get the full matrix as a CSV attachment
+
+    @bot.tree.command(name="matchup", description="Expected win % between players (tournament seeding)")
+    @app_commands.describe(
+        players="Two or more characters or @users, separated by spaces or commas",
+        event="Event name (optional)",
+        public="Publish?"
+    )
+    @app_commands.autocomplete(event=event_choices)
+    async def matchup(interaction: Interaction, players: str, event: Optional[str] = None, public: bool = False):
+        if public and (not isinstance(interaction.user, discord.Member) or not interaction.user.guild_permissions.administrator):
+            await interaction.response.send_message("⚠️ Admin only", ephemeral=True)
             return
 
-        if len(embeds) == 1:
-            await interaction.followup.send(embed=embeds[0], ephemeral=not public)
+        event_id = get_event_id_by_name(event) if event else get_default_event_id()
+        if not event_id:
+            await interaction.response.send_message(f"❌ Event `{event}` not found.", ephemeral=True)
+            return
+
+        # 🔍 Characters and @users, in the given order, without duplicates
+        entries, labels = [], []
+        for token in re.split(r"[\s,]+", players.strip()):
+            if not token:
+                continue
+            if match := re.fullmatch(r"<@!?(\d+)>", token):
+                entry = int(match.group(1))
+                member = interaction.guild.get_member(entry) if interaction.guild else None
+                label = member.display_name if member else f"user {entry}"
+            else:
+                entry = label = token.lower()
+            if entry not in entries:
+                entries.append(entry)
+                labels.append(label)
+        if len(entries) < 2:
+            await interaction.response.send_message("❌ Give at least two characters or @users.", ephemeral=True)
+            return
+
+        ratings, rds = roster_ratings(entries, event_id)
+        probs = matchup_matrix(ratings, rds)
+
+        if len(entries) == 2:
+            p = probs[0, 1]
+            embed = discord.Embed(title="🎲 Matchup", color=discord.Color.blurple())
+            embed.description = (
+                f"**{labels[0]}** `{ratings[0]:.0f}` ±{rds[0]:.0f} — **{p:.0%}**\n"
+                f"**{labels[1]}** `{ratings[1]:.0f}` ±{rds[1]:.0f} — **{1 - p:.0%}**"
+            )
+            await interaction.response.send_message(embed=embed, ephemeral=not public)
+            return
+
+        # 🏅 Seeding by expected win rate against the rest of the roster
+        order = seeding(probs)
+        field = (probs.sum(axis=1) - 0.5) / (len(entries) - 1)
+        embed = discord.Embed(title=f"🎲 Matchup — {len(entries)} players", color=discord.Color.blurple())
+        lines = [
+            f"`{seed}.` **{labels[i]}** `{ratings[i]:.0f}` ±{rds[i]:.0f} — {field[i]:.0%} vs field"
+            for seed, i in enumerate(order.tolist(), 1)
+        ]
+        embed.description = "\n".join(lines)[:4000]
+
+        files = []
+        if len(entries) <= MATCHUP_MATRIX_MAX:
+            short = [labels[i][:6] for i in order]
+            rows = [" " * 7 + " ".join(f"{name:>6}" for name in short)]
+            for i, name in zip(order.tolist(), short):
+                rows.append(f"{name:>6} " + " ".join(
+                    "     -" if i == j else f"{probs[i, j]:>6.0%}" for j in order.tolist()
+                ))
+            embed.add_field(name="Row beats column", value="```\n" + "\n".join(rows) + "\n```", inline=False)
         else:
-            view = PaginatedStatsView(embeds, ephemeral=not public)
-            await view.send_initial(interaction)
+            csv_rows = ["," + ",".join(labels[j] for j in order)]
+            for i in order.tolist():
+                csv_rows.append(labels[i] + "," + ",".join(f"{probs[i, j]:.3f}" for j in order.tolist()))
+            files.append(discord.File(io.BytesIO("\n".join(csv_rows).encode("utf-8")), filename="matchup.csv"))
+            embed.set_footer(text="matchup.csv: probability that the row player beats the column player")
+
+        await interaction.response.send_message(embed=embed, files=files, ephemeral=not public)
+
+    CHART_DAYS = 30  # default range of /mmrchart and /activity
+    CHART_CHARACTERS = 8  # a user's characters plotted by /mmrchart
+
+    async def chart_target(interaction: Interaction, target: str) -> Optional[tuple[list[str], str]]:
+        """(characters, label) for a character name or @user; replies and returns None if the user has none."""
+        if match := re.match(r"<@!?(\d+)>", target):
+            user_id = int(match.group(1))
+            characters = get_user_characters(user_id)
+            if not characters:
+                await interaction.response.send_message("❌ No characters linked to this user.", ephemeral=True)
+                return None
+            member = interaction.guild.get_member(user_id) if interaction.guild else None
+            return characters, member.display_name if member else f"user {user_id}"
+        return [target.lower()], target.lower()
+
+    async def send_chart(interaction: Interaction, png: Optional[bytes], filename: str, title: str, public: bool):
+        if png is None:
+            await interaction.followup.send("ℹ️ No data for this chart.", ephemeral=True)
+            return
+        embed = discord.Embed(title=title, color=discord.Color.blurple())
+        embed.set_image(url=f"attachment://{filename}")
+        await interaction.followup.send(embed=embed, file=discord.File(io.BytesIO(png), filename=filename), ephemeral=not public)
+
+    @bot.tree.command(name="mmrchart", description="Chart the rating of a character or user over time")
+    @app_commands.describe(
+        target="Character name or @user",
+        days=f"Days to show (default {CHART_DAYS})",
+        event="Event name (optional)",
+        public="Publish?"
+    )
+    @app_commands.autocomplete(target=target_choices, event=event_choices)
+    async def mmrchart(interaction: Interaction, target: str, days: int = CHART_DAYS, event: Optional[str] = None, public: bool = False):
+        if public and (not isinstance(interaction.user, discord.Member) or not interaction.user.guild_permissions.administrator):
+            await interaction.response.send_message("⚠️ Admin only", ephemeral=True)
+            return
+        if not await check_positive(interaction, days=days):
+            return
+
+        event_id = get_event_id_by_name(event) if event else get_default_event_id()
+        if not event_id:
+            await interaction.response.send_message(f"❌ Event `{event}` not found.", ephemeral=True)
+            return
+
+        resolved = await chart_target(interaction, target)
+        if resolved is None:
+            return
+        characters, label = resolved
+
+        await interaction.response.defer(ephemeral=not public)
+        png = await rating_chart(characters[:CHART_CHARACTERS], event_id, days, f"{label}: rating, last {days} days")
+        await send_chart(interaction, png, "mmr.png", f"📉 Rating of {label}", public)
+
+    @bot.tree.command(name="activity", description="Kills per weekday and hour for a character, a user or the whole event")
+    @app_commands.describe(
+        target="Character name or @user (default: everyone)",
+        days=f"Days to count (default {CHART_DAYS})",
+        event="Event name (optional)",
+        public="Publish?"
+    )
+    @app_commands.autocomplete(target=target_choices, event=event_choices)
+    async def activity(interaction: Interaction, target: Optional[str] = None, days: int = CHART_DAYS, event: Optional[str] = None, public: bool = False):
+        if public and (not isinstance(interaction.user, discord.Member) or not interaction.user.guild_permissions.administrator):
+            await interaction.response.send_message("⚠️ Admin only", ephemeral=True)
+            return
+        if not await check_positive(interaction, days=days):
+            return
+
+        event_id = get_event_id_by_name(event) if event else get_default_event_id()
+        if not event_id:
+            await interaction.response.send_message(f"❌ Event `{event}` not found.", ephemeral=True)
+            return
+
+        characters, label = None, "everyone"
+        if target:
+            resolved = await chart_target(interaction, target)
+            if resolved is None:
+                return
+            characters, label = resolved
+
+        await interaction.response.defer(ephemeral=not public)
+        png = await activity_chart(characters, event_id, days, f"{label}: kills per hour, last {days} days")
+        await send_chart(interaction, png, "activity.png", f"🗓️ Activity of {label}", public)
 
     @bot.tree.command(name="whois", description="Show who owns the character or what characters belong to a user")
     @app_commands.describe(character="Character or @user")
+    @app_commands.autocomplete(character=target_choices)
     async def whois(interaction: Interaction, character: str):
         await interaction.response.defer(thinking=True, ephemeral=True)
         match = re.match(r"<@!?(\d+)>", character)  # check if @mention
@@ -821,6 +1164,7 @@ def setup_commands(bot: commands.Bot):
         reason="Optional reason for the change",
         event="Event name (optional)"
     )
+    @app_commands.autocomplete(target=target_choices, event=event_choices)
     async def mmr(interaction: Interaction, target: str, value: str, reason: str = "Manual MMR adjustment", event: Optional[str] = None):
         
         if not isinstance(interaction.user, discord.Member) or not interaction.user.guild_permissions.administrator:
@@ -879,7 +1223,7 @@ def setup_commands(bot: commands.Bot):
         changed = []
 
         for character in characters:
-            rating, rd, vol, _ = get_glicko_rating_extended(character, event_id=event_id)
+            rating, rd, vol, _ = get_glicko_rating_extended(character, event_id=event_id, decay=False)
 
             if delta is not None:
                 new_rating = rating + delta
@@ -890,7 +1234,7 @@ def setup_commands(bot: commands.Bot):
 
             set_glicko_rating(character, new_rating, rd, vol, event_id=event_id)
 
-            with sqlite3.connect(get_db_path()) as conn:
+            with get_connection() as conn:
                 conn.execute("""
                     INSERT INTO glicko_history (character, delta, reason, event_id)
                     VALUES (?, ?, ?, ?)
@@ -922,14 +1266,36 @@ def setup_commands(bot: commands.Bot):
 
         await interaction.followup.send(embed=embed, ephemeral=True)
 
-    @bot.tree.command(name="mmrlog", description="Show MMR rating adjustment history for a character or user")
-    @app_commands.describe(target="Character name or @user", event="Event name (optional)")
-    async def mmrlog(interaction: Interaction, target: str, event: Optional[str] = None):
+    MMRLOG_POINTS = 10  # rating snapshots shown per character
+    MMRLOG_CHARACTERS = 10  # a user's characters shown (embed field limit)
+
+    @bot.tree.command(name="mmrlog", description="Show rating history and MMR adjustments for a character or user")
+    @app_commands.describe(
+        target="Character name or @user",
+        event="Event name (optional)",
+        date="Show the rating at the end of this day: DD.MM.YYYY or YYYY-MM-DD (optional)"
+    )
+    @app_commands.autocomplete(target=target_choices, event=event_choices)
+    async def mmrlog(interaction: Interaction, target: str, event: Optional[str] = None, date: Optional[str] = None):
         
         if not isinstance(interaction.user, discord.Member) or not interaction.user.guild_permissions.administrator:
             await interaction.response.send_message("⚠️ Admin only", ephemeral=True)
             return
 
+        at = None
+        if date:
+            for fmt in ("%d.%m.%Y", "%Y-%m-%d"):
+                try:
+                    at = datetime.strptime(date, fmt).replace(tzinfo=timezone.utc) + timedelta(days=1, microseconds=-1)
+                    break
+                except ValueError:
+                    continue
+            if at is None:
+                await interaction.response.send_message(
+                    "❌ Invalid date format. Use DD.MM.YYYY (e.g., 14.02.2026) or YYYY-MM-DD.", ephemeral=True
+                )
+                return
+
         await interaction.response.defer(ephemeral=True)
 
         event_id = get_event_id_by_name(event) if event else get_default_event_id()
@@ -942,8 +1308,9 @@ def setup_commands(bot: commands.Bot):
                 return
         else:
             characters = [target.lower()]
+        characters = characters[:MMRLOG_CHARACTERS]
 
-        with sqlite3.connect(get_db_path()) as conn:
+        with get_connection() as conn:
             c = conn.cursor()
             placeholders = ",".join("?" for _ in characters)
             c.execute(f"""
@@ -955,8 +1322,14 @@ def setup_commands(bot: commands.Bot):
             """, (*characters, event_id))
             rows = c.fetchall()
 
-        if not rows:
-            await interaction.followup.send("ℹ️ No MMR rating adjustments found.", ephemeral=True)
+        # rating time series (rating_history): one index seek per character
+        if at is not None:
+            series = {ch: [point] for ch in characters if (point := get_rating_at(ch, at, event_id))}
+        else:
+            series = {ch: points for ch in characters if (points := get_rating_series(ch, event_id, limit=MMRLOG_POINTS))}
+
+        if not rows and not series:
+            await interaction.followup.send("ℹ️ No rating history or MMR adjustments found.", ephemeral=True)
             return
 
         # Get event name for display
@@ -970,11 +1343,16 @@ def setup_commands(bot: commands.Bot):
                 pass
 
         embed = discord.Embed(
-            title=f"📜 MMR Adjustment Log - Event: {event_name}",
+            title=f"📜 MMR Log - Event: {event_name}",
             color=discord.Color.blurple(),
             timestamp=datetime.now(timezone.utc)
         )
 
+        for char, points in series.items():
+            lines = [f"`{rating:.0f}` ±{rd:.0f} ({ts.strftime('%Y-%m-%d %H:%M')})" for ts, rating, rd, _ in reversed(points)]
+            title = f"📈 {char} at end of {at.strftime('%Y-%m-%d')}" if at is not None else f"📈 {char}"
+            embed.add_field(name=title, value="\n".join(lines), inline=False)
+
         grouped = defaultdict(list)
         for character, delta, reason, ts in rows:
             ts_fmt = datetime.fromisoformat(ts).strftime("%Y-%m-%d %H:%M")
@@ -982,11 +1360,13 @@ def setup_commands(bot: commands.Bot):
             grouped[character].append(line)
 
         for char, lines in grouped.items():
-            embed.add_field(name=f"🎮 {char}", value="\n".join(lines), inline=False)
+            embed.add_field(name=f"🛠️ {char}", value="\n".join(lines), inline=False)
 
-        embed.set_footer(text="Most recent 20 changes")
+        snapshots = "Rating at end of day" if at is not None else f"Last {MMRLOG_POINTS} rating snapshots per character"
+        embed.set_footer(text=f"{snapshots} • most recent 20 adjustments")
         await interaction.followup.send(embed=embed, ephemeral=True)
 
+
     @bot.tree.command(name="mmrroleset", description="Set a MMR role for a threshold")
     @app_commands.describe(threshold="Minimum MMR", role="Discord role")
     async def mmrroleset(interaction: Interaction, threshold: int, role: discord.Role):
@@ -1043,179 +1423,222 @@ def setup_commands(bot: commands.Bot):
         clear_mmr_roles()
         await interaction.response.send_message("🧹 All MMR roles settings have been cleared.", ephemeral=True)
 
+    MMRSYNC_REFRESH = 3  # seconds between progress edits
+
+    async def follow_job(interaction: Interaction, job, render) -> bool:
+        """
+        Re-renders the reply every MMRSYNC_REFRESH seconds until the job ends. Returns False if the
+        reply can no longer be edited (the interaction token expires after 15 minutes).
+        """
+        while not job.task.done():
+            await asyncio.wait({job.task}, timeout=MMRSYNC_REFRESH)
+            if not job.task.done():
+                try:
+                    await interaction.edit_original_response(embed=render())
+                except discord.HTTPException:
+                    return False  # the job still finishes and logs
+        return True
+
+    async def send_job_result(interaction: Interaction, embed: discord.Embed, editable: bool):
+        if editable:
+            try:
+                await interaction.edit_original_response(embed=embed)
+                return
+            except discord.HTTPException:
+                pass
+        await interaction.followup.send(embed=embed, ephemeral=True)
+
+    def mmrsync_progress_embed(job, event_name: str, note: Optional[str] = None) -> discord.Embed:
+        embed = discord.Embed(title=f"⏳ MMR Sync — job #{job.id}", color=discord.Color.orange())
+        if job.status == "queued":
+            progress = "Waiting for a worker..."
+        elif job.status == "saving":
+            progress = "Saving ratings..."
+        elif job.total:
+            progress = f"{job.done:,}/{job.total:,} {job.unit} replayed ({job.done / job.total:.0%})"
+        else:
+            progress = "Loading frags..."
+        embed.description = f"Event **{event_name}**\n{progress}"
+        if note:
+            embed.description += f"\n\n{note}"
+        embed.set_footer(text=f"MMR Admin Tool • {job.elapsed:.0f}s")
+        return embed
+
     @bot.tree.command(name="mmrsync", description="🔁 Rebuild MMR from frags table for specific event")
     @app_commands.describe(
         event="Event name to rebuild",
-        start_date="Start date DD.MM.YYYY (optional)"
+        start_date="Recalculate from DD.MM.YYYY, resuming from the last checkpoint before it (optional)",
+        period="Glicko-2 rating period: hour, day or session (default: every kill, like live updates)"
     )
-    async def mmrsync(interaction: Interaction, event: str, start_date: Optional[str] = None):
+    @app_commands.autocomplete(event=event_choices)
+    async def mmrsync(interaction: Interaction, event: str, start_date: Optional[str] = None, period: Optional[str] = None):
 
         if not isinstance(interaction.user, discord.Member) or not interaction.user.guild_permissions.administrator:
             await interaction.response.send_message("⚠️ Admin only", ephemeral=True)
             return
 
-        await interaction.response.defer(thinking=True, ephemeral=True)
+        if period is not None and period.lower() not in ("hour", "day", "session"):
+            await interaction.response.send_message("❌ Period must be one of: hour, day, session.", ephemeral=True)
+            return
+        period = period.lower() if period else None
+        if period and start_date:
+            await interaction.response.send_message(
+                "❌ start_date resumes a per-kill sync from a checkpoint; rating periods always rebuild from scratch.",
+                ephemeral=True
+            )
+            return
 
-        try:
-            # 🗂️ Get the specific event
-            ev = get_event_by_name(event)
-            if not ev:
-                await interaction.followup.send(f"❌ Event '{event}' not found.", ephemeral=True)
+        # 🗂️ Get the specific event
+        ev = get_event_by_name(event)
+        if not ev:
+            await interaction.response.send_message(f"❌ Event '{event}' not found.", ephemeral=True)
+            return
+
+        event_id, event_name, *_ = ev
+
+        # 📖 Parse the optional start date
+        start_dt = None
+        if start_date:
+            parsed = None
+            for fmt in ("%d.%m.%Y", "%Y-%m-%d"):
+                try:
+                    parsed = datetime.strptime(start_date, fmt)
+                    break
+                except ValueError:
+                    continue
+            if not parsed:
+                await interaction.response.send_message(
+                    "❌ Invalid start_date format. Use DD.MM.YYYY (e.g., 14.02.2026) or YYYY-MM-DD.",
+                    ephemeral=True
+                )
                 return
+            start_dt = parsed.replace(tzinfo=timezone.utc)
 
-            event_id, event_name, *_ = ev
-            logging.info(f"🔄 Rebuilding MMR for event '{event_name}' (id={event_id})")
+        # 🚀 Replay in a worker process: from the last checkpoint before start_date, or all frags.
+        # A second /mmrsync for the same event follows the running job instead of starting another.
+        job, created = submit_rebuild(event_id, start_dt.date() if start_dt else None, period)
+        if created:
+            logging.info(f"🔄 Rebuilding MMR for event '{event_name}' (id={event_id}, period={period or 'kill'}) as job #{job.id}")
+        note = None if created else f"A sync for this event was already running: following job #{job.id} instead."
+        await interaction.response.send_message(embed=mmrsync_progress_embed(job, event_name, note), ephemeral=True)
 
-            # 🧹 Clearing old data only for this event
-            with sqlite3.connect(get_db_path()) as conn:
-                conn.execute("DELETE FROM glicko_ratings WHERE event_id = ?", (event_id,))
-                conn.commit()
+        editable = await follow_job(interaction, job, lambda: mmrsync_progress_embed(job, event_name, note))
+        try:
+            result = (await job.wait())[event_id]
+        except Exception:
+            await interaction.followup.send(f"❌ Failed to run MMR sync (job #{job.id}).", ephemeral=True)
+            return
 
-            # 📖 We read all the frags on the event
-            with sqlite3.connect(get_db_path()) as conn:
-                c = conn.cursor()
-                start_dt = None
-                if start_date:
-                    parsed = None
-                    for fmt in ("%d.%m.%Y", "%Y-%m-%d"):
-                        try:
-                            parsed = datetime.strptime(start_date, fmt)
-                            break
-                        except ValueError:
-                            continue
-                    if not parsed:
-                        await interaction.followup.send(
-                            "❌ Invalid start_date format. Use DD.MM.YYYY (e.g., 14.02.2026) or YYYY-MM-DD.",
-                            ephemeral=True
-                        )
-                        return
-                    start_dt = parsed.replace(tzinfo=timezone.utc)
-
-                if start_dt:
-                    c.execute("""
-                        SELECT killer, victim, timestamp 
-                        FROM frags 
-                        WHERE event_id = ? AND timestamp >= ?
-                        ORDER BY timestamp ASC
-                    """, (event_id, start_dt.isoformat()))
-                else:
-                    c.execute("""
-                        SELECT killer, victim, timestamp 
-                        FROM frags 
-                        WHERE event_id = ? 
-                        ORDER BY timestamp ASC
-                    """, (event_id,))
-                rows = c.fetchall()
-
-            if not rows:
-                if start_date:
-                    await interaction.followup.send(
-                        f"❌ No frags found for event '{event_name}' from {start_date}.",
-                        ephemeral=True
-                    )
-                else:
-                    await interaction.followup.send(f"❌ No frags found for event '{event_name}'.", ephemeral=True)
-                return
+        if not len(result):
+            if job.from_day:
+                await interaction.followup.send(
+                    f"❌ No frags found for event '{event_name}' from {job.from_day.isoformat()}.",
+                    ephemeral=True
+                )
+            else:
+                await interaction.followup.send(f"❌ No frags found for event '{event_name}'.", ephemeral=True)
+            return
 
-            # 🎯 Grouping the fights by day
-            battles_by_day = defaultdict(list)
-            all_dates = []
-
-            for killer, victim, ts in rows:
-                day = datetime.fromisoformat(ts).date()
-                battles_by_day[day].append((killer.lower(), victim.lower()))
-                all_dates.append(day)
-
-            first_date = min(all_dates)
-            end_date = max(all_dates)
-            all_players = {}
-
-            # 🚀 Recalculating day by day
-            current_date = first_date
-            while current_date <= end_date:
-                fights = battles_by_day.get(current_date, [])
-
-                participated_today = set()
-
-                for killer, victim in fights:
-                    if killer not in all_players:
-                        all_players[killer] = Player()
-                    if victim not in all_players:
-                        all_players[victim] = Player()
-
-                    p1 = all_players[killer]
-                    p2 = all_players[victim]
-
-                    p1.update_player([p2.getRating()], [p2.getRd()], [1])
-                    p2.update_player([p1.getRating()], [p1.getRd()], [0])
-
-                    participated_today.update([killer, victim])
-
-                # 📉 decay for those who didn't play that day
-                for name, player in all_players.items():
-                    if name not in participated_today:
-                        player.pre_rating_period()
-
-                current_date += timedelta(days=1)
-
-            # ✅ Saving the results
-            with sqlite3.connect(get_db_path()) as conn:
-                for name, player in all_players.items():
-                    last_act = get_last_active_iso(name, event_id=event_id)
-                    set_glicko_rating(
-                        name,
-                        player.getRating(),
-                        player.getRd(),
-                        player._vol,
-                        event_id=event_id,
-                        last_activity=last_act,
-                    )
+        end_date = result.last_day
+        all_players = result.character_ids
 
-            # --- Build response embed ---
-            embed = discord.Embed(
-                title="🔁 MMR Sync Complete",
-                color=discord.Color.green()
+        # --- Build response embed ---
+        embed = discord.Embed(
+            title="🔁 MMR Sync Complete",
+            color=discord.Color.green()
+        )
+
+        label = f"{event_name}"
+        if event_id == get_default_event_id():
+            label = f"{label} (default)"
+
+        if job.from_day:
+            embed.description = (
+                f"Sync complete for event **{label}**.\n"
+                f"Players rebuilt: **{len(all_players)}**\n"
+                f"Replayed: {result.first_day.isoformat()} to {end_date.isoformat()} "
+                f"({result.frags} frags since the last checkpoint before {job.from_day.strftime('%d.%m.%Y')})\n\n"
+                "Ratings recalculated from frags data"
+            )
+        else:
+            embed.description = (
+                f"Sync complete for event **{label}**.\n"
+                f"Players rebuilt: **{len(all_players)}**\n\n"
+                "All ratings recalculated from frags data"
             )
+        if job.period:
+            embed.description += f"\nRating periods: **{job.period}** (Glicko-2 with volatility)"
+        embed.set_footer(text=f"MMR Admin Tool • job #{job.id} • {job.elapsed:.1f}s")
 
-            # mark default event if it matches
-            default_event_id = None
-            try:
-                default_name = get_setting("default_event")
-                if default_name:
-                    def_ev = get_event_by_name(default_name)
-                    if def_ev:
-                        default_event_id = def_ev[0]
-            except Exception:
-                default_event_id = None
+        await send_job_result(interaction, embed, editable)
+        logging.info(f"✅ MMR sync finished for event '{event_name}' ({len(all_players)} players)")
 
-            label = f"{event_name}"
-            if default_event_id is not None and event_id == default_event_id:
-                label = f"{label} (default)"
+    @bot.tree.command(name="mmrsyncall", description="🔁 Rebuild MMR of every event in parallel")
+    @app_commands.describe(period="Glicko-2 rating period: hour, day or session (default: every kill, like live updates)")
+    async def mmrsyncall(interaction: Interaction, period: Optional[str] = None):
+        if not await require_admin(interaction):
+            return
+        if period is not None and period.lower() not in ("hour", "day", "session"):
+            await interaction.response.send_message("❌ Period must be one of: hour, day, session.", ephemeral=True)
+            return
+        period = period.lower() if period else None
 
-            if start_date:
-                embed.description = (
-                    f"Sync complete for event **{label}**.\n"
-                    f"Players rebuilt: **{len(all_players)}**\n"
-                    f"Period: from {start_date} to {end_date.isoformat()}\n\n"
-                    "Ratings recalculated from frags data"
-                )
+        names = dict(list_event_ids())
+        try:
+            job = submit_rebuild_all(list(names), period)
+        except RuntimeError as e:
+            await interaction.response.send_message(f"⏳ Cannot start: {e}.", ephemeral=True)
+            return
+        logging.info(f"🔄 Rebuilding MMR for {len(names)} events (period={period or 'kill'}) as job #{job.id}")
+
+        def progress_embed() -> discord.Embed:
+            embed = discord.Embed(title=f"⏳ MMR Sync (all events) — job #{job.id}", color=discord.Color.orange())
+            lines = []
+            for event_id, name in names.items():
+                done, total = job.progress.get(event_id, (0, 0))
+                if event_id in job.progress and total and done == total:
+                    lines.append(f"✅ **{name}** — {total:,} {job.unit}")
+                elif event_id in job.progress:
+                    lines.append(f"⚙️ **{name}** — {done:,}/{total:,} {job.unit}" if total else f"⚙️ **{name}** — loading frags")
+                else:
+                    lines.append(f"🕓 **{name}** — waiting for a worker")
+            if job.status == "saving":
+                lines.append("\nSaving ratings...")
+            embed.description = "\n".join(lines)[:4000]
+            embed.set_footer(text=f"MMR Admin Tool • {job.elapsed:.0f}s")
+            return embed
+
+        await interaction.response.send_message(embed=progress_embed(), ephemeral=True)
+        editable = await follow_job(interaction, job, progress_embed)
+        try:
+            results = await job.wait()
+        except Exception:
+            await interaction.followup.send(f"❌ Failed to run MMR sync (job #{job.id}).", ephemeral=True)
+            return
+
+        embed = discord.Embed(title="🔁 MMR Sync Complete (all events)", color=discord.Color.green())
+        lines = []
+        for event_id, name in sorted(names.items(), key=lambda item: -job.timings[item[0]]):
+            result = results[event_id]
+            if not len(result):
+                lines.append(f"➖ **{name}** — no frags")
             else:
-                embed.description = (
-                    f"Sync complete for event **{label}**.\n"
-                    f"Players rebuilt: **{len(all_players)}**\n\n"
-                    "All ratings recalculated from frags data"
+                lines.append(
+                    f"✅ **{name}** — {len(result)} players, {result.frags:,} frags in {job.timings[event_id]:.1f}s"
                 )
-            embed.set_footer(text="MMR Admin Tool")
-
-            await interaction.followup.send(embed=embed, ephemeral=True)
-            logging.info(f"✅ MMR sync finished for event '{event_name}' ({len(all_players)} players)")
-
-        except Exception as e:
-            logging.exception("❌ Failed to run MMR sync")
-            await interaction.followup.send("❌ Failed to run MMR sync.", ephemeral=True)
+        embed.description = "\n".join(lines)[:4000]
+        if period:
+            embed.description += f"\nRating periods: **{period}** (Glicko-2 with volatility)"
+        embed.set_footer(
+            text=f"MMR Admin Tool • job #{job.id} • {job.elapsed:.1f}s total, "
+                 f"{sum(job.timings.values()):.1f}s of replay on {MAX_WORKERS} workers"
+        )
+        await send_job_result(interaction, embed, editable)
+        logging.info(f"✅ MMR sync finished for {len(names)} events in {job.elapsed:.1f}s")
 
     @bot.tree.command(name="mmrclear", description="🧹 Reset MMR ratings to default values for specific event")
     @app_commands.describe(event="Event name to reset")
+    @app_commands.autocomplete(event=event_choices)
     async def mmrclear(interaction: Interaction, event: str):
 
         if not isinstance(interaction.user, discord.Member) or not interaction.user.guild_permissions.administrator:
@@ -1234,7 +1657,7 @@ def setup_commands(bot: commands.Bot):
             event_id, event_name, *_ = ev
             logging.info(f"🧹 Resetting MMR for event '{event_name}' (id={event_id})")
 
-            with sqlite3.connect(get_db_path()) as conn:
+            with get_connection() as conn:
                 c = conn.cursor()
 
                 # count how many history rows and rating rows we will touch
@@ -1246,11 +1669,15 @@ def setup_commands(bot: commands.Bot):
 
                 # delete history for this event
                 c.execute("DELETE FROM glicko_history WHERE event_id = ?", (event_id,))
+                c.execute("DELETE FROM rating_history WHERE event_id = ?", (event_id,))
+                for engine in ENGINES.values():
+                    c.execute(f"DELETE FROM {engine.table} WHERE event_id = ?", (event_id,))
 
                 # reset ratings for this event (only rating and rd)
                 c.execute("UPDATE glicko_ratings SET rating = 1500, rd = 350 WHERE event_id = ?", (event_id,))
 
                 conn.commit()
+            notify_change("ratings", event_id)
 
             # --- Build response embed ---
             embed = discord.Embed(
@@ -1292,15 +1719,18 @@ def setup_commands(bot: commands.Bot):
         days="Days to consider",
         event="Event name (optional)",
         public="Publish to channel (admins only)?",
-        details="Show detailed statistics?"
+        details="Show detailed statistics?",
+        engine=f"Rating system: glicko (default), {', '.join(ENGINES)}"
     )
+    @app_commands.autocomplete(event=event_choices)
     async def topmmr(
         interaction: Interaction,
         count: int = 10,
         days: int = 30,
         event: Optional[str] = None,
         public: bool = False,
-        details: bool = False
+        details: bool = False,
+        engine: Optional[str] = None
     ):
         # 🛡️ Access check
         if public and not (isinstance(interaction.user, discord.Member) and interaction.user.guild_permissions.administrator):
@@ -1310,6 +1740,14 @@ def setup_commands(bot: commands.Bot):
         if not await check_positive(interaction, count=count, days=days):
             return
 
+        engine = engine.lower() if engine else "glicko"
+        if engine != "glicko" and engine not in ENGINES:
+            await interaction.response.send_message(
+                f"❌ Unknown engine `{engine}`. Use glicko, {', '.join(ENGINES)}.", ephemeral=True
+            )
+            return
+        rating_label = "MMR" if engine == "glicko" else ENGINES[engine].label
+
         await interaction.response.defer(thinking=True, ephemeral=not public)
 
         if not interaction.guild:
@@ -1322,105 +1760,73 @@ def setup_commands(bot: commands.Bot):
             await interaction.followup.send(f"❌ Event `{event}` not found.", ephemeral=True)
             return
 
-        since = datetime.now(timezone.utc) - timedelta(days=days)
-        seen: set = set()
-        leaderboard_data = []
-
-        for key in get_all_players(event_id):
-            if key in seen:
-                continue
-            seen.add(key)
-
-            characters = get_user_characters(key) if isinstance(key, int) else [key]
-            total_wins = total_losses = total_fights = 0
-            glicko_values = []
-            recent_days = []
-
-            for char in characters:
-                wins, losses, fights = get_fight_stats(char, since, event_id)
-                total_wins += wins
-                total_losses += losses
-                total_fights += fights
-
-                rating, rd, vol, _ = get_glicko_rating_extended(char, event_id)
-                glicko_values.append(rating)
-
-                last_active = get_last_active_day(char, event_id)
-                if last_active:
-                    days_ago = (datetime.now(timezone.utc).date() - last_active).days
-                    recent_days.append(days_ago)
-
-            # # # ⚖️ Filtering
-            if total_fights < 10:
-                continue
-            if total_wins > 0 and total_losses == 0:
-                continue
-
-            avg_mmr = round(sum(glicko_values) / len(glicko_values)) if glicko_values else 1500
-            avg_active = min(recent_days) if recent_days else 999
-            winrate = (total_wins / total_fights * 100) if total_fights else 0
-
-            if isinstance(key, int):
-                member = interaction.guild.get_member(key)
-                display_name = member.display_name if member else f"User {key}"
-                avatar_url = member.display_avatar.url if member else None
-            else:
-                display_data = await resolve_display_data(key, interaction.guild)
-                display_name = display_data["display_name"]
-                avatar_url = display_data["avatar_url"]
-
-            leaderboard_data.append((
-                display_name, avatar_url, characters,
-                avg_mmr, total_fights, total_wins, total_losses,
-                winrate, avg_active
-            ))
-
-        leaderboard_data.sort(key=lambda x: (-x[3], -x[5], x[0]))
-
-        # Get event name for display
-        event_name = event if event else "arena"
-        if not event:
-            try:
-                default_event_name = get_setting("default_event")
-                if default_event_name:
-                    event_name = default_event_name
-            except Exception:
-                pass
+        guild = interaction.guild
 
-        # 🔹 Short output
-        if not details:
-            leaderboard_data = leaderboard_data[:count]
-            embeds = await generate_topmmr_embeds(interaction, leaderboard_data, public=public, details=False, event_name=event_name)
+        async def build_pages() -> LazyPages:
+            since = datetime.now(timezone.utc) - timedelta(days=days)
+            # the best `count` players and anyone tied with the last of them (see leaderboard.py)
+            rows = await asyncio.to_thread(top_players, event_id, since, count, engine)
+            display = await resolve_display_data_bulk([key for key, *_ in rows if not isinstance(key, int)], guild)
+            leaderboard_data = []
 
-            if not embeds:
-                await interaction.followup.send("❌ No MMR data available.", ephemeral=not public)
-                return
+            for key, characters, avg_mmr, total_fights, total_wins, total_losses, avg_active in rows:
+                winrate = (total_wins / total_fights * 100) if total_fights else 0
 
-            if len(embeds) == 1:
-                await interaction.followup.send(embed=embeds[0], ephemeral=not public)
-            else:
-                view = PaginatedStatsView(embeds, ephemeral=not public)
-                await view.send_initial(interaction)
-            return
-
-        # 📊 Detailed output (paginate + honor count)
-        leaderboard_data = leaderboard_data[:count]
-        embeds = await generate_topmmr_embeds(interaction, leaderboard_data, public=public, details=True, event_name=event_name)
+                if isinstance(key, int):
+                    member = guild.get_member(key)
+                    display_name = member.display_name if member else f"User {key}"
+                    avatar_url = member.display_avatar.url if member else None
+                else:
+                    display_name = display[key]["display_name"]
+                    avatar_url = display[key]["avatar_url"]
+
+                leaderboard_data.append((
+                    display_name, avatar_url, characters,
+                    avg_mmr, total_fights, total_wins, total_losses,
+                    winrate, avg_active, key
+                ))
+
+            leaderboard_data.sort(key=lambda x: (-x[3], -x[5], x[0]))
+            keys = [row[-1] for row in leaderboard_data[:count]]
+            leaderboard_data = [row[:-1] for row in leaderboard_data[:count]]
+
+            # Get event name for display
+            event_name = event if event else "arena"
+            if not event:
+                try:
+                    default_event_name = get_setting("default_event")
+                    if default_event_name:
+                        event_name = default_event_name
+                except Exception:
+                    pass
+
+            async def locate(user_id: int) -> int | str:
+                # linked players are keyed by their Discord id; off the page, their overall rank
+                if user_id in keys:
+                    return keys.index(user_id) // PAGE_SIZE
+                rank = await asyncio.to_thread(player_rank, event_id, user_id, engine)
+                if rank is None:
+                    return f"📍 You have no {rating_label} in this event."
+                return f"📍 You're not in this top-{count}; you're #{rank} by {rating_label} overall."
+
+            # 📊 Detailed output carries the window in its title
+            title = f"Top-{len(leaderboard_data)} {rating_label} in {days} day(s) - Event: {event_name}" if details else None
+            return generate_topmmr_pages(
+                leaderboard_data, details=details, event_name=event_name, rating_label=rating_label, title=title, locate=locate
+            )
 
-        if not embeds:
+        pages = await result_cache.get_or_compute(
+            ("topmmr", interaction.guild.id, event_id, event, days, count, details, engine, public), build_pages, event_id
+        )
+        if not pages:
             await interaction.followup.send("❌ No MMR data available.", ephemeral=not public)
             return
 
-        title = f"Top-{len(leaderboard_data)} MMR in {days} day(s) - Event: {event_name}"
-        for embed in embeds:
-            embed.title = title
-
-        if len(embeds) == 1:
-            await interaction.followup.send(embed=embeds[0], ephemeral=not public)
+        if len(pages) == 1:
+            await interaction.followup.send(embed=await pages.page(0), ephemeral=not public)
         else:
-            view = PaginatedStatsView(embeds, ephemeral=not public)
+            view = PaginatedStatsView(pages, ephemeral=not public)
             await view.send_initial(interaction)
-        return
 
     @bot.tree.command(name="mmrroleupdate", description="🔁 Update MMR roles for users in main event (arena)")
     async def mmrroleupdate(interaction: discord.Interaction):
@@ -1597,6 +2003,7 @@ def setup_commands(bot: commands.Bot):
 
     @bot.tree.command(name="setchannel", description="Link a channel to an event")
     @app_commands.describe(event="Event name", channel="Channel")
+    @app_commands.autocomplete(event=event_choices)
     async def setchannel(interaction: discord.Interaction, event: str, channel: discord.TextChannel):
         if not await require_admin(interaction):
             return
@@ -1614,6 +2021,7 @@ def setup_commands(bot: commands.Bot):
 
     @bot.tree.command(name="clearchannel", description="Release the channel from the event")
     @app_commands.describe(event="Event name")
+    @app_commands.autocomplete(event=event_choices)
     async def clearchannel(interaction: discord.Interaction, event: str):
         if not await require_admin(interaction):
             return
@@ -1694,7 +2102,10 @@ def setup_commands(bot: commands.Bot):
                     "❌ `/unlink` `[character]` — Unlink character\n"
                     "🔊 `/voice` `[leave]` — Join or leave voice channel\n"
                     "⏳ `/killstreaktimeout` `[seconds]` — Set killstreak timeout\n"
-                    "🔁 `/reset` `[filename]` — Reset or restore database"
+                    "🔁 `/reset` `[filename]` — Reset or restore database\n"
+                    "📤 `/export` `[event]` `[fmt]` `[compression]` — Export event data\n"
+                    "📥 `/import` `[file/filename]` `[event]` `[replace]` — Import event data\n"
+                    "🩺 `/dbstats` `[count]` `[sort]` `[enable]` `[sample]` `[slow_ms]` `[trace]` `[reset]` — SQL profiler"
                 ),
                 inline=False
             )
@@ -1706,9 +2117,10 @@ def setup_commands(bot: commands.Bot):
                     "🧹 `/mmrroleclear` — Clear all MMR roles\n"
                     "🔄 `/mmrroleupdate` — Update all MMR-based roles\n"
                     "🎯 `/mmr` `[char/@user]` `[+/-/=value]` `[reason]` `[event]` — Adjust rating\n"
-                    "📃 `/mmrlog` `[char/@user]` `[event]` — Show rating history\n"
+                    "📃 `/mmrlog` `[char/@user]` `[event]` `[date]` — Show rating history and adjustments\n"
                     "🧹 `/mmrclear` `[event]` — Reset MMR to defaults\n"
-                    "🔁 `/mmrsync` `[event]` `[start_date]` — Rebuild MMR from frags (start_date optional)"
+                    "🔁 `/mmrsync` `[event]` `[start_date]` `[period]` — Rebuild MMR from frags (start_date, period optional)\n"
+                    "🔁 `/mmrsyncall` `[period]` — Rebuild MMR of every event in parallel"
                 ),
                 inline=False
             )
@@ -1730,10 +2142,13 @@ def setup_commands(bot: commands.Bot):
         embed.add_field(
             name="__👥 User Commands__",
             value=(
-                "📈 `/topmmr` `[count]` `[days]` `[event]` `[public*]` `[details]` — Show top by MMR\n"
+                "📈 `/topmmr` `[count]` `[days]` `[event]` `[public*]` `[details]` `[engine]` — Show top by MMR\n"
                 "🏆 `/top` `[count]` `[days]` `[event]` `[public*]` — Show top by points\n"
                 "🧍 `/mystats` `[days]` `[event]` `[public*]` — Show your stats\n"
                 "📊 `/stats` `[char/@user]` `[days]` `[event]` `[public*]` — Show player stats\n"
+                "🎲 `/matchup` `[players]` `[event]` `[public*]` — Expected win % and seeding\n"
+                "📉 `/mmrchart` `[char/@user]` `[days]` `[event]` `[public*]` — Chart rating over time\n"
+                "🗓️ `/activity` `[char/@user]` `[days]` `[event]` `[public*]` — Kills per weekday and hour\n"
                 "🔍 `/whois` `[char/@user]` — Show who owns character\n"
                 "🎭 `/mmrroles` `[public*]` — Show MMR role configuration\n"
                 "🏅 `/roles` `[public*]` — Show rank roles configuration\n"
@@ -1,22 +1,38 @@
 # -*- coding: utf-8 -*-
 # db.py
 
+import json
 import logging
 import os
 import sqlite3
+import time
 
+from functools import lru_cache
 from datetime import datetime, timedelta, date, timezone
-from typing import Optional, Tuple
-from collections import defaultdict
+from pathlib import Path
+from typing import Callable, Optional, Tuple
 
 from settings import get_db_file_path
-from glicko2 import Player
+from glicko2 import BASE_RATING, BASE_RD, BASE_VOL, decay_rd, rate_1v1
+from engines import ENGINES
+from profiler import sql_profiler
 
 DB_FILE: Optional[str] = None
+DB_READONLY = False  # set in worker processes that only compute (see jobs.py)
 
-def set_db_path(path):
-    global DB_FILE
+# rating_history keeps a player's values after their last fight in each period of this many seconds;
+# compact_rating_history() thins rows older than each tier's age to one per bucket (the last one)
+HISTORY_PERIOD = 3600
+HISTORY_TIERS = ((timedelta(days=7), timedelta(days=1)), (timedelta(days=90), timedelta(weeks=1)))
+
+# Intern cache: lowercased character name -> characters.id (stable for a given DB file)
+_character_ids: dict[str, int] = {}
+
+def set_db_path(path, readonly: bool = False):
+    global DB_FILE, DB_READONLY
     DB_FILE = path
+    DB_READONLY = readonly
+    _character_ids.clear()
     logging.info(f"📁 Using database at: {DB_FILE}")
 
 def get_db_path() -> str:
@@ -25,12 +41,41 @@ def get_db_path() -> str:
         raise RuntimeError("DB path is not set.")
     return DB_FILE
 
+def get_connection() -> sqlite3.Connection:
+    """Opens a connection to the bot DB (profiled when /dbstats profiling is on)."""
+    if DB_READONLY:
+        return sql_profiler.connect(Path(get_db_path()).resolve().as_uri() + "?mode=ro", uri=True)
+    return sql_profiler.connect(get_db_path())
+
+# --- Change notifications ---
+# In-process caches of derived data (leaderboard.py, cache.py, autocomplete.py) subscribe to the
+# writes that change it.
+# notify_change(kind, event_id=None, characters=None) runs after the write has committed; kinds:
+#   "frag"     a frag was added to event_id (characters: killer and victim)
+#   "ratings"  ratings of event_id changed other than by a live frag (characters=None: possibly all)
+#   "owners"   character_map changed (characters=None: possibly any)
+#   "roles"    the rank roles changed
+#   "event"    the event's frags were replaced (event_id=None: the whole DB)
+#   "events"   an event was created
+
+_change_listeners: list[Callable[..., None]] = []
+
+def add_change_listener(callback: Callable[..., None]):
+    _change_listeners.append(callback)
+
+def notify_change(kind: str, event_id: Optional[int] = None, characters: Optional[list[str]] = None):
+    for callback in _change_listeners:
+        try:
+            callback(kind, event_id=event_id, characters=characters)
+        except Exception:
+            logging.exception(f"❌ Change listener failed on '{kind}' (event_id={event_id})")
+
 def init_db():
     """
     Initialize or migrate the SQLite schema to the current event-aware layout.
     This function is idempotent and adds missing columns/tables/indexes safely.
     """
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
 
         # --- Core tables (create if missing) ---
@@ -48,12 +93,21 @@ def init_db():
             )
         """)
 
+        # interned character names; every per-character table references characters.id
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS characters (
+                id INTEGER PRIMARY KEY,
+                name TEXT UNIQUE NOT NULL
+            )
+        """)
+
         c.execute("""
             CREATE TABLE IF NOT EXISTS manual_adjustments (
-                character TEXT NOT NULL,
+                character_id INTEGER NOT NULL REFERENCES characters(id),
                 adjustment INTEGER NOT NULL,
                 reason TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                event_id INTEGER
             )
         """)
 
@@ -61,8 +115,8 @@ def init_db():
         c.execute("""
             CREATE TABLE IF NOT EXISTS frags (
                 id INTEGER PRIMARY KEY,
-                killer TEXT,
-                victim TEXT,
+                killer_id INTEGER NOT NULL REFERENCES characters(id),
+                victim_id INTEGER NOT NULL REFERENCES characters(id),
                 timestamp DATETIME,
                 event_id INTEGER
             )
@@ -71,23 +125,23 @@ def init_db():
         # deathless_streaks with event_id and composite PK
         c.execute("""
             CREATE TABLE IF NOT EXISTS deathless_streaks (
-                character TEXT NOT NULL,
+                character_id INTEGER NOT NULL REFERENCES characters(id),
                 count INTEGER NOT NULL,
                 event_id INTEGER NOT NULL,
-                PRIMARY KEY (character, event_id)
+                PRIMARY KEY (character_id, event_id)
             )
         """)
 
         # glicko_ratings target schema (event-aware, composite PK)
         c.execute("""
             CREATE TABLE IF NOT EXISTS glicko_ratings (
-                character TEXT NOT NULL,
+                character_id INTEGER NOT NULL REFERENCES characters(id),
                 rating REAL DEFAULT 1500,
                 rd REAL DEFAULT 350,
                 vol REAL DEFAULT 0.06,
                 last_activity TEXT,
                 event_id INTEGER NOT NULL,
-                PRIMARY KEY (character, event_id)
+                PRIMARY KEY (character_id, event_id)
             )
         """)
 
@@ -100,6 +154,39 @@ def init_db():
             )
         """)
 
+        # end-of-day rating snapshots written by /mmrsync; a sync from date D resumes from the last one before D.
+        # rd is as of last_day, the player's last day with a fight (idle decay is applied lazily)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS glicko_checkpoints (
+                event_id INTEGER NOT NULL,
+                day INTEGER NOT NULL,
+                character_id INTEGER NOT NULL REFERENCES characters(id),
+                rating REAL NOT NULL,
+                rd REAL NOT NULL,
+                vol REAL NOT NULL,
+                last_day INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (event_id, day, character_id)
+            ) WITHOUT ROWID
+        """)
+
+        # rating time series: written with every frag (and per day by /mmrsync), read by /mmrlog.
+        # period is unix time // HISTORY_PERIOD; the key makes "rating at time T" one index seek
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS rating_history (
+                event_id INTEGER NOT NULL,
+                character_id INTEGER NOT NULL REFERENCES characters(id),
+                period INTEGER NOT NULL,
+                rating REAL NOT NULL,
+                rd REAL NOT NULL,
+                vol REAL NOT NULL,
+                PRIMARY KEY (event_id, character_id, period)
+            ) WITHOUT ROWID
+        """)
+
+        # ratings of the engines computed besides Glicko-2 (engines.py), one table each
+        for engine in ENGINES.values():
+            c.execute(engine.schema())
+
         # Events support
         c.execute("""
             CREATE TABLE IF NOT EXISTS events (
@@ -146,6 +233,10 @@ def init_db():
         ensure_column("deathless_streaks", "event_id", "event_id INTEGER")
         ensure_column("manual_adjustments", "event_id", "event_id INTEGER")
         ensure_column("glicko_history", "event_id", "event_id INTEGER")
+        # older checkpoints hold RDs decayed to the checkpoint day; they are only a cache, so drop them
+        if not _table_has_column(conn, "glicko_checkpoints", "last_day"):
+            c.execute("DELETE FROM glicko_checkpoints")
+            ensure_column("glicko_checkpoints", "last_day", "last_day INTEGER NOT NULL DEFAULT 0")
         # rename last_win -> last_activity is non-trivial; just ensure last_activity exists
         # If legacy deathless_streaks exists without composite PK, rebuild it to the new schema
         try:
@@ -156,7 +247,7 @@ def init_db():
             ddl = ""
 
         needs_deathless_rebuild = False
-        if ddl:
+        if ddl and _table_has_column(conn, "deathless_streaks", "character"):
             normalized = ddl.replace("`", "").replace("\n", " ").lower()
             if "primary key (character, event_id)" not in normalized:
                 needs_deathless_rebuild = True
@@ -203,7 +294,7 @@ def init_db():
             ddl = ""
 
         needs_rebuild = False
-        if ddl:
+        if ddl and _table_has_column(conn, "glicko_ratings", "character"):
             normalized = ddl.replace("`", "").replace("\n", " ").lower()
             if "primary key (character, event_id)" not in normalized:
                 needs_rebuild = True
@@ -255,20 +346,6 @@ def init_db():
             c.execute("DROP TABLE IF EXISTS glicko_ratings")
             c.execute("ALTER TABLE glicko_ratings__new RENAME TO glicko_ratings")
 
-        # --- Indices to speed up queries ---
-        c.execute("CREATE INDEX IF NOT EXISTS idx_frags_killer ON frags(killer)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_frags_victim ON frags(victim)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_frags_timestamp ON frags(timestamp)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_frags_event ON frags(event_id)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_char_map_user ON character_map(discord_id)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_glicko_event_char ON glicko_ratings(event_id, character)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_event_channels_event ON event_channels(event_id)")
-
-        # Helpful indices for new event-aware tables
-        c.execute("CREATE INDEX IF NOT EXISTS idx_manual_character_event ON manual_adjustments(character, event_id)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_gh_character_event ON glicko_history(character, event_id)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_ds_character_event ON deathless_streaks(character, event_id)")
-
         # --- Backfill NULL event_id to default event (id=1 typically) for legacy rows ---
         try:
             default_event_id = get_default_event_id()
@@ -296,21 +373,211 @@ def init_db():
         except Exception:
             pass
 
+        # --- Migration: TEXT character columns -> interned integer ids ---
+        _migrate_character_ids(conn)
+
+        # --- Indices to speed up queries ---
+        c.execute("CREATE INDEX IF NOT EXISTS idx_frags_killer ON frags(killer_id, event_id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_frags_victim ON frags(victim_id, event_id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_frags_timestamp ON frags(timestamp)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_frags_event ON frags(event_id)")
+        # covers the windowed per-killer counts of /top (get_top_points) without touching the table
+        c.execute("CREATE INDEX IF NOT EXISTS idx_frags_event_time ON frags(event_id, timestamp, killer_id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_char_map_user ON character_map(discord_id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_event_channels_event ON event_channels(event_id)")
+
+        # Helpful indices for new event-aware tables
+        c.execute("CREATE INDEX IF NOT EXISTS idx_manual_character_event ON manual_adjustments(character_id, event_id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_gh_character_event ON glicko_history(character, event_id)")
+
+        # Without statistics the planner prefers idx_frags_event_time for per-character fight counts
+        # (killer_id = ? AND event_id = ? AND timestamp >= ?) and scans the whole window; a sampled
+        # ANALYZE lets it pick idx_frags_killer/idx_frags_victim. PRAGMA optimize refreshes it later.
+        if not c.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+            c.execute("PRAGMA analysis_limit = 1000")
+            c.execute("ANALYZE")
+        else:
+            c.execute("PRAGMA optimize")
+
         conn.commit()
 
+    _character_ids.clear()
+
+def _migrate_character_ids(conn: sqlite3.Connection):
+    """
+    Rebuild legacy tables that store lowercased names as TEXT so they reference
+    characters.id instead. Runs inside the caller's transaction and is a no-op
+    once every table has been converted.
+    """
+    legacy = {
+        "frags": _table_has_column(conn, "frags", "killer"),
+        "manual_adjustments": _table_has_column(conn, "manual_adjustments", "character"),
+        "deathless_streaks": _table_has_column(conn, "deathless_streaks", "character"),
+        "glicko_ratings": _table_has_column(conn, "glicko_ratings", "character"),
+    }
+    if not any(legacy.values()):
+        return
+
+    c = conn.cursor()
+    logging.info(f"🔄 Migrating character names to integer ids: {', '.join(t for t, v in legacy.items() if v)}")
+
+    def replace_table(table: str):
+        # rows without a name (the legacy frags columns allowed NULL) have no character to point at, and
+        # the same character in another letter case collapses into one row where it is the key
+        skipped = (c.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                   - c.execute(f"SELECT COUNT(*) FROM {table}__new").fetchone()[0])
+        if skipped:
+            logging.warning(f"⚠️ {table}: {skipped} row(s) not migrated (no character name, or a duplicate by case)")
+        c.execute(f"DROP TABLE {table}")
+        c.execute(f"ALTER TABLE {table}__new RENAME TO {table}")
+
+    # Intern every name that appears in a legacy table
+    sources = []
+    if legacy["frags"]:
+        sources += ["SELECT LOWER(killer) FROM frags", "SELECT LOWER(victim) FROM frags"]
+    for table in ("manual_adjustments", "deathless_streaks", "glicko_ratings"):
+        if legacy[table]:
+            sources.append(f"SELECT LOWER(character) FROM {table}")
+    # (NULL names are dropped by OR IGNORE via the NOT NULL constraint)
+    c.execute(f"INSERT OR IGNORE INTO characters (name) {' UNION '.join(sources)}")
+
+    if legacy["frags"]:
+        c.execute("""
+            CREATE TABLE frags__new (
+                id INTEGER PRIMARY KEY,
+                killer_id INTEGER NOT NULL REFERENCES characters(id),
+                victim_id INTEGER NOT NULL REFERENCES characters(id),
+                timestamp DATETIME,
+                event_id INTEGER
+            )
+        """)
+        c.execute("""
+            INSERT INTO frags__new (id, killer_id, victim_id, timestamp, event_id)
+            SELECT f.id, k.id, v.id, f.timestamp, f.event_id
+            FROM frags f
+            JOIN characters k ON k.name = LOWER(f.killer)
+            JOIN characters v ON v.name = LOWER(f.victim)
+        """)
+        replace_table("frags")
+
+    if legacy["manual_adjustments"]:
+        c.execute("""
+            CREATE TABLE manual_adjustments__new (
+                character_id INTEGER NOT NULL REFERENCES characters(id),
+                adjustment INTEGER NOT NULL,
+                reason TEXT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                event_id INTEGER
+            )
+        """)
+        c.execute("""
+            INSERT INTO manual_adjustments__new (character_id, adjustment, reason, timestamp, event_id)
+            SELECT ch.id, m.adjustment, m.reason, m.timestamp, m.event_id
+            FROM manual_adjustments m
+            JOIN characters ch ON ch.name = LOWER(m.character)
+            ORDER BY m.rowid
+        """)
+        replace_table("manual_adjustments")
+
+    if legacy["deathless_streaks"]:
+        c.execute("""
+            CREATE TABLE deathless_streaks__new (
+                character_id INTEGER NOT NULL REFERENCES characters(id),
+                count INTEGER NOT NULL,
+                event_id INTEGER NOT NULL,
+                PRIMARY KEY (character_id, event_id)
+            )
+        """)
+        c.execute("""
+            INSERT OR IGNORE INTO deathless_streaks__new (character_id, count, event_id)
+            SELECT ch.id, d.count, d.event_id
+            FROM deathless_streaks d
+            JOIN characters ch ON ch.name = LOWER(d.character)
+        """)
+        replace_table("deathless_streaks")
+
+    if legacy["glicko_ratings"]:
+        c.execute("""
+            CREATE TABLE glicko_ratings__new (
+                character_id INTEGER NOT NULL REFERENCES characters(id),
+                rating REAL DEFAULT 1500,
+                rd REAL DEFAULT 350,
+                vol REAL DEFAULT 0.06,
+                last_activity TEXT,
+                event_id INTEGER NOT NULL,
+                PRIMARY KEY (character_id, event_id)
+            )
+        """)
+        c.execute("""
+            INSERT OR IGNORE INTO glicko_ratings__new
+                (character_id, rating, rd, vol, last_activity, event_id)
+            SELECT ch.id, g.rating, g.rd, g.vol, g.last_activity, g.event_id
+            FROM glicko_ratings g
+            JOIN characters ch ON ch.name = LOWER(g.character)
+        """)
+        replace_table("glicko_ratings")
+
+    logging.info("✅ Character id migration complete.")
+
 def get_setting(key):
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute("SELECT value FROM settings WHERE key = ?", (key,))
         row = c.fetchone()
         return row[0] if row else None
 
 def set_setting(key, value):
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute("REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
         conn.commit()
 
+def load_profiler_settings():
+    """Applies the persisted /dbstats profiler settings."""
+    sql_profiler.configure(
+        enabled=get_setting("db_profile") == "1",
+        sample_rate=float(get_setting("db_profile_sample") or 1.0),
+        slow_ms=float(get_setting("db_slow_ms") or 250),
+        trace_commands=get_setting("db_trace") != "0",
+    )
+
+# --- Characters ---
+
+def intern_character(name: str) -> int:
+    """
+    Returns the characters.id for the name, creating the row on first sight.
+    Uses its own connection, so call it before opening a write transaction elsewhere.
+    """
+    name = name.lower()
+    char_id = _character_ids.get(name)
+    if char_id is not None:
+        return char_id
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("INSERT OR IGNORE INTO characters (name) VALUES (?)", (name,))
+        c.execute("SELECT id FROM characters WHERE name = ?", (name,))
+        char_id = c.fetchone()[0]
+        conn.commit()
+    _character_ids[name] = char_id
+    return char_id
+
+def get_character_id(name: str) -> Optional[int]:
+    """
+    Returns the characters.id for the name, or None if the character has never been seen.
+    """
+    name = name.lower()
+    char_id = _character_ids.get(name)
+    if char_id is not None:
+        return char_id
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT id FROM characters WHERE name = ?", (name,))
+        row = c.fetchone()
+    if not row:
+        return None
+    _character_ids[name] = row[0]
+    return row[0]
+
 # --- Stats ---
 
 def add_frag(killer: str, victim: str, channel_id: Optional[int] = None):
@@ -329,43 +596,145 @@ def add_frag(killer: str, victim: str, channel_id: Optional[int] = None):
         event_id = get_default_event_id()
 
     try:
-        with sqlite3.connect(get_db_path()) as conn:
-            c = conn.cursor()
-            c.execute(
-                "INSERT INTO frags (killer, victim, timestamp, event_id) VALUES (?, ?, ?, ?)",
-                (killer, victim, now.isoformat(), event_id)
+        killer_id = intern_character(killer)
+        victim_id = intern_character(victim)
+        # the frag, both ratings and their history rows commit together
+        with get_connection() as conn:
+            conn.execute(
+                "INSERT INTO frags (killer_id, victim_id, timestamp, event_id) VALUES (?, ?, ?, ?)",
+                (killer_id, victim_id, now.isoformat(), event_id)
             )
+            _rate_kill(conn, killer_id, victim_id, event_id, now)
             conn.commit()
         logging.info(f"⚔️  {killer} killed {victim} at {now} (event_id={event_id})")
-
-        # update per-event glicko
-        update_glicko_ratings(killer, victim, event_id)
+        notify_change("frag", event_id, [killer, victim])
 
     except sqlite3.Error as e:
         logging.exception(f"❌ Error when adding a frag: {e}")
 
+def get_frag_generation(event_id: int) -> int:
+    """Id of the event's newest frag (0 if none): changes whenever a frag is added to the event."""
+    with get_connection() as conn:
+        row = conn.execute("SELECT MAX(id) FROM frags WHERE event_id = ?", (event_id,)).fetchone()
+    return row[0] or 0
+
+def get_activity_grid(characters: Optional[list[str]], event_id: int, since: Optional[datetime] = None) -> list[list[int]]:
+    """
+    Kills per weekday (Monday first) and UTC hour: grid[weekday][hour]. Counts the characters' kills,
+    or every kill in the event if characters is None.
+    """
+    grid = [[0] * 24 for _ in range(7)]
+    where = ["f.event_id = ?"]
+    params: list = [event_id]
+    if characters is not None:
+        char_ids = [cid for cid in map(get_character_id, characters) if cid is not None]
+        if not char_ids:
+            return grid
+        where.append("f.killer_id IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps(char_ids))
+    if since is not None:
+        where.append("f.timestamp >= ?")
+        params.append(since.isoformat())
+    with get_connection() as conn:
+        rows = conn.execute(f"""
+            SELECT CAST(strftime('%w', f.timestamp) AS INTEGER), CAST(strftime('%H', f.timestamp) AS INTEGER), COUNT(*)
+            FROM frags f
+            WHERE {" AND ".join(where)}
+            GROUP BY 1, 2
+        """, params).fetchall()
+    for weekday, hour, count in rows:
+        grid[(weekday + 6) % 7][hour] = count  # %w is 0 for Sunday
+    return grid
+
 def get_top_players(n=10, days=1):
     try:
-        with sqlite3.connect(get_db_path()) as conn:
+        with get_connection() as conn:
             c = conn.cursor()
             since = datetime.now(timezone.utc) - timedelta(days=days)
             c.execute("""
-                SELECT killer, COUNT(*) as count FROM frags
-                WHERE timestamp >= ?
-                GROUP BY killer
-                ORDER BY count DESC
-                LIMIT ?
+                SELECT ch.name, t.count FROM (
+                    SELECT killer_id, COUNT(*) AS count FROM frags
+                    WHERE timestamp >= ?
+                    GROUP BY killer_id
+                    ORDER BY count DESC
+                    LIMIT ?
+                ) t
+                JOIN characters ch ON ch.id = t.killer_id
+                ORDER BY t.count DESC
             """, (since, n))
             return c.fetchall()
     except sqlite3.Error as e:
         logging.exception(f"❌ Error getting top players: {e}")
         return []
 
+def get_top_points(event_id: int, since: datetime, limit: int = 10) -> list[tuple]:
+    """
+    The /top leaderboard in one statement: characters with frags in the event since `since`, grouped
+    by owner (unlinked characters stand alone) and ranked by frags in the window plus the characters'
+    manual adjustments in the event (all time). Returns the first `limit` rows as
+    (key, characters, frags, manual, total, mmr): key is the discord_id or the character name; mmr is
+    the owner's average rating over all linked characters, or the character's rating, rounded to an int.
+    Ties keep the order of the lowest character id.
+    """
+    with get_connection() as conn:
+        rows = conn.execute("""
+            WITH kills AS (
+                SELECT killer_id AS character_id, COUNT(*) AS frags
+                FROM frags
+                WHERE timestamp >= :since AND event_id = :event_id
+                GROUP BY killer_id
+            ),
+            manual AS (
+                SELECT character_id, SUM(adjustment) AS manual
+                FROM manual_adjustments
+                WHERE event_id = :event_id AND character_id IN (SELECT character_id FROM kills)
+                GROUP BY character_id
+            ),
+            scored AS (
+                SELECT k.character_id, ch.name, cm.discord_id, k.frags, COALESCE(m.manual, 0) AS manual
+                FROM kills k
+                JOIN characters ch ON ch.id = k.character_id
+                LEFT JOIN manual m ON m.character_id = k.character_id
+                LEFT JOIN character_map cm ON cm.character = ch.name
+            ),
+            owners AS (
+                SELECT discord_id, MIN(name) AS name, json_group_array(name) AS characters,
+                       SUM(frags) AS frags, SUM(manual) AS manual, SUM(frags) + SUM(manual) AS total,
+                       MIN(character_id) AS first_id
+                FROM scored
+                GROUP BY discord_id, CASE WHEN discord_id IS NULL THEN character_id END
+                ORDER BY total DESC, first_id
+                LIMIT :limit
+            )
+            SELECT o.discord_id, o.name, o.characters, o.frags, o.manual, o.total,
+                   CASE WHEN o.discord_id IS NULL THEN
+                       COALESCE((SELECT g.rating FROM characters ch
+                                 JOIN glicko_ratings g ON g.character_id = ch.id AND g.event_id = :event_id
+                                 WHERE ch.name = o.name), :base)
+                   ELSE
+                       (SELECT AVG(COALESCE(g.rating, :base)) FROM character_map cm
+                        LEFT JOIN characters ch ON ch.name = LOWER(cm.character)
+                        LEFT JOIN glicko_ratings g ON g.character_id = ch.id AND g.event_id = :event_id
+                        WHERE cm.discord_id = o.discord_id)
+                   END
+            FROM owners o
+            ORDER BY o.total DESC, o.first_id
+        """, {"since": since, "event_id": event_id, "limit": limit, "base": BASE_RATING}).fetchall()
+    return [
+        (
+            discord_id if discord_id is not None else name,
+            sorted(json.loads(characters)),
+            frags, manual, total,
+            int(round(mmr)),
+        )
+        for discord_id, name, characters, frags, manual, total, mmr in rows
+    ]
+
 # --- Linking ---
 
 def link_character(character: str, discord_id: int):
     try:
-        with sqlite3.connect(get_db_path()) as conn:
+        with get_connection() as conn:
             c = conn.cursor()
             c.execute('''
                 INSERT INTO character_map (character, discord_id)
@@ -376,44 +745,49 @@ def link_character(character: str, discord_id: int):
     except sqlite3.Error as e:
         logging.exception(f"❌ Error linking character {character} to user {discord_id}: {e}")
         raise
+    notify_change("owners", characters=[character])
 
 def unlink_character(character: str):
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute('DELETE FROM character_map WHERE character = ?', (character,))
         conn.commit()
+    notify_change("owners", characters=[character])
 
 def get_user_characters(discord_id: Optional[int]) -> list[str]:
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute('SELECT character FROM character_map WHERE discord_id = ?', (discord_id,))
         return [row[0] for row in c.fetchall()]
 
 def set_character_owner(character: str, discord_id: int):
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute('REPLACE INTO character_map (character, discord_id) VALUES (?, ?)', (character, discord_id))
         conn.commit()
+    notify_change("owners", characters=[character])
 
 def get_character_owner(character: str) -> Optional[int]:
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute('SELECT discord_id FROM character_map WHERE character = ?', (character,))
         row = c.fetchone()
         return row[0] if row else None
 
 def remove_character_owner(character: str) -> bool:
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute('DELETE FROM character_map WHERE LOWER(character) = LOWER(?)', (character,))
         conn.commit()
-        return c.rowcount > 0
+        removed = c.rowcount > 0
+    notify_change("owners", characters=[character])
+    return removed
 
 def get_discord_id_by_character(character_name: str) -> Optional[int]:
     """
     Returns the Discord ID associated with the character, or None if there is no bundle.
     """
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute("SELECT discord_id FROM character_map WHERE character = ?", (character_name.lower(),))
         result = c.fetchone()
@@ -422,7 +796,7 @@ def get_discord_id_by_character(character_name: str) -> Optional[int]:
 # --- Roles ---
 
 def init_rank_roles_table():
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute("""
             CREATE TABLE IF NOT EXISTS rank_roles (
@@ -433,7 +807,7 @@ def init_rank_roles_table():
         conn.commit()
 
 def set_rank_role(wins_threshold: int, role_name: str):
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute("""
             INSERT INTO rank_roles (wins_threshold, role_name)
@@ -441,15 +815,17 @@ def set_rank_role(wins_threshold: int, role_name: str):
             ON CONFLICT(wins_threshold) DO UPDATE SET role_name=excluded.role_name
         """, (wins_threshold, role_name))
         conn.commit()
+    notify_change("roles")
 
 def clear_rank_roles():
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute("DELETE FROM rank_roles")
         conn.commit()
+    notify_change("roles")
 
 def get_all_rank_roles() -> list[tuple[int, str]]:
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute("SELECT wins_threshold, role_name FROM rank_roles ORDER BY wins_threshold DESC")
         return c.fetchall()
@@ -458,22 +834,20 @@ def get_all_rank_roles() -> list[tuple[int, str]]:
 
 def get_deathless_streak(character: str, event_id: Optional[int] = None) -> int:
     """
-    Returns the current 'deathless' episode for the character.
-    If the deathless_streaks table contains an event_id column and an event_id is passed,
-    the series for the specified event will be returned.
-    Otherwise, the behavior is compatible with the old version (by character name).
+    Returns the current 'deathless' episode for the character within the event
+    (the default event if event_id is not passed).
     """
-    character = character.lower()
-    with sqlite3.connect(get_db_path()) as conn:
+    if event_id is None:
+        event_id = get_default_event_id()
+    char_id = get_character_id(character)
+    if char_id is None:
+        return 0
+    with get_connection() as conn:
         c = conn.cursor()
-        if _table_has_column(conn, "deathless_streaks", "event_id") and event_id is not None:
-            c.execute(
-                "SELECT count FROM deathless_streaks WHERE character = ? AND event_id = ?",
-                (character, event_id),
-            )
-        else:
-            # fallback to the old scheme
-            c.execute("SELECT count FROM deathless_streaks WHERE character = ?", (character,))
+        c.execute(
+            "SELECT count FROM deathless_streaks WHERE character_id = ? AND event_id = ?",
+            (char_id, event_id),
+        )
         row = c.fetchone()
         return row[0] if row else 0
 
@@ -485,87 +859,62 @@ def increment_deathless_streak(character: str, event_id: Optional[int] = None) -
         event_id = get_default_event_id()
     current = get_deathless_streak(character, event_id)
     new_value = current + 1
-    with sqlite3.connect(get_db_path()) as conn:
+    char_id = intern_character(character)
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute("""
-            INSERT OR REPLACE INTO deathless_streaks (character, count, event_id)
+            INSERT OR REPLACE INTO deathless_streaks (character_id, count, event_id)
             VALUES (?, ?, ?)
-        """, (character.lower(), new_value, event_id))
+        """, (char_id, new_value, event_id))
     return new_value
 
 def reset_deathless_streak(character: str, event_id: Optional[int] = None) -> bool:
     """
-    Resets the series for character.
+    Resets the series for character within the event (the default event if event_id is not passed).
     Returns True if there was an active series >= 3 (then you can make an announcement about the interruption).
-    It works within the event_id framework if the table supports event_id and it is passed.
     """
     character = character.lower()
-    with sqlite3.connect(get_db_path()) as conn:
+    if event_id is None:
+        event_id = get_default_event_id()
+    char_id = get_character_id(character)
+    if char_id is None:
+        return False
+    with get_connection() as conn:
         c = conn.cursor()
-        event_aware = _table_has_column(conn, "deathless_streaks", "event_id")
-
-        if event_aware and event_id is not None:
-            c.execute("SELECT count FROM deathless_streaks WHERE character = ? AND event_id = ?", (character, event_id))
-            row = c.fetchone()
-            if row and row[0] >= 3:
-                logging.info(f"💀 Streak for {character} interrupted (event_id={event_id}) at {row[0]}")
-                c.execute("DELETE FROM deathless_streaks WHERE character = ? AND event_id = ?", (character, event_id))
-                conn.commit()
-                return True
-            # delete the entry (if any), even if <3
-            c.execute("DELETE FROM deathless_streaks WHERE character = ? AND event_id = ?", (character, event_id))
-            conn.commit()
-            return False
-        else:
-            # fallback: the old structure
-            c.execute("SELECT count FROM deathless_streaks WHERE character = ?", (character,))
-            row = c.fetchone()
-            if row and row[0] >= 3:
-                logging.info(f"💀 Streak for {character} interrupted at {row[0]}")
-                c.execute("DELETE FROM deathless_streaks WHERE character = ?", (character,))
-                conn.commit()
-                return True
-            c.execute("DELETE FROM deathless_streaks WHERE character = ?", (character,))
-            conn.commit()
-            return False
+        c.execute("SELECT count FROM deathless_streaks WHERE character_id = ? AND event_id = ?", (char_id, event_id))
+        row = c.fetchone()
+        # delete the entry (if any), even if <3
+        c.execute("DELETE FROM deathless_streaks WHERE character_id = ? AND event_id = ?", (char_id, event_id))
+        conn.commit()
+        if row and row[0] >= 3:
+            logging.info(f"💀 Streak for {character} interrupted (event_id={event_id}) at {row[0]}")
+            return True
+        return False
 
 def update_deathless_streaks(killer: str, victim: str, event_id: Optional[int] = None) -> int:
     """
-    Increases the streak of the killer and resets the streak of the victim.
-    If the deathless_streaks table has an event_id column and event_id is passed,
-    operations are performed within this event; otherwise, globally (old behavior).
+    Increases the streak of the killer and resets the streak of the victim
+    within the event (the default event if event_id is not passed).
     Returns a new killer series.
     """
-    killer = killer.lower()
-    victim = victim.lower()
+    if event_id is None:
+        event_id = get_default_event_id()
+    killer_id = intern_character(killer)
+    victim_id = intern_character(victim)
 
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
-        event_aware = _table_has_column(conn, "deathless_streaks", "event_id")
-
-        if event_aware and event_id is not None:
-            # Reset the victim in this event
-            c.execute("DELETE FROM deathless_streaks WHERE character = ? AND event_id = ?", (victim, event_id))
-            # Get the current killer episode in this event
-            c.execute("SELECT count FROM deathless_streaks WHERE character = ? AND event_id = ?", (killer, event_id))
-            row = c.fetchone()
-            if row:
-                new_streak = row[0] + 1
-                c.execute("UPDATE deathless_streaks SET count = ? WHERE character = ? AND event_id = ?", (new_streak, killer, event_id))
-            else:
-                new_streak = 1
-                c.execute("INSERT OR REPLACE INTO deathless_streaks (character, count, event_id) VALUES (?, ?, ?)", (killer, new_streak, event_id))
+        # Reset the victim in this event
+        c.execute("DELETE FROM deathless_streaks WHERE character_id = ? AND event_id = ?", (victim_id, event_id))
+        # Get the current killer episode in this event
+        c.execute("SELECT count FROM deathless_streaks WHERE character_id = ? AND event_id = ?", (killer_id, event_id))
+        row = c.fetchone()
+        if row:
+            new_streak = row[0] + 1
+            c.execute("UPDATE deathless_streaks SET count = ? WHERE character_id = ? AND event_id = ?", (new_streak, killer_id, event_id))
         else:
-            # fallback: old structure (without event_id)
-            c.execute("DELETE FROM deathless_streaks WHERE character = ?", (victim,))
-            c.execute("SELECT count FROM deathless_streaks WHERE character = ?", (killer,))
-            row = c.fetchone()
-            if row:
-                new_streak = row[0] + 1
-                c.execute("UPDATE deathless_streaks SET count = ? WHERE character = ?", (new_streak, killer))
-            else:
-                new_streak = 1
-                c.execute("INSERT INTO deathless_streaks (character, count) VALUES (?, ?)", (killer, new_streak))
+            new_streak = 1
+            c.execute("INSERT OR REPLACE INTO deathless_streaks (character_id, count, event_id) VALUES (?, ?, ?)", (killer_id, new_streak, event_id))
 
         conn.commit()
         return new_streak
@@ -574,7 +923,7 @@ def clear_deathless_streaks():
     """
     Deletes all entries from the deathless_streaks table at startup.
     """
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute("DELETE FROM deathless_streaks")
         conn.commit()
@@ -587,7 +936,10 @@ def get_total_wins(character: str, days: int = 7, event_id: Optional[int] = None
     Counts the total number of wins in N days, taking into account manual adjustments.
     """
     since = datetime.utcnow() - timedelta(days=days)
-    with sqlite3.connect(get_db_path()) as conn:
+    char_id = get_character_id(character)
+    if char_id is None:
+        return 0
+    with get_connection() as conn:
         c = conn.cursor()
         
         # Fragment wins
@@ -595,15 +947,15 @@ def get_total_wins(character: str, days: int = 7, event_id: Optional[int] = None
             event_id = get_default_event_id()
         c.execute("""
             SELECT COUNT(*) FROM frags
-            WHERE killer = ? AND timestamp >= ? AND event_id = ?
-        """, (character.lower(), since, event_id))
+            WHERE killer_id = ? AND timestamp >= ? AND event_id = ?
+        """, (char_id, since, event_id))
         frag_wins = c.fetchone()[0] or 0
 
         # Manual adjustments
         c.execute("""
             SELECT SUM(adjustment) FROM manual_adjustments
-            WHERE character = ? AND timestamp >= ? AND event_id = ?
-        """, (character.lower(), since, event_id))
+            WHERE character_id = ? AND timestamp >= ? AND event_id = ?
+        """, (char_id, since, event_id))
         manual_delta = c.fetchone()[0] or 0
 
         return frag_wins + manual_delta
@@ -623,12 +975,13 @@ def adjust_wins(character: str, delta: int, reason: Optional[str] = None, event_
     """
     if event_id is None:
         event_id = get_default_event_id()
-    with sqlite3.connect(get_db_path()) as conn:
+    char_id = intern_character(character)
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute("""
-            INSERT INTO manual_adjustments (character, adjustment, reason, event_id)
+            INSERT INTO manual_adjustments (character_id, adjustment, reason, event_id)
             VALUES (?, ?, ?, ?)
-        """, (character.lower(), delta, reason, event_id))
+        """, (char_id, delta, reason, event_id))
         conn.commit()
         logging.info(f"✏️\tManual win adjustment: {character} -> {delta} ({reason}) [event_id={event_id}]")
 
@@ -638,12 +991,15 @@ def get_win_sources(character: str, event_id: Optional[int] = None) -> tuple[int
     """
     if event_id is None:
         event_id = get_default_event_id()
-    with sqlite3.connect(get_db_path()) as conn:
+    char_id = get_character_id(character)
+    if char_id is None:
+        return 0, 0
+    with get_connection() as conn:
         c = conn.cursor()
-        c.execute("SELECT SUM(adjustment) FROM manual_adjustments WHERE character = ? AND event_id = ?", (character.lower(), event_id))
+        c.execute("SELECT SUM(adjustment) FROM manual_adjustments WHERE character_id = ? AND event_id = ?", (char_id, event_id))
         manual = c.fetchone()[0] or 0
 
-        c.execute("SELECT COUNT(*) FROM frags WHERE killer = ? AND event_id = ?", (character.lower(), event_id))
+        c.execute("SELECT COUNT(*) FROM frags WHERE killer_id = ? AND event_id = ?", (char_id, event_id))
         natural = c.fetchone()[0] or 0
 
         return manual, natural
@@ -651,19 +1007,19 @@ def get_win_sources(character: str, event_id: Optional[int] = None) -> tuple[int
 # --- MMR ---
 
 def set_mmr_role(threshold: int, role_name: str):
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         conn.execute("""
             INSERT OR REPLACE INTO mmr_roles (threshold, role_name)
             VALUES (?, ?)
         """, (threshold, role_name))
 
 def get_all_mmr_roles() -> list[tuple[int, str]]:
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         cur = conn.execute("SELECT threshold, role_name FROM mmr_roles ORDER BY threshold DESC")
         return cur.fetchall()
 
 def clear_mmr_roles():
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         conn.execute("DELETE FROM mmr_roles")
 
 # --- GLICKO-2 ---
@@ -673,19 +1029,44 @@ def get_glicko_rating(character: str) -> tuple[float, float, float]:
     rating, rd, vol, _ = get_glicko_rating_extended(character)
     return rating, rd, vol
 
-def get_glicko_rating_extended(character: str, event_id: Optional[int] = None) -> tuple[float, float, float, Optional[str]]:
-    character = character.lower()
+@lru_cache(maxsize=4096)
+def _activity_ordinal(day: str) -> Optional[int]:
+    try:
+        return date.fromisoformat(day).toordinal()
+    except ValueError:
+        return None
+
+def effective_rd(rd: float, last_activity: Optional[str], today: Optional[date] = None) -> float:
+    """
+    RD as of today. Stored RDs are as of the last fight; every full UTC day since then without
+    fights adds one decay step, exactly as /mmrsync replays idle days.
+    """
+    if not last_activity:
+        return rd
+    last = _activity_ordinal(last_activity[:10])
+    if last is None:
+        return rd
+    today = today or datetime.now(timezone.utc).date()
+    return decay_rd(rd, today.toordinal() - last - 1)
+
+def get_glicko_rating_extended(
+    character: str, event_id: Optional[int] = None, decay: bool = True
+) -> tuple[float, float, float, Optional[str]]:
+    """(rating, rd, vol, last_activity); rd includes idle decay up to today unless decay=False."""
     if event_id is None:
         event_id = get_default_event_id()
-    with sqlite3.connect(get_db_path()) as conn:
+    char_id = get_character_id(character)
+    if char_id is None:
+        return (1500.0, 350.0, 0.06, None)
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute("""
             SELECT rating, rd, vol, last_activity FROM glicko_ratings
-            WHERE character = ? AND event_id = ?
-        """, (character, event_id))
+            WHERE character_id = ? AND event_id = ?
+        """, (char_id, event_id))
         row = c.fetchone()
         if row:
-            return (row[0], row[1], row[2], row[3])
+            return (row[0], effective_rd(row[1], row[3]) if decay else row[1], row[2], row[3])
         # default
         return (1500.0, 350.0, 0.06, None)
 
@@ -699,41 +1080,168 @@ def set_glicko_rating(
 ):
     """
     Insert or update Glicko-2 rating for a character within the given event.
+    rd must be as of last_activity (see effective_rd); without last_activity the stored one is kept.
     """
-    character = character.lower()
     if event_id is None:
         event_id = get_default_event_id()
+    char_id = intern_character(character)
 
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         conn.execute("""
-            INSERT INTO glicko_ratings (character, rating, rd, vol, last_activity, event_id)
+            INSERT INTO glicko_ratings (character_id, rating, rd, vol, last_activity, event_id)
             VALUES (?, ?, ?, ?, ?, ?)
-            ON CONFLICT(character, event_id) DO UPDATE SET
+            ON CONFLICT(character_id, event_id) DO UPDATE SET
                 rating = excluded.rating,
                 rd = excluded.rd,
                 vol = excluded.vol,
-                last_activity = excluded.last_activity
-        """, (character, rating, rd, vol, last_activity, event_id))
+                last_activity = COALESCE(excluded.last_activity, glicko_ratings.last_activity)
+        """, (char_id, rating, rd, vol, last_activity, event_id))
         conn.commit()
+    notify_change("ratings", event_id, [character])
+
+def _rate_kill(conn: sqlite3.Connection, killer_id: int, victim_id: int, event_id: int, now: datetime):
+    """
+    Rates one kill on conn (no commit): updates both players' glicko_ratings and rating_history rows,
+    and their ratings in every other engine (engines.ENGINES).
+    """
+    stored = {
+        cid: (rating, rd, vol, last_activity)
+        for cid, rating, rd, vol, last_activity in conn.execute("""
+            SELECT character_id, rating, rd, vol, last_activity FROM glicko_ratings
+            WHERE event_id = ? AND character_id IN (?, ?)
+        """, (event_id, killer_id, victim_id))
+    }
+
+    def current(char_id: int) -> tuple[float, float, float]:
+        # RD decayed for the days the player was idle
+        if char_id not in stored:
+            return BASE_RATING, BASE_RD, BASE_VOL
+        rating, rd, vol, last_activity = stored[char_id]
+        return rating, effective_rd(rd, last_activity, now.date()), vol
+
+    k_rating, k_rd, k_vol = current(killer_id)
+    v_rating, v_rd, v_vol = current(victim_id)
+    k_rating, k_rd, v_rating, v_rd = rate_1v1(k_rating, k_rd, k_vol, v_rating, v_rd, v_vol)
+    rows = ((killer_id, k_rating, k_rd, k_vol), (victim_id, v_rating, v_rd, v_vol))
+
+    now_iso = now.isoformat()
+    conn.executemany("""
+        INSERT INTO glicko_ratings (character_id, rating, rd, vol, last_activity, event_id)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(character_id, event_id) DO UPDATE SET
+            rating = excluded.rating,
+            rd = excluded.rd,
+            vol = excluded.vol,
+            last_activity = excluded.last_activity
+    """, ((cid, r, d, v, now_iso, event_id) for cid, r, d, v in rows))
+    record_rating_history(conn, event_id, int(now.timestamp()) // HISTORY_PERIOD, rows)
+    for engine in ENGINES.values():
+        engine.rate_kill(conn, event_id, killer_id, victim_id)
 
 def update_glicko_ratings(killer: str, victim: str, event_id: Optional[int] = None):
-    killer = killer.lower()
-    victim = victim.lower()
     if event_id is None:
         event_id = get_default_event_id()
+    killer_id = intern_character(killer)
+    victim_id = intern_character(victim)
+    with get_connection() as conn:
+        _rate_kill(conn, killer_id, victim_id, event_id, datetime.now(timezone.utc))
+        conn.commit()
+    notify_change("ratings", event_id, [killer, victim])
+
+# --- Rating history ---
+
+def record_rating_history(conn: sqlite3.Connection, event_id: int, period: int, rows):
+    """Writes (character_id, rating, rd, vol) rows for the period on conn; a later write in the same period wins."""
+    conn.executemany("""
+        INSERT INTO rating_history (event_id, character_id, period, rating, rd, vol)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(event_id, character_id, period) DO UPDATE SET
+            rating = excluded.rating,
+            rd = excluded.rd,
+            vol = excluded.vol
+    """, ((event_id, cid, period, r, d, v) for cid, r, d, v in rows))
+
+def _period_start(period: int) -> datetime:
+    return datetime.fromtimestamp(period * HISTORY_PERIOD, timezone.utc)
+
+def get_rating_at(
+    character: str, when: datetime, event_id: Optional[int] = None
+) -> Optional[tuple[datetime, float, float, float]]:
+    """
+    (period start, rating, rd, vol) of the character's latest history row at or before `when`,
+    or None if they had not fought yet. rd is as of that row (no idle decay).
+    """
+    if event_id is None:
+        event_id = get_default_event_id()
+    char_id = get_character_id(character)
+    if char_id is None:
+        return None
+    with get_connection() as conn:
+        row = conn.execute("""
+            SELECT period, rating, rd, vol FROM rating_history
+            WHERE event_id = ? AND character_id = ? AND period <= ?
+            ORDER BY period DESC
+            LIMIT 1
+        """, (event_id, char_id, int(when.timestamp()) // HISTORY_PERIOD)).fetchone()
+    if row is None:
+        return None
+    return (_period_start(row[0]), *row[1:])
 
-    # read current ratings for this event
-    r1 = get_glicko_rating_extended(killer, event_id)
-    r2 = get_glicko_rating_extended(victim, event_id)
-    p1 = Player(r1[0], r1[1], r1[2])
-    p2 = Player(r2[0], r2[1], r2[2])
-
-    p1.update_player([p2.getRating()], [p2.getRd()], [1])
-    p2.update_player([p1.getRating()], [p1.getRd()], [0])
-
-    now_iso = datetime.now(timezone.utc).isoformat()
-    set_glicko_rating(killer, p1.getRating(), p1.getRd(), p1._vol, event_id=event_id, last_activity=now_iso)
-    set_glicko_rating(victim, p2.getRating(), p2.getRd(), p2._vol, event_id=event_id, last_activity=now_iso)
+def get_rating_series(
+    character: str,
+    event_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: Optional[int] = None,
+) -> list[tuple[datetime, float, float, float]]:
+    """
+    The character's history rows (period start, rating, rd, vol) in [since, until], oldest first.
+    With limit, only the newest `limit` rows of the range.
+    """
+    if event_id is None:
+        event_id = get_default_event_id()
+    char_id = get_character_id(character)
+    if char_id is None:
+        return []
+    low = int(since.timestamp()) // HISTORY_PERIOD if since else -1
+    high = int(until.timestamp()) // HISTORY_PERIOD if until else 2 ** 62
+    with get_connection() as conn:
+        rows = conn.execute("""
+            SELECT period, rating, rd, vol FROM rating_history
+            WHERE event_id = ? AND character_id = ? AND period BETWEEN ? AND ?
+            ORDER BY period DESC
+            LIMIT ?
+        """, (event_id, char_id, low, high, -1 if limit is None else limit)).fetchall()
+    return [(_period_start(p), r, d, v) for p, r, d, v in reversed(rows)]
+
+def compact_rating_history(now: Optional[datetime] = None) -> int:
+    """
+    Downsamples rating_history by HISTORY_TIERS: in every bucket that lies entirely before a tier's
+    age, only the player's last row is kept. Commits per event so live frags wait on the write lock
+    for one event at a time. Returns the number of rows deleted.
+    """
+    now_period = int((now or datetime.now(timezone.utc)).timestamp()) // HISTORY_PERIOD
+    start = time.perf_counter()
+    deleted = 0
+    with get_connection() as conn:
+        event_ids = [row[0] for row in conn.execute("SELECT DISTINCT event_id FROM rating_history")]
+        for event_id in event_ids:
+            for age, bucket in HISTORY_TIERS:
+                size = int(bucket.total_seconds()) // HISTORY_PERIOD
+                cutoff = (now_period - int(age.total_seconds()) // HISTORY_PERIOD) // size * size
+                deleted += conn.execute("""
+                    DELETE FROM rating_history
+                    WHERE event_id = :e AND period < :cutoff AND EXISTS (
+                        SELECT 1 FROM rating_history n
+                        WHERE n.event_id = :e
+                          AND n.character_id = rating_history.character_id
+                          AND n.period > rating_history.period
+                          AND n.period < (rating_history.period / :size + 1) * :size
+                    )
+                """, {"e": event_id, "cutoff": cutoff, "size": size}).rowcount
+            conn.commit()
+    logging.info(f"🗜️ Compacted rating history: {deleted} rows removed in {time.perf_counter() - start:.1f}s")
+    return deleted
 
 def get_user_glicko_mmr(discord_id: int, event_id: int) -> Optional[int]:
     """
@@ -743,11 +1251,7 @@ def get_user_glicko_mmr(discord_id: int, event_id: int) -> Optional[int]:
     if not characters:
         return None
 
-    mmrs = []
-    for char in characters:
-        glicko_data = get_glicko_rating_extended(char, event_id=event_id)
-        if glicko_data:
-            mmrs.append(glicko_data[0])
+    mmrs = [rating for rating, _, _, _ in get_glicko_ratings_bulk(characters, event_id).values()]
 
     if not mmrs:
         return None
@@ -758,19 +1262,22 @@ def get_fight_stats(character: str, since: datetime, event_id: int) -> tuple[int
     """
     Returns (wins, losses, total) of the character within the event_id.
     """
-    with sqlite3.connect(get_db_path()) as conn:
+    char_id = get_character_id(character)
+    if char_id is None:
+        return 0, 0, 0
+    with get_connection() as conn:
         c = conn.cursor()
 
         c.execute("""
             SELECT COUNT(*) FROM frags
-            WHERE killer = ? AND timestamp >= ? AND event_id = ?
-        """, (character.lower(), since, event_id))
+            WHERE killer_id = ? AND timestamp >= ? AND event_id = ?
+        """, (char_id, since, event_id))
         wins = c.fetchone()[0]
 
         c.execute("""
             SELECT COUNT(*) FROM frags
-            WHERE victim = ? AND timestamp >= ? AND event_id = ?
-        """, (character.lower(), since, event_id))
+            WHERE victim_id = ? AND timestamp >= ? AND event_id = ?
+        """, (char_id, since, event_id))
         losses = c.fetchone()[0]
 
         return wins, losses, wins + losses
@@ -782,66 +1289,233 @@ def get_last_active_iso(character: str, event_id: Optional[int] = None) -> Optio
     """
     if event_id is None:
         event_id = get_default_event_id()
+    char_id = get_character_id(character)
+    if char_id is None:
+        return None
 
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute("""
-            SELECT MAX(timestamp) FROM frags
-            WHERE event_id = ? AND (killer = ? OR victim = ?)
-        """, (event_id, character.lower(), character.lower()))
+            SELECT MAX(ts) FROM (
+                SELECT MAX(timestamp) AS ts FROM frags WHERE killer_id = ? AND event_id = ?
+                UNION ALL
+                SELECT MAX(timestamp) FROM frags WHERE victim_id = ? AND event_id = ?
+            )
+        """, (char_id, event_id, char_id, event_id))
         row = c.fetchone()[0]
         return row if row else None
 
 def get_last_active_day(character: str, event_id: Optional[int] = None) -> Optional[date]:
-    with sqlite3.connect(get_db_path()) as conn:
+    char_id = get_character_id(character)
+    if char_id is None:
+        return None
+    with get_connection() as conn:
         c = conn.cursor()
         if event_id:
             c.execute("""
-                SELECT MAX(timestamp) FROM frags
-                WHERE (killer = ? OR victim = ?) AND event_id = ?
-            """, (character.lower(), character.lower(), event_id))
+                SELECT MAX(ts) FROM (
+                    SELECT MAX(timestamp) AS ts FROM frags WHERE killer_id = ? AND event_id = ?
+                    UNION ALL
+                    SELECT MAX(timestamp) FROM frags WHERE victim_id = ? AND event_id = ?
+                )
+            """, (char_id, event_id, char_id, event_id))
         else:
             c.execute("""
-                SELECT MAX(timestamp) FROM frags
-                WHERE killer = ? OR victim = ?
-            """, (character.lower(), character.lower()))
+                SELECT MAX(ts) FROM (
+                    SELECT MAX(timestamp) AS ts FROM frags WHERE killer_id = ?
+                    UNION ALL
+                    SELECT MAX(timestamp) FROM frags WHERE victim_id = ?
+                )
+            """, (char_id, char_id))
         result = c.fetchone()[0]
         if result:
             return datetime.fromisoformat(result).date()
         return None
 
+# --- Bulk lookups ---
+# Set-based counterparts of the single-character helpers above. The names travel as one
+# JSON array parameter (json_each), so long lists never hit SQLite's bound-parameter limit.
+# Every requested name is present in the result, with the same default the scalar helper returns.
+
+_CHARACTER_IDS_CTE = """
+    WITH ids AS (
+        SELECT DISTINCT ch.id, ch.name
+        FROM json_each(:names) j
+        JOIN characters ch ON ch.name = j.value
+    )
+"""
+
+def _names_json(characters) -> str:
+    return json.dumps(sorted({name.lower() for name in characters}))
+
+def get_glicko_ratings_bulk(
+    characters: list[str], event_id: Optional[int] = None, decay: bool = True
+) -> dict[str, tuple[float, float, float, Optional[str]]]:
+    """Bulk get_glicko_rating_extended(): name -> (rating, rd, vol, last_activity)."""
+    if event_id is None:
+        event_id = get_default_event_id()
+    with get_connection() as conn:
+        rows = conn.execute(_CHARACTER_IDS_CTE + """
+            SELECT ids.name, g.rating, g.rd, g.vol, g.last_activity
+            FROM ids
+            JOIN glicko_ratings g ON g.character_id = ids.id AND g.event_id = :event_id
+        """, {"names": _names_json(characters), "event_id": event_id}).fetchall()
+    today = datetime.now(timezone.utc).date()
+    found = {
+        name: (rating, effective_rd(rd, last, today) if decay else rd, vol, last)
+        for name, rating, rd, vol, last in rows
+    }
+    return {name: found.get(name.lower(), (1500.0, 350.0, 0.06, None)) for name in characters}
+
+def get_engine_scores_bulk(engine_name: str, characters: list[str], event_id: int) -> dict[str, Optional[float]]:
+    """name -> leaderboard value (score_sql) in one of engines.ENGINES, None if the character has no rating there."""
+    engine = ENGINES[engine_name]
+    with get_connection() as conn:
+        rows = conn.execute(_CHARACTER_IDS_CTE + f"""
+            SELECT ids.name, {engine.score_sql}
+            FROM ids
+            JOIN {engine.table} e ON e.character_id = ids.id AND e.event_id = :event_id
+        """, {"names": _names_json(characters), "event_id": event_id}).fetchall()
+    found = dict(rows)
+    return {name: found.get(name.lower()) for name in characters}
+
+def get_fight_stats_bulk(
+    characters: list[str], since: datetime, event_id: int
+) -> dict[str, tuple[int, int, int]]:
+    """Bulk get_fight_stats(): name -> (wins, losses, total) since the given time."""
+    with get_connection() as conn:
+        rows = conn.execute(_CHARACTER_IDS_CTE + """
+            SELECT ids.name,
+                   (SELECT COUNT(*) FROM frags
+                    WHERE killer_id = ids.id AND event_id = :event_id AND timestamp >= :since),
+                   (SELECT COUNT(*) FROM frags
+                    WHERE victim_id = ids.id AND event_id = :event_id AND timestamp >= :since)
+            FROM ids
+        """, {"names": _names_json(characters), "since": since, "event_id": event_id}).fetchall()
+    found = {name: (wins, losses, wins + losses) for name, wins, losses in rows}
+    return {name: found.get(name.lower(), (0, 0, 0)) for name in characters}
+
+def get_opponent_stats_bulk(
+    characters: list[str], since: datetime, event_id: Optional[int] = None
+) -> dict[str, tuple[int, int]]:
+    """
+    The characters' fights since the given time, summed per opponent: opponent name -> (wins, losses).
+    event_id=None counts every event.
+    """
+    with get_connection() as conn:
+        rows = conn.execute(_CHARACTER_IDS_CTE + """
+            , fights AS (
+                SELECT f.victim_id AS opponent, 1 AS won
+                FROM ids JOIN frags f ON f.killer_id = ids.id
+                WHERE f.timestamp >= :since AND (:event_id IS NULL OR f.event_id = :event_id)
+                UNION ALL
+                SELECT f.killer_id, 0
+                FROM ids JOIN frags f ON f.victim_id = ids.id
+                WHERE f.timestamp >= :since AND (:event_id IS NULL OR f.event_id = :event_id)
+            )
+            SELECT ch.name, t.wins, t.fights - t.wins
+            FROM (SELECT opponent, SUM(won) AS wins, COUNT(*) AS fights FROM fights GROUP BY opponent) t
+            JOIN characters ch ON ch.id = t.opponent
+        """, {"names": _names_json(characters), "since": since, "event_id": event_id}).fetchall()
+    return {name: (wins, losses) for name, wins, losses in rows}
+
+def get_win_sources_bulk(characters: list[str], event_id: Optional[int] = None) -> dict[str, tuple[int, int]]:
+    """Bulk get_win_sources(): name -> (manual, natural) wins."""
+    if event_id is None:
+        event_id = get_default_event_id()
+    with get_connection() as conn:
+        rows = conn.execute(_CHARACTER_IDS_CTE + """
+            SELECT ids.name,
+                   (SELECT SUM(adjustment) FROM manual_adjustments
+                    WHERE character_id = ids.id AND event_id = :event_id),
+                   (SELECT COUNT(*) FROM frags WHERE killer_id = ids.id AND event_id = :event_id)
+            FROM ids
+        """, {"names": _names_json(characters), "event_id": event_id}).fetchall()
+    found = {name: (manual or 0, natural or 0) for name, manual, natural in rows}
+    return {name: found.get(name.lower(), (0, 0)) for name in characters}
+
+def get_last_active_bulk(characters: list[str], event_id: Optional[int] = None) -> dict[str, Optional[str]]:
+    """Bulk get_last_active_iso(): name -> ISO timestamp of the last frag in the event, or None."""
+    if event_id is None:
+        event_id = get_default_event_id()
+    with get_connection() as conn:
+        rows = conn.execute(_CHARACTER_IDS_CTE + """
+            SELECT ids.name, MAX(
+                (SELECT MAX(timestamp) FROM frags WHERE killer_id = ids.id AND event_id = :event_id),
+                (SELECT MAX(timestamp) FROM frags WHERE victim_id = ids.id AND event_id = :event_id)
+            )
+            FROM ids
+        """, {"names": _names_json(characters), "event_id": event_id}).fetchall()
+    found = dict(rows)
+    return {name: found.get(name.lower()) or None for name in characters}
+
+def get_character_owners_bulk(characters: list[str]) -> dict[str, Optional[int]]:
+    """Bulk get_character_owner(): name -> discord_id, or None if unlinked."""
+    with get_connection() as conn:
+        rows = conn.execute("""
+            SELECT cm.character, cm.discord_id
+            FROM character_map cm
+            WHERE cm.character IN (SELECT value FROM json_each(?))
+        """, (json.dumps(sorted(set(characters))),)).fetchall()
+    found = dict(rows)
+    return {name: found.get(name) for name in characters}
+
+def get_user_characters_bulk(discord_ids: list[int]) -> dict[int, list[str]]:
+    """Bulk get_user_characters(): discord_id -> linked character names (empty list if none)."""
+    with get_connection() as conn:
+        rows = conn.execute("""
+            SELECT cm.discord_id, cm.character
+            FROM character_map cm
+            WHERE cm.discord_id IN (SELECT value FROM json_each(?))
+        """, (json.dumps(sorted(set(discord_ids))),)).fetchall()
+    found: dict[int, list[str]] = {discord_id: [] for discord_id in discord_ids}
+    for discord_id, character in rows:
+        found[discord_id].append(character)
+    return found
+
+def get_character_names() -> list[str]:
+    """Every known character name: seen in a frag or linked to a user."""
+    with get_connection() as conn:
+        rows = conn.execute("SELECT name FROM characters UNION SELECT character FROM character_map").fetchall()
+    return [name for (name,) in rows]
+
+def get_event_character_names(event_id: int) -> list[str]:
+    """Names of the characters with at least one frag (as killer or victim) in the event."""
+    with get_connection() as conn:
+        rows = conn.execute("""
+            SELECT c.name FROM characters c
+            WHERE EXISTS (SELECT 1 FROM frags f WHERE f.killer_id = c.id AND f.event_id = ?)
+               OR EXISTS (SELECT 1 FROM frags f WHERE f.victim_id = c.id AND f.event_id = ?)
+        """, (event_id, event_id)).fetchall()
+    return [name for (name,) in rows]
+
 def get_all_players(event_id: Optional[int] = None) -> set:
     """Return set of discord_ids (int) and unlinked character names (str) for the given event_id.
        If event_id is None -> return global set (backwards compatible).
     """
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         if event_id:
             # characters that participated in this event
-            c.execute("SELECT DISTINCT killer FROM frags WHERE event_id = ?", (event_id,))
-            killers = {row[0].lower() for row in c.fetchall()}
-            c.execute("SELECT DISTINCT victim FROM frags WHERE event_id = ?", (event_id,))
-            victims = {row[0].lower() for row in c.fetchall()}
+            participants = """
+                SELECT killer_id AS character_id FROM frags WHERE event_id = :event_id
+                UNION
+                SELECT victim_id FROM frags WHERE event_id = :event_id
+            """
         else:
-            c.execute("SELECT DISTINCT killer FROM frags")
-            killers = {row[0].lower() for row in c.fetchall()}
-            c.execute("SELECT DISTINCT victim FROM frags")
-            victims = {row[0].lower() for row in c.fetchall()}
-
-        all_chars = killers | victims
+            participants = "SELECT killer_id AS character_id FROM frags UNION SELECT victim_id FROM frags"
 
         # map characters -> discord_id (only those present in character_map)
-        if not all_chars:
-            return set()
-
-        placeholders = ",".join("?" for _ in all_chars)
-        q = f"SELECT character, discord_id FROM character_map WHERE character IN ({placeholders})"
-        c.execute(q, tuple(all_chars))
-        mapped = {row[0].lower(): row[1] for row in c.fetchall()}
+        c.execute(f"""
+            SELECT ch.name, cm.discord_id
+            FROM ({participants}) p
+            JOIN characters ch ON ch.id = p.character_id
+            LEFT JOIN character_map cm ON cm.character = ch.name
+        """, {"event_id": event_id})
+        rows = c.fetchall()
 
-        discord_ids = set(mapped.values())
-        mapped_chars = set(mapped.keys())
-        unlinked_chars = all_chars - mapped_chars
+        discord_ids = {discord_id for _, discord_id in rows if discord_id is not None}
+        unlinked_chars = {name for name, discord_id in rows if discord_id is None}
 
         return discord_ids | unlinked_chars
 
@@ -860,11 +1534,12 @@ def get_top_glicko(limit: int = 10) -> list[tuple[str, float]]:
     Returns a list of top characters by Glicko-2 rating.
     Each item: (character, rating)
     """
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute("""
-            SELECT character, rating FROM glicko_ratings
-            ORDER BY rating DESC LIMIT ?
+            SELECT ch.name, g.rating FROM glicko_ratings g
+            JOIN characters ch ON ch.id = g.character_id
+            ORDER BY g.rating DESC LIMIT ?
         """, (limit,))
         return c.fetchall()
 
@@ -872,7 +1547,7 @@ def init_mmr_roles_table():
     """
     Initializes the mmr_roles table if it doesn't exist.
     """
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         conn.execute("""
             CREATE TABLE IF NOT EXISTS mmr_roles (
                 threshold INTEGER PRIMARY KEY,
@@ -886,52 +1561,14 @@ def recalculate_glicko_recent(days: int = 30, event_id: Optional[int] = None):
     Rebuild Glicko-2 ratings based on all frags from the last N days.
     Used in /topmmr to get fresh rankings.
     """
+    from replay import replay_event, load_event_ratings, save_replay
+
     if event_id is None:
         event_id = get_default_event_id()
-        
-    since = datetime.utcnow() - timedelta(days=days)
-    battles_by_day = defaultdict(list)
 
-    with sqlite3.connect(get_db_path()) as conn:
-        c = conn.cursor()
-        c.execute("SELECT killer, victim, timestamp FROM frags WHERE timestamp >= ? AND event_id = ? ORDER BY timestamp ASC", (since, event_id))
-        rows = c.fetchall()
-
-    for killer, victim, ts in rows:
-        day = datetime.fromisoformat(ts).date()
-        battles_by_day[day].append((killer.lower(), victim.lower()))
-
-    all_players = {}
-    current = min(battles_by_day) if battles_by_day else datetime.now(timezone.utc).date()
-    end = max(battles_by_day) if battles_by_day else current
-
-    while current <= end:
-        fights = battles_by_day.get(current, [])
-        participated = set()
-
-        for killer, victim in fights:
-            if killer not in all_players:
-                all_players[killer] = Player(*get_glicko_rating_extended(killer, event_id)[:3])
-            if victim not in all_players:
-                all_players[victim] = Player(*get_glicko_rating_extended(victim, event_id)[:3])
-
-            p1 = all_players[killer]
-            p2 = all_players[victim]
-
-            p1.update_player([p2.getRating()], [p2.getRd()], [1])
-            p2.update_player([p1.getRating()], [p1.getRd()], [0])
-            participated.update([killer, victim])
-
-        for name, player in all_players.items():
-            if name not in participated:
-                player.pre_rating_period()
-
-        current += timedelta(days=1)
-
-    with sqlite3.connect(get_db_path()) as conn:
-        for name, player in all_players.items():
-            last_act = get_last_active_iso(name, event_id=event_id)
-            set_glicko_rating(name, player.getRating(), player.getRd(), player._vol, event_id=event_id, last_activity=last_act)
+    since = datetime.utcnow() - timedelta(days=days)
+    result = replay_event(event_id, since, initial=load_event_ratings(event_id))
+    save_replay(event_id, result)
 
 # --- Events ---
 
@@ -945,7 +1582,7 @@ def create_event(name: str, description: Optional[str] = None) -> int:
 
     normalized = name.strip().lower()
 
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
 
         # Check uniqueness
@@ -963,7 +1600,8 @@ def create_event(name: str, description: Optional[str] = None) -> int:
         if not row:
             logging.error(f"Failed to create/find event '{normalized}' in DB after insert.")
             raise RuntimeError(f"Failed to create or fetch event '{normalized}'")
-        return int(row[0])
+    notify_change("events", int(row[0]))
+    return int(row[0])
 
 def get_event_by_name(name: str) -> Optional[tuple]:
     """
@@ -974,13 +1612,13 @@ def get_event_by_name(name: str) -> Optional[tuple]:
         return None
 
     normalized = name.strip().lower()
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute("SELECT id, name, description, created_at FROM events WHERE name = ?", (normalized,))
         return c.fetchone()
 
 def get_event_id_by_channel(channel_id: int) -> Optional[int]:
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute("SELECT event_id FROM event_channels WHERE channel_id = ?", (int(channel_id),))
         row = c.fetchone()
@@ -997,7 +1635,7 @@ def set_event_channel(event_name: str, channel_id: int) -> bool:
 
     event_id = event[0]
 
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
 
         # Delete the old bindings of this channel (if any)
@@ -1022,7 +1660,7 @@ def clear_event_channels(event_name: str):
     if not event:
         return
     event_id = event[0]
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         conn.execute("DELETE FROM event_channels WHERE event_id = ?", (event_id,))
         conn.commit()
 
@@ -1032,7 +1670,7 @@ def list_events() -> list[tuple]:
     an associated announcement channel (if any).
     Format: (name, description, channel_id, is_default)
     """
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute("""
             SELECT e.name, e.description, ec.channel_id, 
@@ -1044,6 +1682,11 @@ def list_events() -> list[tuple]:
         """)
         return c.fetchall()
 
+def list_event_ids() -> list[tuple[int, str]]:
+    """(id, name) of every event, oldest first."""
+    with get_connection() as conn:
+        return conn.execute("SELECT id, name FROM events ORDER BY id").fetchall()
+
 def get_default_event_id() -> int:
     # try settings.default_event otherwise 'arena'
     default_name = get_setting("default_event") or "arena"
@@ -1068,14 +1711,14 @@ def get_event_id_by_name(name: str) -> Optional[int]:
     """
     if not name:
         return None
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute("SELECT id FROM events WHERE name = ?", (name.strip().lower(),))
         row = c.fetchone()
         return row[0] if row else None
 
 def ensure_default_event():
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute("SELECT value FROM settings WHERE key = 'default_event'")
         row = c.fetchone()
@@ -1085,7 +1728,7 @@ def ensure_default_event():
             logging.info("✅ Default event set to 'arena'")
 
 def get_event_channel(event_id: int, channel_type: str) -> Optional[int]:
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         c.execute("""
             SELECT channel_id FROM event_channels
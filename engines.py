@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+# engines.py
+#
+# Rating systems computed next to Glicko-2 for comparison. Glicko-2 stays the primary engine
+# (glicko_ratings, checkpoints, rating history, lazy RD decay: see replay.py and db.py); the engines
+# here subscribe to the same replay pass (replay.replay(engines=...)), which hands each of them every
+# day's kills right after Glicko-2 has rated it, and to live frags (db._rate_kill). Each engine keeps
+# its results in its own per-event table.
+
+import math
+
+import numpy as np
+
+class RatingEngine:
+    """
+    A rating system over 1v1 kills. Per player it keeps the values named in `columns` (starting at
+    `defaults`); rate_1v1() rates one kill. A replay calls start(), then rate_day() for every day
+    with kills, then save(). `score_sql` is the leaderboard value, an SQL expression over the columns.
+    """
+
+    name = ""
+    label = ""
+    table = ""
+    columns: tuple[str, ...] = ()
+    defaults: tuple[float, ...] = ()
+    score_sql = ""
+
+    def __init__(self):
+        self.state: list[np.ndarray] = []
+
+    @staticmethod
+    def rate_1v1(winner: tuple, loser: tuple) -> tuple[tuple, tuple]:
+        raise NotImplementedError
+
+    @classmethod
+    def schema(cls) -> str:
+        cols = ",\n".join(f"                {c} REAL NOT NULL DEFAULT {d}" for c, d in zip(cls.columns, cls.defaults))
+        return f"""
+            CREATE TABLE IF NOT EXISTS {cls.table} (
+                character_id INTEGER NOT NULL REFERENCES characters(id),
+                event_id INTEGER NOT NULL,
+{cols},
+                PRIMARY KEY (character_id, event_id)
+            )
+        """
+
+    @classmethod
+    def score(cls, values: tuple) -> float:
+        """score_sql for a row of values in Python."""
+        return values[0]
+
+    # --- Replay ---
+
+    def start(self, n: int):
+        self.state = [np.full(n, d, dtype=np.float64) for d in self.defaults]
+
+    def rate_day(self, players: np.ndarray, k_idx: np.ndarray, v_idx: np.ndarray):
+        """
+        One day's kills in order; k_idx/v_idx index into `players` (see replay._apply_day).
+        Engines override this with the same math inlined over plain lists, the replay's hot loop.
+        """
+        rows = list(zip(*(c[players].tolist() for c in self.state)))
+        rate = self.rate_1v1
+        for k, v in zip(k_idx.tolist(), v_idx.tolist()):
+            if k != v:  # a self-kill moves no rating between players
+                rows[k], rows[v] = rate(rows[k], rows[v])
+        for c, values in zip(self.state, zip(*rows)):
+            c[players] = values
+
+    def save(self, conn, event_id: int, character_ids: np.ndarray, clear: bool):
+        """Writes the replayed state (aligned with character_ids) on conn, without committing."""
+        if clear:
+            conn.execute(f"DELETE FROM {self.table} WHERE event_id = ?", (event_id,))
+        conn.executemany(
+            self._upsert(),
+            ((cid, event_id, *values) for cid, *values in zip(character_ids.tolist(), *(c.tolist() for c in self.state)))
+        )
+
+    # --- Live ---
+
+    @classmethod
+    def _upsert(cls) -> str:
+        return f"""
+            INSERT INTO {cls.table} (character_id, event_id, {", ".join(cls.columns)})
+            VALUES (?, ?, {", ".join("?" for _ in cls.columns)})
+            ON CONFLICT(character_id, event_id) DO UPDATE SET
+                {", ".join(f"{c} = excluded.{c}" for c in cls.columns)}
+        """
+
+    @classmethod
+    def rate_kill(cls, conn, event_id: int, killer_id: int, victim_id: int):
+        """Rates one live frag on conn (no commit)."""
+        if killer_id == victim_id:
+            return
+        stored = {
+            cid: tuple(values)
+            for cid, *values in conn.execute(
+                f"SELECT character_id, {', '.join(cls.columns)} FROM {cls.table} "
+                "WHERE event_id = ? AND character_id IN (?, ?)",
+                (event_id, killer_id, victim_id)
+            )
+        }
+        killer, victim = cls.rate_1v1(stored.get(killer_id, cls.defaults), stored.get(victim_id, cls.defaults))
+        conn.executemany(cls._upsert(), ((killer_id, event_id, *killer), (victim_id, event_id, *victim)))
+
+class EloEngine(RatingEngine):
+    """Classic Elo with a fixed K: the winner takes K·(1 - E) from the loser."""
+
+    name = "elo"
+    label = "Elo"
+    table = "elo_ratings"
+    columns = ("rating", "games")
+    defaults = (1500.0, 0.0)
+    score_sql = "rating"
+
+    K = 32.0
+
+    @staticmethod
+    def rate_1v1(winner: tuple, loser: tuple) -> tuple[tuple, tuple]:
+        w_rating, w_games = winner
+        l_rating, l_games = loser
+        delta = EloEngine.K / (1 + 10 ** ((w_rating - l_rating) / 400))  # K · (1 - E_winner)
+        return (w_rating + delta, w_games + 1), (l_rating - delta, l_games + 1)
+
+    def rate_day(self, players: np.ndarray, k_idx: np.ndarray, v_idx: np.ndarray):
+        rating, games = self.state
+        r = rating[players].tolist()
+        K = self.K
+        for k, v in zip(k_idx.tolist(), v_idx.tolist()):
+            if k != v:
+                delta = K / (1 + 10 ** ((r[k] - r[v]) / 400))
+                r[k] += delta
+                r[v] -= delta
+        rating[players] = r
+        played = k_idx != v_idx
+        games[players] += np.bincount(k_idx[played], minlength=len(players)) + np.bincount(v_idx[played], minlength=len(players))
+
+def _v_w(t: float) -> tuple[float, float]:
+    """TrueSkill's v(t) = N(t)/Φ(t) and w(t) = v·(v + t) for a win without draws."""
+    cdf = 0.5 * math.erfc(-t / math.sqrt(2))
+    if cdf < 1e-300:
+        v = -t  # the ratio's asymptote, where Φ underflows
+    else:
+        v = math.exp(-t * t / 2) / math.sqrt(2 * math.pi) / cdf
+    return v, v * (v + t)
+
+class TrueSkillEngine(RatingEngine):
+    """
+    TrueSkill for two-player games without draws, on a 1500 scale: the standard parameters
+    (μ = 25, σ = μ/3, β = σ/2, τ = σ/100) multiplied by 60. The leaderboard value is the
+    conservative μ - 3σ, which starts at 0.
+    """
+
+    name = "trueskill"
+    label = "TrueSkill"
+    table = "trueskill_ratings"
+    columns = ("mu", "sigma")
+    defaults = (1500.0, 500.0)
+    score_sql = "mu - 3 * sigma"
+
+    BETA = 250.0
+    TAU = 5.0
+
+    @classmethod
+    def score(cls, values: tuple) -> float:
+        return values[0] - 3 * values[1]
+
+    @staticmethod
+    def rate_1v1(winner: tuple, loser: tuple) -> tuple[tuple, tuple]:
+        w_mu, w_sigma = winner
+        l_mu, l_sigma = loser
+        tau2 = TrueSkillEngine.TAU ** 2
+        w_var = w_sigma * w_sigma + tau2
+        l_var = l_sigma * l_sigma + tau2
+        c2 = 2 * TrueSkillEngine.BETA ** 2 + w_var + l_var
+        c = math.sqrt(c2)
+        v, w = _v_w((w_mu - l_mu) / c)
+        return (
+            (w_mu + w_var / c * v, math.sqrt(w_var * (1 - w_var / c2 * w))),
+            (l_mu - l_var / c * v, math.sqrt(l_var * (1 - l_var / c2 * w))),
+        )
+
+    def rate_day(self, players: np.ndarray, k_idx: np.ndarray, v_idx: np.ndarray):
+        mu_arr, sigma_arr = self.state
+        mu = mu_arr[players].tolist()
+        sigma = sigma_arr[players].tolist()
+        tau2 = self.TAU ** 2
+        beta2 = 2 * self.BETA ** 2
+        sqrt, exp, erfc = math.sqrt, math.exp, math.erfc
+        root2, root2pi = math.sqrt(2), math.sqrt(2 * math.pi)
+        for k, v in zip(k_idx.tolist(), v_idx.tolist()):
+            if k == v:
+                continue
+            w_var = sigma[k] * sigma[k] + tau2
+            l_var = sigma[v] * sigma[v] + tau2
+            c2 = beta2 + w_var + l_var
+            c = sqrt(c2)
+            t = (mu[k] - mu[v]) / c
+            # _v_w(t), inlined
+            cdf = 0.5 * erfc(-t / root2)
+            vt = -t if cdf < 1e-300 else exp(-t * t / 2) / root2pi / cdf
+            wt = vt * (vt + t)
+            mu[k] += w_var / c * vt
+            mu[v] -= l_var / c * vt
+            sigma[k] = sqrt(w_var * (1 - w_var / c2 * wt))
+            sigma[v] = sqrt(l_var * (1 - l_var / c2 * wt))
+        mu_arr[players] = mu
+        sigma_arr[players] = sigma
+
+# Engines computed besides Glicko-2, by name
+ENGINES: dict[str, type[RatingEngine]] = {engine.name: engine for engine in (EloEngine, TrueSkillEngine)}
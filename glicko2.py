@@ -2,12 +2,83 @@
 
 import math
 
+# Glicko-2 scale: mu = (rating - 1500) / SCALE, phi = rd / SCALE
+SCALE = 173.7178
+BASE_RATING = 1500.0
+BASE_RD = 350.0
+BASE_VOL = 0.06
+TAU = 0.5  # volatility — can be adapted to your PvP
+
+# g(phi) = 1 / sqrt(1 + Q * phi²)
+Q = 3 / math.pi ** 2
+
+# RD growth per idle rating period (a day in this bot), capped at the starting RD
+DECAY_C = 34.6
+MAX_RD = 350.0
+
+def decay_rd(rd: float, periods: int) -> float:
+    """`periods` pre_rating_period() steps at once: min(sqrt(rd² + k·c²), cap) in closed form."""
+    if periods <= 0:
+        return rd
+    return min(math.sqrt(rd ** 2 + periods * DECAY_C ** 2), MAX_RD)
+
+def expected_score(rating: float, rd: float, opp_rating: float, opp_rd: float) -> float:
+    """
+    Probability that a player beats the opponent (Glicko-2 E with both players' uncertainty):
+    1 / (1 + exp(-g(sqrt(φ² + φ_opp²)) · (μ - μ_opp))).
+    """
+    phi2 = (rd / SCALE) ** 2 + (opp_rd / SCALE) ** 2
+    g = 1 / math.sqrt(1 + Q * phi2)
+    return 1 / (1 + math.exp(-g * (rating - opp_rating) / SCALE))
+
+def rate_game(rating: float, rd: float, vol: float, opp_rating: float, opp_rd: float, score: float) -> tuple[float, float]:
+    """A single-game rating period for one player (Player.update_player() with one opponent)."""
+    mu = (rating - 1500) / SCALE
+    phi = rd / SCALE
+    opp_phi = opp_rd / SCALE
+    g = 1 / math.sqrt(1 + Q * opp_phi * opp_phi)
+    e = 1 / (1 + math.exp(-g * (mu - (opp_rating - 1500) / SCALE)))
+    phi = 1 / math.sqrt(1 / (phi * phi + vol * vol) + g * g * e * (1 - e))
+    return SCALE * (mu + phi * phi * g * (score - e)) + 1500, SCALE * phi
+
+def rate_1v1(
+    winner_rating: float, winner_rd: float, winner_vol: float,
+    loser_rating: float, loser_rd: float, loser_vol: float,
+) -> tuple[float, float, float, float]:
+    """
+    One kill as two single-game rating periods, in the order the bot has always used: the winner
+    is rated against the loser, then the loser against the winner's new values. Returns
+    (winner_rating, winner_rd, loser_rating, loser_rd); volatility is not updated (see Player).
+    Same result as two Player.update_player() calls up to float rounding (~1e-12).
+    """
+    sqrt = math.sqrt
+    exp = math.exp
+    mu_w = (winner_rating - 1500) / SCALE
+    phi_w = winner_rd / SCALE
+    mu_l = (loser_rating - 1500) / SCALE
+    phi_l = loser_rd / SCALE
+
+    g = 1 / sqrt(1 + Q * phi_l * phi_l)
+    e = 1 / (1 + exp(-g * (mu_w - mu_l)))
+    phi_w = 1 / sqrt(1 / (phi_w * phi_w + winner_vol * winner_vol) + g * g * e * (1 - e))
+    mu_w += phi_w * phi_w * g * (1 - e)
+
+    g = 1 / sqrt(1 + Q * phi_w * phi_w)
+    e = 1 / (1 + exp(-g * (mu_l - mu_w)))
+    phi_l = 1 / sqrt(1 / (phi_l * phi_l + loser_vol * loser_vol) + g * g * e * (1 - e))
+    mu_l -= phi_l * phi_l * g * e
+
+    return SCALE * mu_w + 1500, SCALE * phi_w, SCALE * mu_l + 1500, SCALE * phi_l
+
 class Player:
-    def __init__(self, rating: float = 1500.0, rd: float = 350.0, vol: float = 0.06):
+    __slots__ = ("_rating", "_rd", "_vol")
+
+    _tau = TAU
+
+    def __init__(self, rating: float = BASE_RATING, rd: float = BASE_RD, vol: float = BASE_VOL):
         self._rating = rating
         self._rd = rd
         self._vol = vol
-        self._tau = 0.5  # volatility — can be adapted to your PvP
 
     def getRating(self):
         return self._rating
@@ -15,35 +86,28 @@ class Player:
     def getRd(self):
         return self._rd
 
-    def pre_rating_period(self):
-        c = 34.6  # increasing uncertainty over time (setting decay)
-        self._rd = min(math.sqrt(self._rd ** 2 + c ** 2), 350)
-
-    def _g(self, rd):
-        return 1 / math.sqrt(1 + 3 * (rd ** 2) / (math.pi ** 2))
+    def getVol(self):
+        return self._vol
 
-    def _E(self, rating, opp_rating, opp_rd):
-        return 1 / (1 + math.exp(-self._g(opp_rd) * (rating - opp_rating)))
+    def pre_rating_period(self):
+        self._rd = decay_rd(self._rd, 1)  # increasing uncertainty over time
 
     def update_player(self, rating_list, RD_list, outcome_list):
-        mu = (self._rating - 1500) / 173.7178
-        phi = self._rd / 173.7178
-
-        opp_mu = [(r - 1500) / 173.7178 for r in rating_list]
-        opp_phi = [rd / 173.7178 for rd in RD_list]
-
-        g_list = [1 / math.sqrt(1 + 3 * (phi_j ** 2) / (math.pi ** 2)) for phi_j in opp_phi]
-        E_list = [1 / (1 + math.exp(-g * (mu - mu_j))) for g, mu_j in zip(g_list, opp_mu)]
-
-        # Step 2: Calculate the variance
-        v_inv = sum((g ** 2) * E * (1 - E) for g, E in zip(g_list, E_list))
+        mu = (self._rating - 1500) / SCALE
+        phi = self._rd / SCALE
+
+        # Steps 2-3: the variance and the score sum (delta = v * score), in one pass
+        v_inv = 0.0
+        score = 0.0
+        for rating, rd, s in zip(rating_list, RD_list, outcome_list):
+            g = 1 / math.sqrt(1 + Q * (rd / SCALE) ** 2)
+            E = 1 / (1 + math.exp(-g * (mu - (rating - 1500) / SCALE)))
+            v_inv += g * g * E * (1 - E)
+            score += g * (s - E)
         v = 1 / v_inv
 
-        # Step 3: Calculate the delta
-        delta = v * sum(g * (s - E) for g, s, E in zip(g_list, outcome_list, E_list))
-
         # Step 4: Skip the volatility update (to simplify)
-        
+
         # Step 5: PHI*
         phi_star = math.sqrt(phi ** 2 + self._vol ** 2)
 
@@ -51,8 +115,32 @@ class Player:
         phi_new = 1 / math.sqrt((1 / (phi_star ** 2)) + (1 / v))
 
         # Step 7: New MU value
-        mu_new = mu + (phi_new ** 2) * sum(g * (s - E) for g, s, E in zip(g_list, outcome_list, E_list))
+        mu_new = mu + (phi_new ** 2) * score
 
         # Step 8: Back to Rating
-        self._rating = 173.7178 * mu_new + 1500
-        self._rd = 173.7178 * phi_new
+        self._rating = SCALE * mu_new + 1500
+        self._rd = SCALE * phi_new
+
+if __name__ == "__main__":
+    # Microbenchmark: python glicko2.py
+    import random
+    import timeit
+
+    random.seed(1)
+    games = [(random.uniform(1200, 1800), random.uniform(50, 350), random.uniform(1200, 1800), random.uniform(50, 350))
+             for _ in range(10000)]
+
+    def with_player():
+        for r1, d1, r2, d2 in games:
+            p1 = Player(r1, d1)
+            p2 = Player(r2, d2)
+            p1.update_player([p2.getRating()], [p2.getRd()], [1])
+            p2.update_player([p1.getRating()], [p1.getRd()], [0])
+
+    def with_kernel():
+        for r1, d1, r2, d2 in games:
+            rate_1v1(r1, d1, BASE_VOL, r2, d2, BASE_VOL)
+
+    for name, fn in (("Player.update_player x2", with_player), ("rate_1v1", with_kernel)):
+        best = min(timeit.repeat(fn, number=5, repeat=5)) / 5
+        print(f"{name:>24}: {len(games) / best:>12,.0f} kills/s ({2 * len(games) / best:,.0f} updates/s)")
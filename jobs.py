@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+# jobs.py
+#
+# Rating rebuilds as background jobs. Each event's replay runs in a worker process with its own
+# read-only connection and only computes; the bot process then writes the results with one
+# bulk upsert (replay.save_replays). Workers report progress through a queue drained by a thread.
+# Also home to the periodic rating_history compaction, which runs on a thread of the bot process.
+
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+from typing import Callable, Optional
+
+from db import compact_rating_history, get_db_path, set_db_path
+from profiler import untraced
+
+# Leave a core for the bot's event loop
+MAX_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+# A worker reports progress at most this often (seconds)
+PROGRESS_INTERVAL = 0.5
+
+# rating_history is compacted this often (seconds)
+COMPACT_INTERVAL = 6 * 3600
+
+class Job:
+    """A rating rebuild of one or more events (/mmrsync, /mmrsyncall)."""
+
+    __slots__ = ("id", "event_ids", "from_day", "period", "status", "progress", "timings",
+                 "started", "finished", "results", "error", "futures", "task")
+
+    def __init__(self, job_id: int, event_ids: tuple[int, ...], from_day: Optional[date], period: Optional[str]):
+        self.id = job_id
+        self.event_ids = event_ids
+        self.from_day = from_day
+        self.period = period
+        self.status = "queued"  # queued -> running -> saving -> done | failed
+        self.progress: dict[int, tuple[int, int]] = {}  # event_id -> (done, total)
+        self.timings: dict[int, float] = {}  # event_id -> replay seconds in the worker
+        self.started = time.perf_counter()
+        self.finished = None
+        self.results = None
+        self.error = None
+        self.futures = []
+        self.task = None
+
+    @property
+    def done(self) -> int:
+        return sum(d for d, _ in self.progress.values())
+
+    @property
+    def total(self) -> int:
+        return sum(t for _, t in self.progress.values())
+
+    @property
+    def unit(self) -> str:
+        return f"{self.period}s" if self.period else "days"
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    async def wait(self) -> dict:
+        """Waits for the job (including the save) without cancelling it; returns {event_id: ReplayResult}."""
+        return await asyncio.shield(self.task)
+
+_executor: Optional[ProcessPoolExecutor] = None
+_job_ids = itertools.count(1)
+_jobs: dict[int, Job] = {}       # running jobs by id
+_by_event: dict[int, Job] = {}   # running job per event
+
+# --- Worker process ---
+
+_worker_queue = None
+
+def _init_worker(db_path: str, queue):
+    global _worker_queue
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname).1s | %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
+    set_db_path(db_path, readonly=True)
+    _worker_queue = queue
+
+def _reporter(job_id: int, event_id: int):
+    last = 0.0
+
+    def report(done: int, total: int):
+        nonlocal last
+        now = time.monotonic()
+        if _worker_queue is not None and (now - last >= PROGRESS_INTERVAL or done == total):
+            last = now
+            _worker_queue.put((job_id, event_id, done, total))
+    return report
+
+def _rebuild(job_id: int, event_id: int, from_day: Optional[date], period: Optional[str]):
+    """Worker: replays one event and returns (event_id, ReplayResult, seconds)."""
+    from replay import replay_event, sync_event
+    start = time.perf_counter()
+    if _worker_queue is not None:
+        _worker_queue.put((job_id, event_id, 0, None))  # picked up by a worker
+    if period:
+        result = replay_event(event_id, None, None, period, progress=_reporter(job_id, event_id))
+    else:
+        result = sync_event(event_id, from_day, progress=_reporter(job_id, event_id))
+    return event_id, result, time.perf_counter() - start
+
+# --- Bot process ---
+
+def _drain_progress(queue):
+    while True:
+        job_id, event_id, done, total = queue.get()
+        job = _jobs.get(job_id)
+        if job is None:
+            continue
+        if job.status == "queued":
+            job.status = "running"
+        job.progress[event_id] = (done, total if total is not None else job.progress.get(event_id, (0, 0))[1])
+
+def get_executor() -> ProcessPoolExecutor:
+    """The shared worker pool, started on first use with the current database path."""
+    global _executor
+    if _executor is None:
+        ctx = multiprocessing.get_context("spawn")  # the only start method on Windows; same behaviour everywhere
+        queue = ctx.Queue()
+        _executor = ProcessPoolExecutor(
+            MAX_WORKERS, mp_context=ctx, initializer=_init_worker, initargs=(get_db_path(), queue)
+        )
+        threading.Thread(target=_drain_progress, args=(queue,), name="job-progress", daemon=True).start()
+        logging.info(f"🧵 Started rating worker pool ({MAX_WORKERS} processes)")
+    return _executor
+
+def running_job(event_id: int) -> Optional[Job]:
+    return _by_event.get(event_id)
+
+def _submit(event_ids: tuple[int, ...], from_day: Optional[date], period: Optional[str]) -> Job:
+    job = Job(next(_job_ids), event_ids, from_day, period)
+    executor = get_executor()
+    job.futures = [executor.submit(_rebuild, job.id, event_id, from_day, period) for event_id in event_ids]
+    _jobs[job.id] = job
+    for event_id in event_ids:
+        _by_event[event_id] = job
+    with untraced():
+        job.task = asyncio.get_running_loop().create_task(_finish(job))
+    logging.info(f"🧵 Job #{job.id}: rebuilding events {list(event_ids)} (from={from_day}, period={period or 'kill'})")
+    return job
+
+def submit_rebuild(event_id: int, from_day: Optional[date] = None, period: Optional[str] = None) -> tuple[Job, bool]:
+    """
+    Starts a rebuild of the event's ratings (see replay.sync_event / replay_event) and returns
+    (job, True). If the event already has a rebuild running, returns (that job, False) instead:
+    concurrent syncs of one event are coalesced. Must be called from the event loop.
+    """
+    job = _by_event.get(event_id)
+    if job is not None:
+        return job, False
+    return _submit((event_id,), from_day, period), True
+
+def submit_rebuild_all(event_ids: list[int], period: Optional[str] = None) -> Job:
+    """
+    Rebuilds several events from scratch, one worker task per event, and saves all of them in one
+    transaction. Raises RuntimeError if any of the events already has a rebuild running.
+    """
+    busy = sorted({_by_event[e].id for e in event_ids if e in _by_event})
+    if busy:
+        raise RuntimeError(f"events already being rebuilt by job(s) {', '.join(f'#{i}' for i in busy)}")
+    return _submit(tuple(event_ids), None, period)
+
+async def _finish(job: Job) -> dict:
+    from replay import save_replays
+    try:
+        results = {}
+        for event_id, result, seconds in await asyncio.gather(*map(asyncio.wrap_future, job.futures)):
+            results[event_id] = result
+            job.timings[event_id] = seconds
+        job.status = "saving"
+        await asyncio.to_thread(save_replays, {e: r for e, r in results.items() if len(r)}, True)
+        job.results = results
+        job.status = "done"
+        logging.info(
+            f"✅ Job #{job.id}: {sum(r.frags for r in results.values())} frags, "
+            f"{sum(len(r) for r in results.values())} ratings in {job.elapsed:.1f}s"
+        )
+        return results
+    except Exception as e:
+        job.error = e
+        job.status = "failed"
+        for future in job.futures:
+            future.cancel()
+        logging.exception(f"❌ Job #{job.id} failed")
+        raise
+    finally:
+        job.finished = time.perf_counter()
+        _jobs.pop(job.id, None)
+        for event_id in job.event_ids:
+            _by_event.pop(event_id, None)
+
+# --- Rating history compaction ---
+
+_compactor: Optional[asyncio.Task] = None
+
+async def _compact_loop():
+    while True:
+        try:
+            await asyncio.to_thread(compact_rating_history)
+        except Exception:
+            logging.exception("❌ Rating history compaction failed")
+        await asyncio.sleep(COMPACT_INTERVAL)
+
+def start_history_compaction():
+    """Starts compacting rating_history every COMPACT_INTERVAL; safe to call again (on_ready fires on every reconnect)."""
+    global _compactor
+    if _compactor is None or _compactor.done():
+        with untraced():
+            _compactor = asyncio.get_running_loop().create_task(_compact_loop())
+
+# --- Offline (cli.py) ---
+
+def rebuild_events(
+    event_ids: list[int],
+    period: Optional[str] = None,
+    workers: Optional[int] = None,
+    on_event: Optional[Callable[[int, object, float], None]] = None,
+) -> dict[int, float]:
+    """
+    Blocking rebuild of several events for the CLI: replays them in parallel on `workers` processes
+    (default: every core), calls on_event(event_id, result, seconds) as each one finishes and
+    saves all of them in one transaction. Returns replay seconds per event.
+    """
+    from replay import save_replays
+    results, timings = {}, {}
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers or os.cpu_count(), mp_context=ctx, initializer=_init_worker,
+                             initargs=(get_db_path(), None)) as executor:
+        futures = [executor.submit(_rebuild, 0, event_id, None, period) for event_id in event_ids]
+        for future in as_completed(futures):
+            event_id, result, seconds = future.result()
+            results[event_id] = result
+            timings[event_id] = seconds
+            if on_event:
+                on_event(event_id, result, seconds)
+    save_replays({e: r for e, r in results.items() if len(r)}, True)
+    return timings
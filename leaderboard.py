@@ -0,0 +1,438 @@
+# -*- coding: utf-8 -*-
+# leaderboard.py
+#
+# /topmmr standings kept in memory per event. The first request for an event reads its frags once
+# (per character: kills and deaths per day, last active day) and the ratings; after that the board
+# follows the writes that change it (db.add_change_listener): every new frag is applied as it is
+# added, rating edits re-read only the characters they touched, and link changes regroup players.
+# Players stay sorted by their averaged rating, so /topmmr reads the first rows of the order and a
+# player's rank is a binary search; fight counts for any `days` window are sums over prefix counts.
+
+import json
+import logging
+import threading
+import time
+
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timezone
+from typing import Optional, Union
+
+import numpy as np
+
+from db import add_change_listener, get_connection
+from engines import ENGINES
+from replay import date_to_julian
+
+# /topmmr lists players with at least this many fights in the window, and not unbeaten ones
+MIN_FIGHTS = 10
+
+GLICKO_DEFAULT = 1500.0
+
+FETCH_ROWS = 100_000
+
+# Julian day number of a stored timestamp, as replay.py computes it
+_DAY_EXPR = "CAST(julianday(substr(f.timestamp, 1, 10)) AS INTEGER)"
+
+Key = Union[int, str]  # discord_id of a linked player, name of an unlinked character
+
+class _Fights:
+    """One character's kills (wins) and deaths (losses) by day: cumulative counts at each day with fights."""
+
+    __slots__ = ("days", "wins", "losses")
+
+    def __init__(self, days: array, wins: array, losses: array):
+        self.days = days
+        self.wins = wins
+        self.losses = losses
+
+    def add(self, day: int, wins: int, losses: int):
+        i = bisect_right(self.days, day)
+        if i and self.days[i - 1] == day:
+            start = i - 1
+        else:
+            self.days.insert(i, day)
+            self.wins.insert(i, self.wins[i - 1] if i else 0)
+            self.losses.insert(i, self.losses[i - 1] if i else 0)
+            start = i
+        for j in range(start, len(self.days)):  # only the last day, unless a frag arrives out of order
+            self.wins[j] += wins
+            self.losses[j] += losses
+
+    def since(self, day: int) -> tuple[int, int]:
+        """(wins, losses) on `day` and later."""
+        i = bisect_left(self.days, day)
+        if i == len(self.days):
+            return 0, 0
+        if i == 0:
+            return self.wins[-1], self.losses[-1]
+        return self.wins[-1] - self.wins[i - 1], self.losses[-1] - self.losses[i - 1]
+
+    @property
+    def last_day(self) -> int:
+        return self.days[-1]
+
+class EventLeaderboard:
+    """
+    The players of one event (discord users and unlinked characters with frags in it), each with the
+    average rating of all their linked characters (1500 for one never rated), sorted per engine.
+    Mutated only under the module lock; load() runs before the board is shared.
+    """
+
+    def __init__(self, event_id: int):
+        self.event_id = event_id
+        self.loaded = False
+        self.loading = threading.Lock()
+        self.last_frag_id = 0
+        self.names: dict[int, str] = {}                 # character id -> name
+        self.ids: dict[str, int] = {}                   # lowercased name -> character id
+        self.fights: dict[int, _Fights] = {}            # participants only
+        self.owners: dict[str, int] = {}                # character_map: character -> discord_id
+        self.linked: dict[int, list[str]] = {}          # discord_id -> characters, in link order
+        self.entries: dict[Key, tuple[list[str], list[Optional[int]]]] = {}  # key -> (names, ids)
+        self.scores: dict[str, dict[int, float]] = {}   # engine -> character id -> leaderboard value
+        self.order: dict[str, list[tuple]] = {}         # engine -> sorted [(-score, seq, key)]
+        self.position: dict[str, dict[Key, tuple]] = {}
+        self._seq: dict[Key, int] = {}
+        # changes reported by listeners, applied by refresh()
+        self.dirty_owners = False
+        self.dirty_scores: Optional[set] = set()        # lowercased names, None for all
+
+    # --- Loading ---
+
+    def load(self):
+        start = time.perf_counter()
+        with get_connection() as conn:
+            self.last_frag_id = conn.execute(
+                "SELECT COALESCE(MAX(id), 0) FROM frags WHERE event_id = ?", (self.event_id,)
+            ).fetchone()[0]
+            cursor = conn.execute(f"""
+                SELECT f.killer_id, f.victim_id, {_DAY_EXPR} FROM frags f
+                WHERE f.event_id = ? AND f.id <= ?
+            """, (self.event_id, self.last_frag_id))
+            chunks = []
+            while rows := cursor.fetchmany(FETCH_ROWS):  # row tuples cost ~10x the array
+                chunks.append(np.array(rows, dtype=np.int32))
+            for cid, name in conn.execute("SELECT id, name FROM characters"):
+                self.names[cid] = name
+                self.ids[name.lower()] = cid
+        frags = np.concatenate(chunks) if chunks else np.empty((0, 3), dtype=np.int32)
+        if len(frags):
+            self._load_fights(frags)
+        self._load_owners()
+        self._load_scores("glicko")
+        self._regroup()
+        self.loaded = True
+        logging.info(
+            f"🏆 Leaderboard for event {self.event_id}: {len(frags)} frags, {len(self.entries)} players "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+
+    def _load_fights(self, data: np.ndarray):
+        """Per-day counts of every participant from (killer, victim, day) rows, grouped with NumPy."""
+        chars = np.concatenate((data[:, 0], data[:, 1]))
+        days = np.concatenate((data[:, 2], data[:, 2]))
+        won = np.concatenate((np.ones(len(data), dtype=np.int32), np.zeros(len(data), dtype=np.int32)))
+        order = np.lexsort((days, chars))
+        chars, days, won = chars[order], days[order], won[order]
+        starts = np.flatnonzero(np.r_[True, (chars[1:] != chars[:-1]) | (days[1:] != days[:-1])])
+        group_chars = chars[starts]
+        group_days = days[starts].astype(np.int32)
+        wins = np.add.reduceat(won, starts)
+        losses = np.diff(np.r_[starts, len(chars)]) - wins
+        # running totals restart at each character
+        bounds = np.flatnonzero(np.r_[True, group_chars[1:] != group_chars[:-1]]).tolist() + [len(starts)]
+        cum_wins = np.cumsum(wins)
+        cum_losses = np.cumsum(losses)
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            base_w = cum_wins[a - 1] if a else 0
+            base_l = cum_losses[a - 1] if a else 0
+            self.fights[int(group_chars[a])] = _Fights(
+                array("i", group_days[a:b].tobytes()),
+                array("i", (cum_wins[a:b] - base_w).astype(np.int32).tobytes()),
+                array("i", (cum_losses[a:b] - base_l).astype(np.int32).tobytes()),
+            )
+
+    def _load_owners(self):
+        self.owners = {}
+        self.linked = {}
+        with get_connection() as conn:
+            for character, discord_id in conn.execute("SELECT character, discord_id FROM character_map ORDER BY rowid"):
+                self.owners[character] = discord_id
+                self.linked.setdefault(discord_id, []).append(character)
+
+    def _load_scores(self, engine: str, ids: Optional[list[int]] = None):
+        """Reads the engine's leaderboard values of the event (only `ids`, if given)."""
+        if engine == "glicko":
+            table, value = "glicko_ratings", "rating"
+        else:
+            table, value = ENGINES[engine].table, ENGINES[engine].score_sql
+        query = f"SELECT character_id, {value} FROM {table} WHERE event_id = ?"
+        params: tuple = (self.event_id,)
+        if ids is not None:
+            query += " AND character_id IN (SELECT value FROM json_each(?))"
+            params += (json.dumps(ids),)
+        with get_connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+        if ids is None:
+            self.scores[engine] = dict(rows)
+        else:
+            scores = self.scores[engine]
+            for cid in ids:
+                scores.pop(cid, None)
+            scores.update(rows)
+
+    # --- Players ---
+
+    def _key(self, cid: int) -> Key:
+        name = self.names[cid]
+        return self.owners.get(name, name)
+
+    def _entry(self, key: Key) -> tuple[list[str], list[Optional[int]]]:
+        names = self.linked.get(key, []) if isinstance(key, int) else [key]
+        return names, [self.ids.get(name.lower()) for name in names]
+
+    def _score(self, engine: str, key: Key) -> float:
+        """Average rating of the key's characters, as /topmmr always computed it."""
+        scores = self.scores[engine]
+        _, ids = self.entries[key]
+        if engine == "glicko":
+            values = [scores.get(cid, GLICKO_DEFAULT) for cid in ids]
+        else:
+            values = [scores[cid] for cid in ids if cid in scores]
+        if not values:
+            return GLICKO_DEFAULT if engine == "glicko" else ENGINES[engine].score(ENGINES[engine].defaults)
+        return round(sum(values) / len(values))
+
+    def _regroup(self):
+        """Rebuilds the players from the participants and character_map, then every loaded order."""
+        self.entries = {}
+        for cid in self.fights:
+            key = self._key(cid)
+            if key not in self.entries:
+                self.entries[key] = self._entry(key)
+                self._seq.setdefault(key, len(self._seq))
+        for engine in self.scores:
+            self._sort(engine)
+
+    def _sort(self, engine: str):
+        rows = sorted((-self._score(engine, key), self._seq[key], key) for key in self.entries)
+        self.order[engine] = rows
+        self.position[engine] = {row[2]: row for row in rows}
+
+    def _place(self, key: Key):
+        """Moves the key to its current score in every loaded order."""
+        for engine in self.scores:
+            order, position = self.order[engine], self.position[engine]
+            old = position.pop(key, None)
+            if old is not None:
+                del order[bisect_left(order, old)]
+            if key in self.entries:
+                row = (-self._score(engine, key), self._seq[key], key)
+                insort(order, row)
+                position[key] = row
+
+    def _keys_of(self, ids) -> set:
+        """Players whose average includes any of the characters."""
+        keys = set()
+        for cid in ids:
+            name = self.names.get(cid)
+            if name is None:
+                continue
+            key = self.owners.get(name, name)
+            if key in self.entries:
+                keys.add(key)
+        return keys
+
+    # --- Updates ---
+
+    def catch_up(self) -> bool:
+        """
+        Applies the event's frags added since the board was read or last caught up. Returns False if
+        frags were deleted (the board no longer matches the DB and must be rebuilt).
+        """
+        with get_connection() as conn:
+            latest = conn.execute(
+                "SELECT COALESCE(MAX(id), 0) FROM frags WHERE event_id = ?", (self.event_id,)
+            ).fetchone()[0]
+            if latest < self.last_frag_id:
+                return False
+            if latest == self.last_frag_id:
+                return True
+            rows = conn.execute(f"""
+                SELECT f.id, f.killer_id, f.victim_id, {_DAY_EXPR}, k.name, v.name
+                FROM frags f
+                JOIN characters k ON k.id = f.killer_id
+                JOIN characters v ON v.id = f.victim_id
+                WHERE f.event_id = ? AND f.id > ? AND f.id <= ?
+                ORDER BY f.id
+            """, (self.event_id, self.last_frag_id, latest)).fetchall()
+        touched = set()
+        for _, killer_id, victim_id, day, killer, victim in rows:
+            for cid, name, wins, losses in ((killer_id, killer, 1, 0), (victim_id, victim, 0, 1)):
+                touched.add(cid)
+                fights = self.fights.get(cid)
+                if fights is not None:
+                    fights.add(day, wins, losses)
+                    continue
+                # a new participant: a player of their own, or a character of a listed player
+                # that may have had no id when the player's entry was made
+                self.names[cid] = name
+                self.ids[name.lower()] = cid
+                self.fights[cid] = _Fights(array("i", [day]), array("i", [wins]), array("i", [losses]))
+                key = self._key(cid)
+                self.entries[key] = self._entry(key)
+                self._seq.setdefault(key, len(self._seq))
+        self.last_frag_id = latest
+        for engine in self.scores:
+            self._load_scores(engine, sorted(touched))
+        for key in self._keys_of(touched):
+            self._place(key)
+        return True
+
+    def refresh(self) -> bool:
+        """Applies changes reported since the last call; False if the board must be rebuilt."""
+        if not self.catch_up():
+            return False
+        if self.dirty_owners:
+            self.dirty_owners = False
+            self._load_owners()
+            self._regroup()
+        if self.dirty_scores is None:
+            for engine in self.scores:
+                self._load_scores(engine)
+                self._sort(engine)
+        elif self.dirty_scores:
+            ids = sorted(self._resolve(self.dirty_scores))
+            for engine in self.scores:
+                self._load_scores(engine, ids)
+            for key in self._keys_of(ids):
+                self._place(key)
+        self.dirty_scores = set()
+        return True
+
+    def _resolve(self, names: set) -> list[int]:
+        """Ids of the (lowercased) names, reading characters created since the board learnt of them."""
+        missing = [name for name in names if name not in self.ids]
+        if missing:
+            with get_connection() as conn:
+                rows = conn.execute(
+                    "SELECT id, name FROM characters WHERE name IN (SELECT value FROM json_each(?))",
+                    (json.dumps(missing),)
+                ).fetchall()
+            for cid, name in rows:
+                self.names[cid] = name
+                self.ids[name.lower()] = cid
+                # a linked character rated before its first frag now counts in its player's average
+                key = self._key(cid)
+                if key in self.entries:
+                    self.entries[key] = self._entry(key)
+        return [self.ids[name] for name in names if name in self.ids]
+
+    def ratings_changed(self, characters: Optional[list[str]]):
+        if characters is None or self.dirty_scores is None:
+            self.dirty_scores = None
+        else:
+            self.dirty_scores.update(name.lower() for name in characters)
+
+    # --- Queries ---
+
+    def top(self, engine: str, since_day: int, today: int, count: int) -> list[tuple]:
+        """
+        The best `count` players with at least MIN_FIGHTS fights on or after since_day (Julian day)
+        and at least one loss, plus any further players tied on the last one's score, so the caller
+        can order ties by wins and name. Rows: (key, characters, score, fights, wins, losses, days idle).
+        """
+        if engine not in self.scores:
+            self._load_scores(engine)
+            self._sort(engine)
+        rows = []
+        boundary = None
+        for neg_score, _, key in self.order[engine]:
+            if boundary is not None and neg_score != boundary:
+                break
+            names, ids = self.entries[key]
+            wins = losses = 0
+            last_day = None
+            for cid in ids:
+                fights = self.fights.get(cid)
+                if fights is None:
+                    continue
+                w, l = fights.since(since_day)
+                wins += w
+                losses += l
+                last_day = fights.last_day if last_day is None else max(last_day, fights.last_day)
+            if wins + losses < MIN_FIGHTS or (wins > 0 and losses == 0):
+                continue
+            rows.append((key, list(names), -neg_score, wins + losses, wins, losses,
+                         today - last_day if last_day is not None else 999))
+            if len(rows) == count:
+                boundary = neg_score
+        return rows
+
+    def rank(self, engine: str, key: Key) -> Optional[int]:
+        """1-based position of the player by score among all the event's players, or None."""
+        if engine not in self.scores:
+            self._load_scores(engine)
+            self._sort(engine)
+        row = self.position[engine].get(key)
+        return bisect_left(self.order[engine], row) + 1 if row is not None else None
+
+# --- Registry ---
+
+_boards: dict[int, EventLeaderboard] = {}
+_lock = threading.Lock()
+
+def _board(event_id: int) -> EventLeaderboard:
+    """The event's up-to-date board, loaded on first use. Blocks: call it from a thread."""
+    for _ in range(2):
+        with _lock:
+            board = _boards.get(event_id)
+            if board is None:
+                board = _boards[event_id] = EventLeaderboard(event_id)
+        with board.loading:  # one load per event; concurrent callers wait for it
+            if not board.loaded:
+                board.load()
+        with _lock:
+            if board.refresh():
+                return board
+            logging.info(f"🏆 Frags of event {event_id} were removed; reloading its leaderboard")
+            if _boards.get(event_id) is board:
+                del _boards[event_id]
+    return board
+
+def top_players(event_id: int, since: datetime, count: int, engine: str = "glicko") -> list[tuple]:
+    """
+    /topmmr rows of the event (see EventLeaderboard.top), counting fights on since's date and later.
+    Sort them by (-score, -wins, display name) and keep `count`.
+    """
+    board = _board(event_id)
+    today = date_to_julian(datetime.now(timezone.utc).date())
+    with _lock:
+        return board.top(engine, date_to_julian(since.date()), today, count)
+
+def player_rank(event_id: int, key: Key, engine: str = "glicko") -> Optional[int]:
+    board = _board(event_id)
+    with _lock:
+        return board.rank(engine, key)
+
+def _on_change(kind: str, event_id: Optional[int] = None, characters: Optional[list[str]] = None):
+    with _lock:
+        if kind == "event":
+            # frags replaced or the DB swapped: rebuild on next use
+            if event_id is None:
+                _boards.clear()
+            else:
+                _boards.pop(event_id, None)
+            return
+        boards = list(_boards.values()) if event_id is None else [b for b in (_boards.get(event_id),) if b]
+        for board in boards:
+            if kind == "owners":
+                board.dirty_owners = True
+            elif kind == "ratings":
+                board.ratings_changed(characters)
+            elif kind == "frag" and board.loaded:
+                if not board.catch_up():
+                    _boards.pop(board.event_id, None)
+
+add_change_listener(_on_change)
@@ -4,6 +4,7 @@
 import os
 import sys
 import logging
+import multiprocessing
 import re
 import discord
 import discord.opus
@@ -15,73 +16,98 @@ from settings import *
 from db import *
 from commands import *
 from announcer import *
+from utils import InstrumentedCommandTree, install_command_tracing
+from jobs import start_history_compaction
+from cache import display_cache
+from autocomplete import member_changed, user_changed
+
+# Startup side effects (logging, opus, DB init, token) live in functions called under
+# `if __name__ == "__main__"`: rating worker processes (jobs.py) are spawned, and a spawned
+# process re-imports this file as __mp_main__, which must not start a second bot.
 
 # --- Logging ---
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s | %(levelname).1s | %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-    handlers=[
-        logging.FileHandler("bot.log", encoding="utf-8"),
-        logging.StreamHandler()
-    ]
-)
+def setup_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname).1s | %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+        handlers=[
+            logging.FileHandler("bot.log", encoding="utf-8"),
+            logging.StreamHandler()
+        ]
+    )
+
+    # Slow statements from the SQL profiler (/dbstats) go to their own file as well
+    slow_query_handler = logging.FileHandler("slow_queries.log", encoding="utf-8")
+    slow_query_handler.setFormatter(logging.Formatter("%(asctime)s | %(message)s", "%Y-%m-%d %H:%M:%S"))
+    logging.getLogger("slow_queries").addHandler(slow_query_handler)
+
+    # Per-command SQL/REST counts as JSON lines, for spotting N+1 regressions
+    trace_handler = logging.FileHandler("command_traces.jsonl", encoding="utf-8")
+    trace_handler.setFormatter(logging.Formatter("%(message)s"))
+    logging.getLogger("command_traces").addHandler(trace_handler)
 
 # --- Opus ---
 
-if not discord.opus.is_loaded():
-    dll_path = os.path.join(os.path.dirname(__file__), "opus.dll")
-    discord.opus.load_opus(dll_path)
-if discord.opus.is_loaded():
-    logging.info("🎧 Opus successfully loaded.")
-else:
-    logging.error("❌ Opus failed to load.")
+def load_opus():
+    if not discord.opus.is_loaded():
+        dll_path = os.path.join(os.path.dirname(__file__), "opus.dll")
+        discord.opus.load_opus(dll_path)
+    if discord.opus.is_loaded():
+        logging.info("🎧 Opus successfully loaded.")
+    else:
+        logging.error("❌ Opus failed to load.")
 
 # --- Bot Init ---
 
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True  # required for member info
-bot = commands.Bot(command_prefix=">", intents=intents)
+bot = commands.Bot(command_prefix=">", intents=intents, tree_cls=InstrumentedCommandTree)
+install_command_tracing(bot)  # count SQL/REST calls per slash command
 setup_commands(bot)  # register slash commands
 
 # --- Paths & Init ---
 
-set_db_path(get_db_file_path())
+def init_storage():
+    set_db_path(get_db_file_path())
 
-sounds_path = get_sounds_path()
-set_sounds_path(sounds_path)
-if not os.path.exists(sounds_path):
-    os.makedirs(sounds_path)
-    logging.warning(f"⚠️ Created missing 'sounds' directory at: {sounds_path}")
-else:
-    logging.info(f"✅ 'sounds' directory found: {sounds_path}")
+    sounds_path = get_sounds_path()
+    set_sounds_path(sounds_path)
+    if not os.path.exists(sounds_path):
+        os.makedirs(sounds_path)
+        logging.warning(f"⚠️ Created missing 'sounds' directory at: {sounds_path}")
+    else:
+        logging.info(f"✅ 'sounds' directory found: {sounds_path}")
 
-init_db()
-init_rank_roles_table()
-init_mmr_roles_table()
-clear_deathless_streaks()
-ensure_default_event() 
+    init_db()
+    init_rank_roles_table()
+    init_mmr_roles_table()
+    clear_deathless_streaks()
+    ensure_default_event()
+    load_profiler_settings()
 
 # --- Token ---
 
-env_path = get_env_path()
-if not os.path.exists(env_path):
-    logging.error(f"❌ .env file not found at {env_path}")
-    sys.exit("❌ .env file not found")
-else:
-    load_dotenv(dotenv_path=env_path)
-TOKEN = os.getenv("DISCORD_TOKEN")
-if not TOKEN:
-    logging.error("❌ DISCORD_TOKEN is missing from .env")
-    sys.exit("❌ Token missing.")
+def load_token() -> str:
+    env_path = get_env_path()
+    if not os.path.exists(env_path):
+        logging.error(f"❌ .env file not found at {env_path}")
+        sys.exit("❌ .env file not found")
+    else:
+        load_dotenv(dotenv_path=env_path)
+    token = os.getenv("DISCORD_TOKEN")
+    if not token:
+        logging.error("❌ DISCORD_TOKEN is missing from .env")
+        sys.exit("❌ Token missing.")
+    return token
 
 # --- Killstreaks: store per-event to avoid mixing series across events ---
 
 # key: (event_id, character) -> {"count": int, "last_kill_time": datetime}
 killstreaks: dict = {}
-KILLSTREAK_TIMEOUT = int(get_setting("killstreak_timeout") or 15)
+KILLSTREAK_TIMEOUT = 15  # seconds; the killstreak_timeout setting is read at startup
 
 # --- Duplicate kill filter (mod bug protection) ---
 # key: (event_id, killer, victim) -> last_seen_time (datetime)
@@ -95,6 +121,37 @@ async def on_ready():
         logging.info(f"🌐 Synced {len(synced)} commands.")
     except Exception as e:
         logging.error(f"❌ Failed to sync commands: {e}")
+    start_history_compaction()
+
+# --- Member changes: display cache (utils.resolve_display_data) and @user autocomplete ---
+
+@bot.event
+async def on_member_update(before: discord.Member, after: discord.Member):
+    display_cache.invalidate_member(after.guild.id, after.id)
+    member_changed(before, after)
+
+@bot.event
+async def on_member_join(member: discord.Member):
+    display_cache.invalidate_member(member.guild.id, member.id)
+    member_changed(None, member)
+
+@bot.event
+async def on_member_remove(member: discord.Member):
+    display_cache.invalidate_member(member.guild.id, member.id)
+    member_changed(member, None)
+
+@bot.event
+async def on_user_update(before: discord.User, after: discord.User):
+    display_cache.invalidate_user(after.id)
+    user_changed(before, after)
+
+@bot.event
+async def on_guild_role_update(before: discord.Role, after: discord.Role):
+    display_cache.invalidate_guild(after.guild.id)
+
+@bot.event
+async def on_guild_role_delete(role: discord.Role):
+    display_cache.invalidate_guild(role.guild.id)
 
 def _call_announcer(func, *args, event_id=None, **kwargs):
     """
@@ -190,7 +247,7 @@ async def on_message(message: discord.Message):
         # announce killstreaks
         if killstreaks[ks_key_killer]["count"] >= 2:
             try:
-                await _call_announcer(send_killstreak_announcement, bot, killer, killstreaks[ks_key_killer]["count"], event_id=event_id)
+                await _call_announcer(send_killstreak_announcement, bot, killer, killstreaks[ks_key_killer]["count"], event_id=event_id, victim=victim)
             except Exception as e:
                     logging.exception(f"❌ Killstreak announcement failed: {e}")
 
@@ -300,4 +357,10 @@ async def on_message(message: discord.Message):
 
 # --- Run bot ---
 
-bot.run(TOKEN)
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # frozen Windows build: let spawned workers run their task instead of the bot
+    setup_logging()
+    load_opus()
+    init_storage()
+    KILLSTREAK_TIMEOUT = int(get_setting("killstreak_timeout") or 15)
+    bot.run(load_token())
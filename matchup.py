@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+# matchup.py
+#
+# Win predictions from the stored Glicko-2 ratings (the glicko_ratings table, RD decayed to today).
+# A roster entry is a character name (str) or a Discord user id (int); a user is rated as the
+# average rating and RD of their linked characters, as get_user_glicko_mmr() does.
+
+from typing import Optional, Union
+
+import numpy as np
+
+from db import get_default_event_id, get_glicko_ratings_bulk, get_user_characters_bulk
+from glicko2 import BASE_RATING, BASE_RD, Q, SCALE, expected_score
+
+Entry = Union[str, int]
+
+def roster_ratings(entries: list[Entry], event_id: Optional[int] = None) -> tuple[np.ndarray, np.ndarray]:
+    """(ratings, rds) aligned with entries, from two queries however long the roster is."""
+    if event_id is None:
+        event_id = get_default_event_id()
+    users = get_user_characters_bulk([e for e in entries if isinstance(e, int)])
+    names = {e.lower() for e in entries if isinstance(e, str)}
+    names.update(c for chars in users.values() for c in chars)
+    stored = get_glicko_ratings_bulk(sorted(names), event_id) if names else {}
+
+    ratings = np.full(len(entries), BASE_RATING)
+    rds = np.full(len(entries), BASE_RD)
+    for i, entry in enumerate(entries):
+        chars = users[entry] if isinstance(entry, int) else [entry.lower()]
+        if chars:
+            ratings[i] = sum(stored[c][0] for c in chars) / len(chars)
+            rds[i] = sum(stored[c][1] for c in chars) / len(chars)
+    return ratings, rds
+
+def win_probability(a: Entry, b: Entry, event_id: Optional[int] = None) -> float:
+    """Probability that a beats b in the event."""
+    ratings, rds = roster_ratings([a, b], event_id)
+    return expected_score(ratings[0], rds[0], ratings[1], rds[1])
+
+def matchup_matrix(ratings: np.ndarray, rds: np.ndarray) -> np.ndarray:
+    """P[i, j] = probability that i beats j, for all pairs at once (expected_score, vectorized)."""
+    mu = (ratings - 1500) / SCALE
+    phi2 = (rds / SCALE) ** 2
+    g = 1 / np.sqrt(1 + Q * (phi2[:, None] + phi2[None, :]))
+    return 1 / (1 + np.exp(-g * (mu[:, None] - mu[None, :])))
+
+def seeding(matrix: np.ndarray) -> np.ndarray:
+    """Roster indices by expected win rate against the rest of the field, strongest first."""
+    n = len(matrix)
+    if n < 2:
+        return np.arange(n)
+    field = (matrix.sum(axis=1) - 0.5) / (n - 1)  # drop the diagonal (0.5 against oneself)
+    return np.argsort(-field, kind="stable")
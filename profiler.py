@@ -0,0 +1,515 @@
+# -*- coding: utf-8 -*-
+# profiler.py
+
+import json
+import logging
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Optional
+
+# Statements slower than the threshold are written here (main.py routes it to slow_queries.log)
+slow_log = logging.getLogger("slow_queries")
+
+# One JSON line per traced slash command (main.py routes it to command_traces.jsonl)
+trace_log = logging.getLogger("command_traces")
+trace_log.propagate = False
+
+PROGRESS_INTERVAL = 1000  # SQLite VM instructions between progress callbacks
+
+# Per-command budgets: more SQL statements / Discord REST calls than this is flagged,
+# as is any single statement shape repeated more than REPEAT_LIMIT times (an N+1 loop)
+SQL_BUDGET = 25
+HTTP_BUDGET = 5
+REPEAT_LIMIT = 10
+
+# Bulk admin commands that legitimately go over the default budgets
+COMMAND_BUDGETS = {
+    "mmrsync": {"sql_budget": None, "repeat_limit": None},
+    "mmrsyncall": {"sql_budget": None, "repeat_limit": None},
+    "roleupdate": {"sql_budget": None, "http_budget": None, "repeat_limit": None},
+    "mmrroleupdate": {"sql_budget": None, "http_budget": None, "repeat_limit": None},
+}
+
+_WS_RE = re.compile(r"\s+")
+_STR_RE = re.compile(r"'(?:[^']|'')*'")
+_NUM_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_RE = re.compile(r"\bIN \(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+
+@lru_cache(maxsize=2048)
+def normalize_sql(sql: str) -> str:
+    """
+    Reduces a statement to its shape: whitespace squeezed, literals replaced by '?'
+    and IN-lists of any length folded to 'IN (...)'.
+    """
+    text = _WS_RE.sub(" ", sql).strip()
+    text = _STR_RE.sub("?", text)
+    text = _NUM_RE.sub("?", text)
+    return _IN_RE.sub("IN (...)", text)
+
+def _caller() -> str:
+    """Returns 'module.function' of the first frame outside this module."""
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_globals.get("__name__") == __name__:
+        frame = frame.f_back
+    if frame is None:
+        return "?"
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_name}"
+
+class StatementStats:
+    __slots__ = ("sql", "calls", "total", "max", "steps", "callers")
+
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.steps = 0
+        self.callers: dict[str, int] = {}
+
+    @property
+    def top_caller(self) -> str:
+        return max(self.callers, key=self.callers.__getitem__) if self.callers else "?"
+
+class CommandTrace:
+    """
+    SQL statements and Discord REST calls made while handling one slash command.
+    A budget of None disables that check.
+    """
+
+    def __init__(
+        self,
+        command: str,
+        sql_budget: Optional[int] = SQL_BUDGET,
+        http_budget: Optional[int] = HTTP_BUDGET,
+        repeat_limit: Optional[int] = REPEAT_LIMIT,
+    ):
+        self.command = command
+        self.sql_budget = sql_budget
+        self.http_budget = http_budget
+        self.repeat_limit = repeat_limit
+        self.started = time.time()
+        self.elapsed_ms: Optional[float] = None
+        self.error: Optional[str] = None
+        self.sql_calls = 0
+        self.sql_ms = 0.0
+        self.http_calls = 0
+        self.http_ms = 0.0
+        self.shapes: Counter = Counter()
+        self.routes: Counter = Counter()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()  # asyncio.to_thread() workers share the trace
+
+    # Work still running after finish() (a task spawned by the command that outlived it) is not counted
+
+    def add_sql(self, key: str, elapsed_ms: float, count_call: bool = True):
+        with self._lock:
+            if self.elapsed_ms is not None:
+                return
+            if count_call:
+                self.sql_calls += 1
+                self.shapes[key] += 1
+            self.sql_ms += elapsed_ms
+
+    def add_http(self, route: str, elapsed_ms: float):
+        with self._lock:
+            if self.elapsed_ms is not None:
+                return
+            self.http_calls += 1
+            self.http_ms += elapsed_ms
+            self.routes[route] += 1
+
+    def finish(self, error: Optional[BaseException] = None):
+        with self._lock:
+            if self.elapsed_ms is None:
+                self.elapsed_ms = (time.perf_counter() - self._start) * 1000
+                if error is not None:
+                    self.error = type(error).__name__
+
+    @property
+    def repeated(self) -> dict[str, int]:
+        if self.repeat_limit is None:
+            return {}
+        return {sql: n for sql, n in self.shapes.most_common() if n > self.repeat_limit}
+
+    @property
+    def flags(self) -> list[str]:
+        flags = []
+        if self.sql_budget is not None and self.sql_calls > self.sql_budget:
+            flags.append(f"sql {self.sql_calls} > {self.sql_budget}")
+        if self.http_budget is not None and self.http_calls > self.http_budget:
+            flags.append(f"http {self.http_calls} > {self.http_budget}")
+        for sql, n in self.repeated.items():
+            flags.append(f"{n}x {sql[:120]}")
+        return flags
+
+    def to_dict(self) -> dict:
+        return {
+            "command": self.command,
+            "started": self.started,
+            "elapsed_ms": round(self.elapsed_ms or 0.0, 2),
+            "error": self.error,
+            "sql_calls": self.sql_calls,
+            "sql_ms": round(self.sql_ms, 2),
+            "http_calls": self.http_calls,
+            "http_ms": round(self.http_ms, 2),
+            "repeated": self.repeated,
+            "routes": dict(self.routes),
+            "flags": self.flags,
+        }
+
+_current_trace: ContextVar[Optional[CommandTrace]] = ContextVar("command_trace", default=None)
+
+# Last finished traces, newest last (shown by /dbstats)
+recent_traces: deque = deque(maxlen=100)
+
+def current_trace() -> Optional[CommandTrace]:
+    return _current_trace.get()
+
+def _new_trace(command: str, budgets: dict) -> CommandTrace:
+    return CommandTrace(command, **{**COMMAND_BUDGETS.get(command, {}), **budgets})
+
+def start_trace(command: str, **budgets) -> CommandTrace:
+    """
+    Starts a trace in the current context. Everything awaited from here on
+    (and asyncio.to_thread() workers, which copy the context) reports into it.
+    """
+    trace = _new_trace(command, budgets)
+    _current_trace.set(trace)
+    return trace
+
+def finish_trace(trace: CommandTrace, error: Optional[BaseException] = None):
+    """Closes the trace, keeps it for /dbstats and exports it as one JSON line."""
+    if trace.elapsed_ms is not None:
+        return
+    trace.finish(error)
+    recent_traces.append(trace)
+    trace_log.info(json.dumps(trace.to_dict(), ensure_ascii=False))
+    if trace.flags:
+        logging.warning(f"🐌 /{trace.command}: {'; '.join(trace.flags)}")
+
+@contextmanager
+def command_trace(command: str, **budgets):
+    """
+    Traces a block outside Discord, e.g. in a regression check:
+
+        with command_trace("top") as trace:
+            build_leaderboard(...)
+        assert not trace.flags, trace.to_dict()
+    """
+    trace = _new_trace(command, budgets)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    except BaseException as e:
+        trace.finish(e)
+        raise
+    finally:
+        _current_trace.reset(token)
+        trace.finish()
+
+@contextmanager
+def untraced():
+    """
+    Runs the block outside the current trace. Tasks created in it copy the context without the
+    trace, so background work started by a command (audio loops, rebuild jobs) is not billed to it:
+
+        with untraced():
+            asyncio.create_task(audio_queue_worker(bot, guild))
+    """
+    token = _current_trace.set(None)
+    try:
+        yield
+    finally:
+        _current_trace.reset(token)
+
+def record_http(route: str, elapsed: float):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_http(route, elapsed * 1000)
+
+def export_traces(path: str):
+    """Writes the recent traces as a JSON list."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([t.to_dict() for t in recent_traces], f, ensure_ascii=False, indent=2)
+
+class SQLProfiler:
+    """
+    Aggregates per-statement timings for connections opened through connect().
+    Disabled by default; sample_rate < 1 profiles only that share of connections,
+    the rest are plain sqlite3 connections with no overhead. Connections opened
+    while a command trace is active and not profiled are TracedConnections, which
+    only count and time statements into the trace.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.sample_rate = 1.0
+        self.slow_ms = 250.0
+        self.trace_commands = True
+        self.since = time.time()
+        self._stats: dict[str, StatementStats] = {}
+        self._lock = threading.Lock()
+
+    def configure(
+        self,
+        enabled: Optional[bool] = None,
+        sample_rate: Optional[float] = None,
+        slow_ms: Optional[float] = None,
+        trace_commands: Optional[bool] = None,
+    ):
+        if enabled is not None:
+            self.enabled = bool(enabled)
+        if sample_rate is not None:
+            self.sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+        if slow_ms is not None:
+            self.slow_ms = max(float(slow_ms), 0.0)
+        if trace_commands is not None:
+            self.trace_commands = bool(trace_commands)
+        logging.info(
+            f"🩺 SQL profiler: enabled={self.enabled} sample={self.sample_rate:.2f} "
+            f"slow_ms={self.slow_ms:.0f} trace_commands={self.trace_commands}"
+        )
+
+    def connect(self, path: str, **kwargs) -> sqlite3.Connection:
+        if self.enabled and (self.sample_rate >= 1.0 or random.random() < self.sample_rate):
+            return sqlite3.connect(path, factory=ProfiledConnection, **kwargs)
+        if _current_trace.get() is not None:
+            return sqlite3.connect(path, factory=TracedConnection, **kwargs)
+        return sqlite3.connect(path, **kwargs)
+
+    def record(self, sql: str, elapsed: float, steps: int, caller: str, count_call: bool = True) -> float:
+        """
+        Adds one execution (or, with count_call=False, the fetch time of the last one).
+        Returns the elapsed time in milliseconds.
+        """
+        key = normalize_sql(sql)
+        elapsed_ms = elapsed * 1000
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_sql(key, elapsed_ms, count_call)
+        if not self.enabled:
+            return elapsed_ms
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = StatementStats(key)
+            if count_call:
+                stats.calls += 1
+                stats.callers[caller] = stats.callers.get(caller, 0) + 1
+            stats.total += elapsed_ms
+            stats.steps += steps
+        return elapsed_ms
+
+    def observe_max(self, sql: str, call_ms: float, caller: str):
+        """Updates the max for a finished call and writes it to the slow log if needed."""
+        if not self.enabled:
+            return
+        key = normalize_sql(sql)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is not None and call_ms > stats.max:
+                stats.max = call_ms
+        if self.slow_ms and call_ms >= self.slow_ms:
+            slow_log.warning(f"🐢 {call_ms:.1f} ms | {caller} | {key}")
+
+    def top(self, n: int = 10, sort: str = "total") -> list[StatementStats]:
+        keys = {
+            "total": lambda s: s.total,
+            "max": lambda s: s.max,
+            "calls": lambda s: s.calls,
+            "avg": lambda s: s.total / s.calls if s.calls else 0.0,
+            "steps": lambda s: s.steps,
+        }
+        with self._lock:
+            items = list(self._stats.values())
+        return sorted(items, key=keys.get(sort, keys["total"]), reverse=True)[:n]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+        self.since = time.time()
+
+sql_profiler = SQLProfiler()
+
+class ProfiledCursor(sqlite3.Cursor):
+    """
+    Cursor that times execute() plus the fetch calls and iteration that follow it. A statement's
+    max (and its slow-log line) is reported once, with the execute and fetch time summed, when
+    it is done: at the next execute, when its rows run out, or when the cursor is closed or dropped.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._sql: Optional[str] = None
+        self._caller = "?"
+        self._call_ms = 0.0
+        self._pending = False  # a statement whose max is not reported yet
+
+    def _done(self):
+        if self._pending:
+            self._pending = False
+            sql_profiler.observe_max(self._sql, self._call_ms, self._caller)
+
+    def _run(self, method, sql, parameters):
+        self._done()
+        conn = self.connection
+        self._sql = sql
+        self._caller = _caller()
+        conn._steps = 0
+        conn._busy = True
+        start = time.perf_counter()
+        try:
+            return method(sql, parameters)
+        finally:
+            conn._busy = False
+            self._call_ms = sql_profiler.record(sql, time.perf_counter() - start, conn._steps, self._caller)
+            self._pending = True
+            if self.description is None:  # no rows to fetch
+                self._done()
+
+    def _fetch(self, method, *args):
+        if self._sql is None:
+            return method(*args)
+        conn = self.connection
+        conn._steps = 0
+        start = time.perf_counter()
+        rows = None
+        try:
+            rows = method(*args)
+            return rows
+        finally:
+            fetch_ms = sql_profiler.record(self._sql, time.perf_counter() - start, conn._steps, self._caller, count_call=False)
+            self._call_ms += fetch_ms
+            # fetchall() reads everything; fetchone() returns None and fetchmany() a short list at the end
+            if method.__name__ == "fetchall" or not rows or (method.__name__ == "fetchmany" and len(rows) < args[0]):
+                self._done()
+
+    def execute(self, sql, parameters=()):
+        return self._run(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(super().executemany, sql, seq_of_parameters)
+
+    def fetchone(self):
+        return self._fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._fetch(super().fetchall)
+
+    def __next__(self):
+        # `for row in conn.execute(...)` reads through here, not through fetch*()
+        row = self._fetch(super().fetchone)
+        if row is None:
+            raise StopIteration
+        return row
+
+    def close(self):
+        self._done()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._done()
+        except Exception:
+            pass
+
+class ProfiledConnection(sqlite3.Connection):
+    """
+    Connection with a trace callback (catches statements that bypass ProfiledCursor,
+    such as executescript) and a progress handler counting VM steps per statement.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._steps = 0
+        self._busy = False
+        self.set_trace_callback(self._on_trace)
+        self.set_progress_handler(self._on_progress, PROGRESS_INTERVAL)
+
+    def _on_trace(self, statement: str):
+        if not self._busy:
+            sql_profiler.record(statement, 0.0, 0, _caller())
+
+    def _on_progress(self) -> int:
+        self._steps += PROGRESS_INTERVAL
+        return 0
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        if not self.in_transaction:
+            return super().commit()
+        self._busy = True
+        start = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            self._busy = False
+            caller = _caller()
+            elapsed_ms = sql_profiler.record("COMMIT", time.perf_counter() - start, 0, caller)
+            sql_profiler.observe_max("COMMIT", elapsed_ms, caller)
+
+    def __exit__(self, exc_type, exc, tb):
+        # The C-level __exit__ commits without calling commit(): route `with get_connection() as conn:`
+        # through the timed one (same semantics: commit on success, rollback on error or failed commit)
+        if exc_type is not None:
+            self.rollback()
+            return False
+        try:
+            self.commit()
+        except BaseException:
+            self.rollback()
+            raise
+        return False
+
+class TracedCursor(sqlite3.Cursor):
+    """
+    Cursor of a TracedConnection: times execute() into the command trace, nothing else
+    (no VM step counting, caller lookup, fetch timing or profiler statistics).
+    """
+
+    def _run(self, method, sql, parameters):
+        start = time.perf_counter()
+        try:
+            return method(sql, parameters)
+        finally:
+            trace = _current_trace.get()
+            if trace is not None:
+                trace.add_sql(normalize_sql(sql), (time.perf_counter() - start) * 1000)
+
+    def execute(self, sql, parameters=()):
+        return self._run(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(super().executemany, sql, seq_of_parameters)
+
+class TracedConnection(sqlite3.Connection):
+    """Connection opened during a command trace while the profiler is off or did not sample it."""
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
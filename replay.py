@@ -0,0 +1,594 @@
+# -*- coding: utf-8 -*-
+# replay.py
+
+import logging
+import math
+import time
+
+from datetime import date, datetime, timezone
+from typing import Callable, Optional
+
+import numpy as np
+
+from db import HISTORY_PERIOD, _rate_kill, get_connection, notify_change
+from engines import ENGINES, RatingEngine
+from glicko2 import BASE_RATING, BASE_RD, BASE_VOL, DECAY_C, MAX_RD, SCALE, TAU, rate_1v1, rate_game
+
+# Same model as the live bot (glicko2.rate_1v1): one rating period per kill, daily RD decay for idle players.
+# Idle decay is lazy: a player's RD is brought forward only when they fight again, and the
+# saved RD is as of their last fight (db.effective_rd() adds the days since on read)
+
+# Rating-period mode (proper Glicko-2): games are buffered per period and every player is
+# rated once per period against all of that period's opponents, including the volatility step
+VOL_EPSILON = 1e-6
+PERIODS = {"hour": 3600, "day": 86400}
+SESSION_GAP = 2 * 3600  # "session" periods end after this many seconds without a kill
+
+# Per-kill syncs snapshot every player once per this many days (at the last day with kills in each block)
+CHECKPOINT_DAYS = 7
+
+# Day numbers are whole Julian days of the timestamp's calendar date (the date part as stored)
+_DAY_EXPR = "CAST(julianday(substr(f.timestamp, 1, 10)) AS INTEGER)"
+# Unix seconds (UTC) for hour/day/session periods
+_SECONDS_EXPR = "CAST(ROUND((julianday(f.timestamp) - 2440587.5) * 86400) AS INTEGER)"
+
+# progress(done, total), in days (per-kill) or rating periods
+ProgressCallback = Callable[[int, int], None]
+
+class ReplayResult:
+    """
+    Final ratings after a replay. Arrays are aligned with character_ids; rd is as of each player's last fight.
+    A sync also carries the checkpoints it took and its rating history (one row per player per day
+    with kills), written by save_replay() together with the ratings: every checkpoint and history
+    row after restart_day is replaced (all of them if restart_day is None). A sync also carries the
+    other rating engines (engines.ENGINES), rebuilt from every frag and saved to their own tables;
+    their state is aligned with engine_ids (character_ids when None). last_frag_id is the newest
+    frag the replay read: frags the live bot rated meanwhile are rated again on top of it when saved.
+    """
+
+    __slots__ = ("character_ids", "rating", "rd", "vol", "first_day", "last_day", "frags", "checkpoints", "restart_day",
+                 "history", "engines", "engine_ids", "last_frag_id")
+
+    def __init__(self, character_ids, rating, rd, vol, first_day, last_day, frags, checkpoints=None, restart_day=None,
+                 history=None, engines=None, engine_ids=None, last_frag_id=None):
+        self.character_ids = character_ids
+        self.rating = rating
+        self.rd = rd
+        self.vol = vol
+        self.first_day = first_day
+        self.last_day = last_day
+        self.frags = frags
+        self.checkpoints = checkpoints
+        self.restart_day = restart_day
+        self.history = history
+        self.engines: Optional[list[RatingEngine]] = engines
+        self.engine_ids = engine_ids
+        self.last_frag_id: Optional[int] = last_frag_id
+
+    def __len__(self):
+        return len(self.character_ids)
+
+    def as_dict(self) -> dict[int, tuple[float, float, float]]:
+        return {
+            int(cid): (float(r), float(d), float(v))
+            for cid, r, d, v in zip(self.character_ids, self.rating, self.rd, self.vol)
+        }
+
+# Julian day 1721425 (truncated) is 0001-01-01 in the proleptic Gregorian calendar
+def julian_to_date(day: int) -> date:
+    return date.fromordinal(int(day) - 1721424)
+
+def date_to_julian(d: date) -> int:
+    return d.toordinal() + 1721424
+
+def last_frag_id(event_id: int) -> int:
+    """Id of the event's newest frag (0 if none). Frag ids only grow, so later frags have higher ids."""
+    with get_connection() as conn:
+        return conn.execute("SELECT COALESCE(MAX(id), 0) FROM frags WHERE event_id = ?", (event_id,)).fetchone()[0]
+
+def load_frags(
+    event_id: int, since=None, until_id: Optional[int] = None
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Returns (killer_ids, victim_ids, days, seconds) of the event's frags in replay order
+    (timestamp, then insertion order). `since` is compared with the stored timestamp as given;
+    until_id leaves out the frags added after that one.
+    """
+    query = f"""
+        SELECT f.killer_id, f.victim_id, {_DAY_EXPR}, {_SECONDS_EXPR}
+        FROM frags f
+        WHERE f.event_id = ? {"AND f.timestamp >= ?" if since is not None else ""}
+            {"AND f.id <= ?" if until_id is not None else ""}
+        ORDER BY f.timestamp ASC, f.id ASC
+    """
+    params = (event_id, *((since,) if since is not None else ()), *((until_id,) if until_id is not None else ()))
+    with get_connection() as conn:
+        rows = conn.execute(query, params).fetchall()
+    if not rows:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, empty
+    data = np.array(rows, dtype=np.int64)
+    return data[:, 0], data[:, 1], data[:, 2], data[:, 3]
+
+def _groups(keys: np.ndarray) -> int:
+    """Number of distinct values in a sorted array (days or periods with kills)."""
+    return int(np.count_nonzero(np.diff(keys))) + 1 if len(keys) else 0
+
+def decay(rd: np.ndarray, players: np.ndarray, periods):
+    """
+    Applies `periods` (scalar or per player) idle days of Player.pre_rating_period() to rd[players]
+    in place, in closed form: repeated min(sqrt(rd² + c²), cap) is min(sqrt(rd² + k·c²), cap).
+    """
+    periods = np.broadcast_to(periods, players.shape)
+    idle = periods > 0
+    players, periods = players[idle], periods[idle]
+    rd[players] = np.minimum(np.sqrt(rd[players] ** 2 + periods * DECAY_C ** 2), MAX_RD)
+
+def _apply_day(rating, rd, vol, players: np.ndarray, k_idx: np.ndarray, v_idx: np.ndarray):
+    """
+    Replays one day's kills in order. k_idx/v_idx index into `players`, the day's participants,
+    so the cost is O(kills that day) however many players the event has. Kills are inherently
+    sequential (each one rates against the opponent's latest values), so they run on plain
+    lists: element access on NumPy arrays costs more than the math itself.
+    """
+    r = rating[players].tolist()
+    d = rd[players].tolist()
+    vl = vol[players].tolist()
+    for k, v in zip(k_idx.tolist(), v_idx.tolist()):
+        if k != v:
+            r[k], d[k], r[v], d[v] = rate_1v1(r[k], d[k], vl[k], r[v], d[v], vl[v])
+        else:
+            # a self-kill rates one player twice in a row, as /mmrsync's Player objects always did
+            r[k], d[k] = rate_game(r[k], d[k], vl[k], r[k], d[k], 1.0)
+            r[k], d[k] = rate_game(r[k], d[k], vl[k], r[k], d[k], 0.0)
+    rating[players] = r
+    rd[players] = d
+
+def replay(
+    killers: np.ndarray,
+    victims: np.ndarray,
+    days: np.ndarray,
+    rating: np.ndarray,
+    rd: np.ndarray,
+    vol: np.ndarray,
+    last: Optional[np.ndarray] = None,
+    on_day_end: Optional[Callable[[int, np.ndarray, Optional[int]], None]] = None,
+    engines: tuple[RatingEngine, ...] = (),
+):
+    """
+    Replays kills (dense player indices, sorted by day) into the rating arrays in place,
+    with the same semantics as the day-by-day Player loop in /mmrsync: every kill is a rating
+    period for both players, and every full day a player sits out adds one RD decay step.
+    The decay is applied when the player fights again, so idle players are never touched.
+
+    last[i] is the day of player i's last fight (-1 = not seen yet); it is updated in place.
+    To resume from a checkpoint, pass the checkpoint's values.
+    engines (started with len(rating) players) get each day's kills right after Glicko-2, so every
+    system is computed in this one pass over the frags.
+    on_day_end(day, last, next_day) is called after each day with kills.
+    """
+    if len(killers) == 0:
+        return
+    if last is None:
+        last = np.full(len(rating), -1, dtype=np.int64)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(days)) + 1))
+    ends = np.append(starts[1:], len(days))
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        day = int(days[start])
+        k = killers[start:end]
+        v = victims[start:end]
+        players, local = np.unique(np.concatenate((k, v)), return_inverse=True)
+        local = local.reshape(-1)
+        returning = players[last[players] >= 0]
+        decay(rd, returning, day - last[returning] - 1)
+        k_local, v_local = local[:len(k)], local[len(k):]
+        _apply_day(rating, rd, vol, players, k_local, v_local)
+        last[players] = day
+        for engine in engines:
+            engine.rate_day(players, k_local, v_local)
+        if on_day_end is not None:
+            on_day_end(day, last, int(days[end]) if end < len(days) else None)
+
+def replay_engines(event_id: int, until_id: Optional[int] = None) -> tuple[np.ndarray, list[RatingEngine]]:
+    """
+    Every engine in engines.ENGINES rebuilt from all of the event's frags (up to until_id), without
+    Glicko-2. They keep no checkpoints, so a sync resumed from a Glicko-2 checkpoint rebuilds them
+    with this. Returns (character_ids, engines), the engines' state aligned with character_ids.
+    """
+    killer_ids, victim_ids, days, _ = load_frags(event_id, until_id=until_id)
+    character_ids, dense = np.unique(np.concatenate((killer_ids, victim_ids)), return_inverse=True)
+    dense = dense.reshape(-1)
+    engines = [engine() for engine in ENGINES.values()]
+    for engine in engines:
+        engine.start(len(character_ids))
+    killers, victims = dense[:len(killer_ids)], dense[len(killer_ids):]
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(days)) + 1)) if len(days) else np.empty(0, dtype=np.int64)
+    ends = np.append(starts[1:], len(days))
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        k = killers[start:end]
+        players, local = np.unique(np.concatenate((k, victims[start:end])), return_inverse=True)
+        local = local.reshape(-1)
+        for engine in engines:
+            engine.rate_day(players, local[:len(k)], local[len(k):])
+    return character_ids, engines
+
+# --- Rating periods ---
+
+def period_numbers(seconds: np.ndarray, period: str) -> np.ndarray:
+    """Maps kill times to non-decreasing period numbers; gaps between numbers are idle periods."""
+    if period == "session":
+        return np.concatenate(([0], np.cumsum(np.diff(seconds) > SESSION_GAP)))
+    if period not in PERIODS:
+        raise ValueError(f"Unknown rating period: {period} (expected {', '.join([*PERIODS, 'session'])})")
+    return seconds // PERIODS[period]
+
+def _volatility(sigma, phi, v, delta, tau: float = TAU, eps: float = VOL_EPSILON) -> np.ndarray:
+    """Glicko-2 step 5: new volatility by the Illinois algorithm, solved for all players at once."""
+    a = np.log(sigma ** 2)
+    d2 = delta ** 2
+    p2 = phi ** 2
+
+    def f(x, idx=slice(None)):
+        ex = np.exp(x)
+        return ex * (d2[idx] - p2[idx] - v[idx] - ex) / (2 * (p2[idx] + v[idx] + ex) ** 2) - (x - a[idx]) / tau ** 2
+
+    A = a.copy()
+    B = np.empty_like(a)
+    big = d2 > p2 + v
+    B[big] = np.log(d2[big] - p2[big] - v[big])
+    small = np.flatnonzero(~big)
+    k = np.ones(len(small))
+    while len(small):
+        pending = f(a[small] - k * tau, small) < 0
+        if not pending.any():
+            break
+        k[pending] += 1
+    B[small] = a[small] - k * tau
+
+    fA = f(A)
+    fB = f(B)
+    active = np.abs(B - A) > eps
+    while active.any():
+        i = np.flatnonzero(active)
+        C = A[i] + (A[i] - B[i]) * fA[i] / (fB[i] - fA[i])
+        fC = f(C, i)
+        swap = fC * fB[i] <= 0
+        A[i] = np.where(swap, B[i], A[i])
+        fA[i] = np.where(swap, fB[i], fA[i] / 2)
+        B[i] = C
+        fB[i] = fC
+        active[i] = np.abs(B[i] - A[i]) > eps
+    return np.exp(A / 2)
+
+def _idle(rd, vol, players, periods):
+    """Glicko-2 step 6 for `periods` periods without games, in closed form: φ² + k·σ², capped at MAX_RD."""
+    rd[players] = np.minimum(np.sqrt(rd[players] ** 2 + periods * (vol[players] * SCALE) ** 2), MAX_RD)
+
+def rate_periods(
+    killers: np.ndarray,
+    victims: np.ndarray,
+    periods: np.ndarray,
+    rating: np.ndarray,
+    rd: np.ndarray,
+    vol: np.ndarray,
+    progress: Optional[ProgressCallback] = None,
+):
+    """
+    Replays kills (dense player indices, sorted by period) with one full Glicko-2 update per player
+    per period, every player rated from the values at the start of the period. Idle periods are
+    applied lazily when a player returns, so each period costs O(games in it); the final RDs are as
+    of each player's last period.
+    """
+    if len(killers) == 0:
+        return
+    last = np.full(len(rating), -1, dtype=np.int64)  # last rated period, -1 = not seen yet
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(periods)) + 1))
+    ends = np.append(starts[1:], len(periods))
+    for done, (start, end) in enumerate(zip(starts.tolist(), ends.tolist()), 1):
+        p = int(periods[start])
+        k = killers[start:end]
+        v = victims[start:end]
+        # each kill is a game for both sides: (player, opponent, score)
+        side = np.concatenate((k, v))
+        opp = np.concatenate((v, k))
+        score = np.concatenate((np.ones(len(k)), np.zeros(len(v))))
+        players, inv = np.unique(side, return_inverse=True)
+        inv = inv.reshape(-1)
+        opp_inv = np.searchsorted(players, opp)
+
+        returning = players[last[players] >= 0]
+        _idle(rd, vol, returning, p - last[returning] - 1)
+
+        mu = (rating[players] - 1500) / SCALE
+        phi = rd[players] / SCALE
+        sigma = vol[players]
+        g = 1 / np.sqrt(1 + 3 * (phi[opp_inv] ** 2) / (math.pi ** 2))
+        e = 1 / (1 + np.exp(-g * (mu[inv] - mu[opp_inv])))
+        v_ = 1 / np.bincount(inv, (g ** 2) * e * (1 - e), len(players))
+        score_sum = np.bincount(inv, g * (score - e), len(players))
+
+        sigma_new = _volatility(sigma, phi, v_, v_ * score_sum)
+        phi_star = np.sqrt(phi ** 2 + sigma_new ** 2)
+        phi_new = 1 / np.sqrt(1 / phi_star ** 2 + 1 / v_)
+        rating[players] = SCALE * (mu + phi_new ** 2 * score_sum) + 1500
+        rd[players] = SCALE * phi_new
+        vol[players] = sigma_new
+        last[players] = p
+        if progress is not None:
+            progress(done, len(starts))
+
+def replay_event(
+    event_id: int,
+    since=None,
+    initial: Optional[dict[int, tuple[float, float, float]]] = None,
+    period: Optional[str] = None,
+    progress: Optional[ProgressCallback] = None,
+) -> ReplayResult:
+    """
+    Rebuilds the event's ratings from its frags (optionally only those at or after `since`).
+    Players start from `initial[character_id]` when given, otherwise from the Glicko-2 defaults.
+    period=None replays kill by kill like the live bot; 'hour', 'day' or 'session' uses rating periods.
+    Only reads the database.
+    """
+    start = time.perf_counter()
+    last_id = last_frag_id(event_id)
+    killer_ids, victim_ids, days, seconds = load_frags(event_id, since, last_id)
+    character_ids, dense = np.unique(np.concatenate((killer_ids, victim_ids)), return_inverse=True)
+    dense = dense.reshape(-1)
+    n = len(character_ids)
+
+    rating = np.full(n, BASE_RATING)
+    rd = np.full(n, BASE_RD)
+    vol = np.full(n, BASE_VOL)
+    if initial:
+        for i, cid in enumerate(character_ids.tolist()):
+            if cid in initial:
+                rating[i], rd[i], vol[i] = initial[cid]
+
+    killers, victims = dense[:len(killer_ids)], dense[len(killer_ids):]
+    if period is None:
+        total = _groups(days)
+        done = 0
+
+        def on_day_end(*_):
+            nonlocal done
+            done += 1
+            progress(done, total)
+
+        replay(killers, victims, days, rating, rd, vol, on_day_end=on_day_end if progress is not None else None)
+    else:
+        rate_periods(killers, victims, period_numbers(seconds, period), rating, rd, vol, progress)
+
+    result = ReplayResult(
+        character_ids, rating, rd, vol,
+        julian_to_date(days[0]) if len(days) else None,
+        julian_to_date(days[-1]) if len(days) else None,
+        len(killer_ids),
+        last_frag_id=last_id,
+    )
+    logging.info(
+        f"⚙️ Replayed {result.frags} frags for {n} players (event {event_id}, period={period or 'kill'}) "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+    return result
+
+def load_event_ratings(event_id: int) -> dict[int, tuple[float, float, float]]:
+    """Current (rating, rd, vol) per character id for the event."""
+    with get_connection() as conn:
+        rows = conn.execute(
+            "SELECT character_id, rating, rd, vol FROM glicko_ratings WHERE event_id = ?", (event_id,)
+        ).fetchall()
+    return {cid: (r, d, v) for cid, r, d, v in rows}
+
+def _save(conn, event_id: int, result: ReplayResult, clear: bool):
+    if clear:
+        conn.execute("DELETE FROM glicko_ratings WHERE event_id = ?", (event_id,))
+    if result.checkpoints is not None:
+        _write_checkpoints(conn, event_id, result.checkpoints, result.restart_day)
+    if result.history is not None:
+        _write_history(conn, event_id, result.history, result.restart_day)
+    for engine in result.engines or ():
+        engine.save(conn, event_id, result.character_ids if result.engine_ids is None else result.engine_ids, clear)
+    # as of the replayed frags: the newer ones are rated below and move it themselves
+    last_active = dict(conn.execute("""
+        SELECT character_id, MAX(ts) FROM (
+            SELECT killer_id AS character_id, MAX(timestamp) AS ts FROM frags
+            WHERE event_id = :e AND (:last IS NULL OR id <= :last) GROUP BY killer_id
+            UNION ALL
+            SELECT victim_id, MAX(timestamp) FROM frags
+            WHERE event_id = :e AND (:last IS NULL OR id <= :last) GROUP BY victim_id
+        ) GROUP BY character_id
+    """, {"e": event_id, "last": result.last_frag_id}).fetchall())
+    conn.executemany("""
+        INSERT INTO glicko_ratings (character_id, rating, rd, vol, last_activity, event_id)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(character_id, event_id) DO UPDATE SET
+            rating = excluded.rating,
+            rd = excluded.rd,
+            vol = excluded.vol,
+            last_activity = excluded.last_activity
+    """, (
+        (cid, r, d, v, last_active.get(cid), event_id)
+        for cid, r, d, v in zip(
+            result.character_ids.tolist(), result.rating.tolist(), result.rd.tolist(), result.vol.tolist()
+        )
+    ))
+    if result.last_frag_id is not None:
+        # frags that arrived while the replay ran: the live bot rated them on the ratings just
+        # replaced, so they are rated again on the replayed ones, in arrival order, as add_frag() does
+        for killer_id, victim_id, timestamp in conn.execute(
+            "SELECT killer_id, victim_id, timestamp FROM frags WHERE event_id = ? AND id > ? ORDER BY id",
+            (event_id, result.last_frag_id)
+        ).fetchall():
+            _rate_kill(conn, killer_id, victim_id, event_id, datetime.fromisoformat(timestamp))
+
+def save_replay(event_id: int, result: ReplayResult, clear: bool = False):
+    """
+    Writes the replayed ratings (and a sync's checkpoints) in one transaction. last_activity is each
+    player's latest frag in the event, as get_last_active_iso() reports it. With clear=True the
+    event's ratings are replaced.
+    """
+    save_replays({event_id: result}, clear)
+
+def save_replays(results: dict[int, ReplayResult], clear: bool = False):
+    """save_replay() for several events in a single transaction: all of them are written or none."""
+    with get_connection() as conn:
+        # take the write lock first: no live frag can land between reading the newer frags and the commit
+        conn.execute("BEGIN IMMEDIATE")
+        for event_id, result in results.items():
+            _save(conn, event_id, result, clear)
+        conn.commit()
+    for event_id in results:
+        notify_change("ratings", event_id)
+
+# --- Checkpoints ---
+
+def latest_checkpoint(event_id: int, before_day: Optional[int] = None) -> Optional[int]:
+    """Day of the newest checkpoint (strictly before before_day, if given), or None."""
+    with get_connection() as conn:
+        if before_day is None:
+            row = conn.execute("SELECT MAX(day) FROM glicko_checkpoints WHERE event_id = ?", (event_id,)).fetchone()
+        else:
+            row = conn.execute(
+                "SELECT MAX(day) FROM glicko_checkpoints WHERE event_id = ? AND day < ?", (event_id, before_day)
+            ).fetchone()
+    return row[0]
+
+def load_checkpoint(event_id: int, day: int) -> dict[int, tuple[float, float, float, int]]:
+    """character_id -> (rating, rd, vol, last_day) at the checkpoint; rd is as of last_day."""
+    with get_connection() as conn:
+        rows = conn.execute(
+            "SELECT character_id, rating, rd, vol, last_day FROM glicko_checkpoints WHERE event_id = ? AND day = ?",
+            (event_id, day)
+        ).fetchall()
+    return {cid: (r, d, v, last) for cid, r, d, v, last in rows}
+
+def clear_checkpoints(event_id: int, after_day: Optional[int] = None):
+    """Drops the event's checkpoints (only those after after_day, if given); call when past frags change."""
+    with get_connection() as conn:
+        if after_day is None:
+            conn.execute("DELETE FROM glicko_checkpoints WHERE event_id = ?", (event_id,))
+        else:
+            conn.execute("DELETE FROM glicko_checkpoints WHERE event_id = ? AND day > ?", (event_id, after_day))
+        conn.commit()
+
+def _write_checkpoints(conn, event_id: int, checkpoints: list, restart_day: Optional[int]):
+    if restart_day is None:
+        conn.execute("DELETE FROM glicko_checkpoints WHERE event_id = ?", (event_id,))
+    else:
+        conn.execute("DELETE FROM glicko_checkpoints WHERE event_id = ? AND day > ?", (event_id, restart_day))
+    for day, ids, r, d, v, last in checkpoints:
+        conn.executemany(
+            """
+            INSERT INTO glicko_checkpoints (event_id, day, character_id, rating, rd, vol, last_day)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            ((event_id, day, *row) for row in zip(ids.tolist(), r.tolist(), d.tolist(), v.tolist(), last.tolist()))
+        )
+
+# --- Rating history ---
+
+def _day_period(day: int) -> int:
+    """rating_history period in which the Julian day starts."""
+    return (day - date_to_julian(date(1970, 1, 1))) * 86400 // HISTORY_PERIOD
+
+def _write_history(conn, event_id: int, history: list, restart_day: Optional[int]):
+    if restart_day is None:
+        conn.execute("DELETE FROM rating_history WHERE event_id = ?", (event_id,))
+    else:
+        conn.execute("DELETE FROM rating_history WHERE event_id = ? AND period >= ?", (event_id, _day_period(restart_day + 1)))
+    if not history:
+        return
+    # insert in key order (character, period): appends to each player's run of the index instead of
+    # touching every player's page once per day
+    periods = np.concatenate([np.full(len(ids), period) for period, ids, *_ in history])
+    ids, r, d, v = (np.concatenate([h[i] for h in history]) for i in range(1, 5))
+    order = np.lexsort((periods, ids))
+    conn.executemany(
+        "INSERT OR REPLACE INTO rating_history (event_id, character_id, period, rating, rd, vol) VALUES (?, ?, ?, ?, ?, ?)",
+        ((event_id, *row) for row in zip(ids[order].tolist(), periods[order].tolist(), r[order].tolist(),
+                                          d[order].tolist(), v[order].tolist()))
+    )
+
+def sync_event(event_id: int, from_day: Optional[date] = None, progress: Optional[ProgressCallback] = None) -> ReplayResult:
+    """
+    Per-kill rebuild of the event's ratings that gives the same result as a full replay.
+    With from_day, the state is restored from the newest checkpoint before that day and only
+    the frags after the checkpoint are replayed; without it (or with no usable checkpoint)
+    everything is replayed. Checkpoints after the restart point are retaken, but only for
+    completed UTC days, since frags can still arrive for today.
+    Every day with kills also yields a rating_history row for each player who fought that day,
+    in the period of the day's last kill (so the live rows of a day are replaced by one).
+    A sync from scratch also rebuilds every engine in engines.ENGINES in the same pass; one from a
+    checkpoint rebuilds them in a separate pass over every frag (replay_engines), as they have no
+    checkpoints of their own.
+    Only reads the database: save_replay() stores the ratings, checkpoints, history and engines.
+    """
+    start = time.perf_counter()
+    cp_day = latest_checkpoint(event_id, date_to_julian(from_day)) if from_day else None
+    snapshot = load_checkpoint(event_id, cp_day) if cp_day is not None else {}
+    since = julian_to_date(cp_day + 1).isoformat() if cp_day is not None else None
+
+    last_id = last_frag_id(event_id)
+    killer_ids, victim_ids, days, seconds = load_frags(event_id, since, last_id)
+    snap_ids = np.fromiter(snapshot.keys(), dtype=np.int64, count=len(snapshot))
+    character_ids, dense = np.unique(np.concatenate((snap_ids, killer_ids, victim_ids)), return_inverse=True)
+    dense = dense.reshape(-1)
+    n = len(character_ids)
+
+    rating = np.full(n, BASE_RATING)
+    rd = np.full(n, BASE_RD)
+    vol = np.full(n, BASE_VOL)
+    last_fight = np.full(n, -1, dtype=np.int64)
+    snap_idx = dense[:len(snap_ids)]
+    if len(snap_ids):
+        values = np.array(list(snapshot.values()))
+        rating[snap_idx], rd[snap_idx], vol[snap_idx] = values[:, 0], values[:, 1], values[:, 2]
+        last_fight[snap_idx] = values[:, 3]
+
+    today = date_to_julian(datetime.now(timezone.utc).date())
+    checkpoints = []
+    history = []
+    day_ends = np.flatnonzero(np.diff(days, append=days[-1:] + 1))  # last kill of each day
+    last_period = dict(zip(days[day_ends].tolist(), (seconds[day_ends] // HISTORY_PERIOD).tolist()))
+    total = _groups(days)
+    done = 0
+
+    def on_day_end(day: int, last_now: np.ndarray, next_day: Optional[int]):
+        nonlocal done
+        done += 1
+        if progress is not None:
+            progress(done, total)
+        fought = np.flatnonzero(last_now == day)
+        history.append((last_period[day], character_ids[fought], rating[fought], rd[fought], vol[fought]))
+        last_in_block = next_day is None or next_day // CHECKPOINT_DAYS != day // CHECKPOINT_DAYS
+        if last_in_block and day < today:
+            idx = np.flatnonzero(last_now >= 0)
+            checkpoints.append((day, character_ids[idx], rating[idx], rd[idx], vol[idx], last_now[idx]))
+
+    engines = [engine() for engine in ENGINES.values()] if cp_day is None else []
+    for engine in engines:
+        engine.start(n)
+
+    offset = len(snap_ids)
+    killers = dense[offset:offset + len(killer_ids)]
+    victims = dense[offset + len(killer_ids):]
+    replay(killers, victims, days, rating, rd, vol, last=last_fight, on_day_end=on_day_end, engines=tuple(engines))
+    engine_ids = None
+    if cp_day is not None:
+        engine_ids, engines = replay_engines(event_id, last_id)
+
+    first = cp_day + 1 if cp_day is not None else (int(days[0]) if len(days) else None)
+    last = int(days[-1]) if len(days) else cp_day
+    result = ReplayResult(
+        character_ids, rating, rd, vol,
+        julian_to_date(first) if first is not None else None,
+        julian_to_date(last) if last is not None else None,
+        len(killer_ids),
+        checkpoints, cp_day, history, engines, engine_ids, last_id,
+    )
+    logging.info(
+        f"⚙️ Synced event {event_id} from {f'checkpoint {julian_to_date(cp_day)}' if cp_day is not None else 'scratch'}: "
+        f"{result.frags} frags, {n} players, {len(checkpoints)} checkpoints in {time.perf_counter() - start:.2f}s"
+    )
+    return result
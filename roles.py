@@ -4,7 +4,6 @@
 
 import discord
 import logging
-import sqlite3
 from datetime import datetime, timedelta, timezone
 from db import *
 from typing import Optional
@@ -19,13 +18,16 @@ def get_wins_for_user(discord_id: int, days: int = 7) -> int:
         return 0
     since = datetime.now(timezone.utc) - timedelta(days=days)
     wins = 0
-    with sqlite3.connect(get_db_path()) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         for character in characters:
+            char_id = get_character_id(character)
+            if char_id is None:
+                continue
             c.execute("""
                 SELECT COUNT(*) FROM frags
-                WHERE killer = ? AND timestamp >= ?
-            """, (character.lower(), since))
+                WHERE killer_id = ? AND timestamp >= ?
+            """, (char_id, since))
             row = c.fetchone()
             if row:
                 wins += row[0]
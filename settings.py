@@ -6,6 +6,8 @@ import sys
 
 BOT_VERSION = "8.1.1"
 BACKUP_DIR = 'db_backups'
+EXPORT_DIR = 'exports'
+CHART_CACHE_DIR = 'chart_cache'
 
 def get_base_dir():
     return os.path.dirname(os.path.abspath(sys.argv[0]))
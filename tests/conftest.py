@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# tests/conftest.py
+
+import os
+import random
+import sys
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+
+def pytest_addoption(parser):
+    parser.addoption("--run-slow", action="store_true", help="also run the tests marked slow (full-size replays)")
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: full-size test, skipped unless --run-slow is given")
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--run-slow"):
+        return
+    skip = pytest.mark.skip(reason="slow: run with --run-slow")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip)
+
+@pytest.fixture
+def bot_db(tmp_path):
+    """A fresh bot database with the schema and the default event, as main.init_storage() leaves it."""
+    db.set_db_path(str(tmp_path / "bot.db"))
+    db.init_db()
+    db.init_rank_roles_table()
+    db.init_mmr_roles_table()
+    db.ensure_default_event()
+    yield db
+    db._character_ids.clear()
+
+PLAYERS = ["alice", "bob", "carol", "dave", "erin", "frank", "grace", "heidi"]
+SECOND_EVENT_CHANNEL = 4242
+
+@pytest.fixture
+def fragged_db(bot_db):
+    """
+    bot_db with a seeded random frag set spread over the last 30 days in the default event and a
+    second one ("duels"), a few manual adjustments (one on a character without kills) and links.
+    Returns (default event_id, second event_id, frags as (killer, victim, timestamp, event_id)).
+    """
+    rng = random.Random(29)
+    default_id = db.get_default_event_id()
+    duels_id = db.create_event("duels")
+    with db.get_connection() as conn:
+        conn.execute(
+            "INSERT INTO event_channels (event_id, channel_id, channel_type) VALUES (?, ?, 'track')",
+            (duels_id, SECOND_EVENT_CHANNEL)
+        )
+    for _ in range(120):
+        killer, victim = rng.sample(PLAYERS, 2)
+        db.add_frag(killer, victim, SECOND_EVENT_CHANNEL if rng.random() < 0.3 else None)
+
+    now = datetime.now(timezone.utc)
+    with db.get_connection() as conn:
+        ids = [frag_id for (frag_id,) in conn.execute("SELECT id FROM frags ORDER BY id")]
+        conn.executemany(
+            "UPDATE frags SET timestamp = ? WHERE id = ?",
+            [((now - timedelta(days=30 * (1 - i / len(ids)), minutes=rng.randrange(60))).isoformat(), frag_id)
+             for i, frag_id in enumerate(ids)]
+        )
+        frags = conn.execute("""
+            SELECT k.name, v.name, f.timestamp, f.event_id
+            FROM frags f JOIN characters k ON k.id = f.killer_id JOIN characters v ON v.id = f.victim_id
+            ORDER BY f.id
+        """).fetchall()
+
+    db.adjust_wins("alice", 3, "bonus")
+    db.adjust_wins("bob", -1, "penalty")
+    db.adjust_wins("ivan", 5, "no kills yet")
+    db.adjust_wins("carol", 2, "duel bonus", event_id=duels_id)
+    db.link_character("alice", 1001)
+    db.link_character("bob", 1001)
+    db.link_character("carol", 1002)
+    db.link_character("ivan", 1003)
+    return default_id, duels_id, frags
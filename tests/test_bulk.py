@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# tests/test_bulk.py
+#
+# Every bulk lookup must return, for each requested name, exactly what its scalar helper returns.
+
+from collections import Counter
+from datetime import datetime, time, timedelta, timezone
+
+import pytest
+
+from conftest import PLAYERS
+from db import (
+    get_character_owner, get_character_owners_bulk, get_fight_stats, get_fight_stats_bulk,
+    get_glicko_rating_extended, get_glicko_ratings_bulk, get_last_active_bulk, get_last_active_iso,
+    get_opponent_stats_bulk, get_user_characters, get_user_characters_bulk, get_win_sources,
+    get_win_sources_bulk
+)
+
+# Known characters, one without kills, mixed case, a duplicate and unknown names
+NAMES = PLAYERS + ["ivan", "Alice", "BOB", "alice", "nobody", "Zed"]
+
+@pytest.fixture(params=[0, 1], ids=["default", "duels"])
+def event_id(request, fragged_db):
+    return fragged_db[request.param]
+
+@pytest.mark.parametrize("days", [1, 7, 60])
+def test_fight_stats(event_id, days):
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    bulk = get_fight_stats_bulk(NAMES, since, event_id)
+    assert bulk == {name: get_fight_stats(name, since, event_id) for name in NAMES}
+
+@pytest.mark.parametrize("decay", [True, False])
+def test_glicko_ratings(event_id, decay):
+    bulk = get_glicko_ratings_bulk(NAMES, event_id, decay=decay)
+    assert bulk == {name: get_glicko_rating_extended(name, event_id, decay=decay) for name in NAMES}
+
+def test_win_sources(fragged_db, event_id):
+    bulk = get_win_sources_bulk(NAMES, event_id)
+    assert bulk == {name: get_win_sources(name, event_id) for name in NAMES}
+    if event_id == fragged_db[0]:
+        assert bulk["ivan"] == (5, 0)  # adjusted, never killed anyone
+
+def test_last_active(event_id):
+    bulk = get_last_active_bulk(NAMES, event_id)
+    assert bulk == {name: get_last_active_iso(name, event_id) for name in NAMES}
+
+def test_owners(fragged_db):
+    bulk = get_character_owners_bulk(NAMES)
+    assert bulk == {name: get_character_owner(name) for name in NAMES}
+
+def test_user_characters(fragged_db):
+    discord_ids = [1001, 1002, 1003, 9999]
+    bulk = get_user_characters_bulk(discord_ids)
+    assert {k: sorted(v) for k, v in bulk.items()} == {k: sorted(get_user_characters(k)) for k in discord_ids}
+
+@pytest.mark.parametrize("characters", [["alice"], ["alice", "Bob", "nobody"], PLAYERS])
+@pytest.mark.parametrize("scoped", [True, False])
+def test_opponent_stats(fragged_db, characters, scoped):
+    # No scalar helper: the reference is the per-frag count the old /stats loop did in Python
+    default_id, _, frags = fragged_db
+    event_id = default_id if scoped else None
+    # at midnight, where the stored 'T'-separated timestamps and the bound datetime compare the same way
+    since = datetime.combine(datetime.now(timezone.utc).date() - timedelta(days=7), time(), timezone.utc)
+    own = {name.lower() for name in characters}
+    wins, losses = Counter(), Counter()
+    for killer, victim, timestamp, frag_event in frags:
+        if timestamp < since.isoformat() or (event_id is not None and frag_event != event_id):
+            continue
+        if killer in own:
+            wins[victim] += 1
+        if victim in own:
+            losses[killer] += 1
+    expected = {name: (wins[name], losses[name]) for name in wins | losses}
+    assert get_opponent_stats_bulk(characters, since, event_id) == expected
+
+def test_empty_lists(fragged_db):
+    default_id, _, _ = fragged_db
+    since = datetime.now(timezone.utc) - timedelta(days=7)
+    assert get_fight_stats_bulk([], since, default_id) == {}
+    assert get_glicko_ratings_bulk([], default_id) == {}
+    assert get_win_sources_bulk([], default_id) == {}
+    assert get_last_active_bulk([], default_id) == {}
+    assert get_opponent_stats_bulk([], since, default_id) == {}
+    assert get_character_owners_bulk([]) == {}
+    assert get_user_characters_bulk([]) == {}
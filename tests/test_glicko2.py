@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+# tests/test_glicko2.py
+#
+# Rating periods (replay.rate_periods) against the worked example in Glickman's "Example of the
+# Glicko-2 system" (tau = 0.5) and against the per-kill kernels of glicko2.py.
+
+import numpy as np
+import pytest
+
+from glicko2 import BASE_VOL, SCALE, TAU, rate_1v1, rate_game
+from replay import _volatility, rate_periods
+
+def test_paper_volatility():
+    # Step 5 from the paper's intermediate values: phi = 200 / 173.7178, v = 1.7785, delta = -0.4834
+    sigma = _volatility(np.array([0.06]), np.array([200 / SCALE]), np.array([1.7785]), np.array([-0.4834]), TAU)
+    assert sigma[0] == pytest.approx(0.05999, abs=1e-5)
+
+def test_paper_example():
+    # Player 1500/200 beats 1400/30, loses to 1550/100 and to 1700/300, all in one rating period
+    rating = np.array([1500.0, 1400.0, 1550.0, 1700.0])
+    rd = np.array([200.0, 30.0, 100.0, 300.0])
+    vol = np.full(4, 0.06)
+    killers = np.array([0, 2, 3])
+    victims = np.array([1, 0, 0])
+
+    rate_periods(killers, victims, np.zeros(3, dtype=np.int64), rating, rd, vol)
+
+    assert rating[0] == pytest.approx(1464.06, abs=0.01)
+    assert rd[0] == pytest.approx(151.52, abs=0.01)
+    assert vol[0] == pytest.approx(0.05999, abs=1e-5)
+
+@pytest.mark.parametrize("winner, loser", [
+    ((1500.0, 350.0), (1500.0, 350.0)),
+    ((1600.0, 80.0), (1450.0, 200.0)),
+    ((1300.0, 120.0), (1750.0, 60.0)),
+])
+def test_one_kill_period_matches_rate_1v1(winner, loser):
+    rating = np.array([winner[0], loser[0]])
+    rd = np.array([winner[1], loser[1]])
+    vol = np.full(2, BASE_VOL)
+
+    rate_periods(np.array([0]), np.array([1]), np.zeros(1, dtype=np.int64), rating, rd, vol)
+
+    # rate_1v1 keeps the volatility: a single game moves it by well under 1e-4
+    assert vol == pytest.approx(BASE_VOL, abs=1e-4)
+    winner_rating, winner_rd, _, _ = rate_1v1(*winner, BASE_VOL, *loser, BASE_VOL)
+    assert rating[0] == pytest.approx(winner_rating, abs=1e-3)
+    assert rd[0] == pytest.approx(winner_rd, abs=1e-3)
+    # rate_1v1 rates the loser against the winner's new values; a period rates both sides from
+    # the values at its start, i.e. the same single-game kernel against the winner's old values
+    loser_rating, loser_rd = rate_game(*loser, BASE_VOL, *winner, 0.0)
+    assert rating[1] == pytest.approx(loser_rating, abs=1e-3)
+    assert rd[1] == pytest.approx(loser_rd, abs=1e-3)
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# tests/test_migration.py
+#
+# init_db() on a database in the baseline layout, where every table keys characters by name.
+
+import logging
+import sqlite3
+
+import pytest
+
+import db
+
+LEGACY_SCHEMA = """
+    CREATE TABLE settings (key TEXT PRIMARY KEY, value TEXT);
+    CREATE TABLE character_map (character TEXT PRIMARY KEY, discord_id INTEGER NOT NULL);
+    CREATE TABLE manual_adjustments (
+        character TEXT NOT NULL, adjustment INTEGER NOT NULL, reason TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, event_id INTEGER
+    );
+    CREATE TABLE frags (id INTEGER PRIMARY KEY, killer TEXT, victim TEXT, timestamp DATETIME, event_id INTEGER);
+    CREATE TABLE deathless_streaks (
+        character TEXT NOT NULL, count INTEGER NOT NULL, event_id INTEGER NOT NULL,
+        PRIMARY KEY (character, event_id)
+    );
+    CREATE TABLE glicko_ratings (
+        character TEXT NOT NULL, rating REAL DEFAULT 1500, rd REAL DEFAULT 350, vol REAL DEFAULT 0.06,
+        last_activity TEXT, event_id INTEGER NOT NULL, PRIMARY KEY (character, event_id)
+    );
+    CREATE TABLE events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL, description TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    INSERT INTO events (id, name) VALUES (1, 'arena');
+"""
+
+FRAGS = [
+    ("Alice", "bob", "2024-01-01T10:00:00+00:00", 1),
+    ("alice", "Carol", "2024-01-01T11:00:00+00:00", 1),
+    ("bob", "alice", "2024-01-02T09:00:00+00:00", 1),
+    ("carol", "BOB", "2024-01-03T12:00:00+00:00", 1),
+    (None, "alice", "2024-01-03T13:00:00+00:00", 1),  # legacy rows could lack a name
+    ("bob", None, "2024-01-03T14:00:00+00:00", 1),
+]
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    with sqlite3.connect(path) as conn:
+        conn.executescript(LEGACY_SCHEMA)
+        conn.executemany("INSERT INTO frags (killer, victim, timestamp, event_id) VALUES (?, ?, ?, ?)", FRAGS)
+        conn.executemany("INSERT INTO manual_adjustments (character, adjustment, reason, event_id) VALUES (?, ?, ?, 1)",
+                         [("Alice", 3, "bonus"), ("dave", -2, "never fought")])
+        conn.executemany("INSERT INTO deathless_streaks (character, count, event_id) VALUES (?, ?, 1)",
+                         [("carol", 1), ("alice", 0)])
+        conn.executemany("INSERT INTO glicko_ratings (character, rating, rd, vol, event_id) VALUES (?, ?, ?, ?, 1)",
+                         [("alice", 1550.0, 120.0, 0.06), ("bob", 1480.0, 130.0, 0.06), ("carol", 1470.0, 140.0, 0.06)])
+    db.set_db_path(path)
+    yield path
+    db._character_ids.clear()
+
+def test_character_id_migration(legacy_db, caplog):
+    with caplog.at_level(logging.WARNING):
+        db.init_db()
+    assert "frags: 2 row(s) not migrated" in caplog.text
+
+    with db.get_connection() as conn:
+        assert not db._table_has_column(conn, "frags", "killer")
+        assert conn.execute("SELECT COUNT(*) FROM frags").fetchone()[0] == len(FRAGS) - 2
+        kills = dict(conn.execute("""
+            SELECT ch.name, COUNT(*) FROM frags f JOIN characters ch ON ch.id = f.killer_id GROUP BY ch.name
+        """).fetchall())
+        deaths = dict(conn.execute("""
+            SELECT ch.name, COUNT(*) FROM frags f JOIN characters ch ON ch.id = f.victim_id GROUP BY ch.name
+        """).fetchall())
+        names = {name for (name,) in conn.execute("SELECT name FROM characters")}
+        assert conn.execute("SELECT COUNT(*) FROM deathless_streaks").fetchone()[0] == 2
+        assert conn.execute("SELECT COUNT(*) FROM glicko_ratings").fetchone()[0] == 3
+
+    assert names == {"alice", "bob", "carol", "dave"}
+    assert kills == {"alice": 2, "bob": 1, "carol": 1}
+    assert deaths == {"alice": 1, "bob": 2, "carol": 1}
+    assert db.get_win_sources("alice", 1) == (3, 2)
+    assert db.get_win_sources("dave", 1) == (-2, 0)
+    assert db.get_glicko_rating_extended("ALICE", 1, decay=False)[:3] == (1550.0, 120.0, 0.06)
+
+    # a second run finds nothing left to migrate
+    db.init_db()
+    with db.get_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM frags").fetchone()[0] == len(FRAGS) - 2
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# tests/test_profiler.py
+
+import asyncio
+import logging
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from db import add_frag, get_connection, get_default_event_id, get_fight_stats, get_fight_stats_bulk
+from profiler import sql_profiler, ProfiledConnection, TracedConnection, REPEAT_LIMIT, command_trace, current_trace, untraced
+
+PLAYERS = [f"player{i:02d}" for i in range(REPEAT_LIMIT + 2)]
+
+@pytest.fixture
+def profiler():
+    sql_profiler.reset()
+    sql_profiler.configure(enabled=True, sample_rate=1.0)
+    yield sql_profiler
+    sql_profiler.configure(enabled=False)
+    sql_profiler.reset()
+
+def test_with_block_commit_is_timed(bot_db, profiler):
+    # `with get_connection() as conn:` commits in __exit__; that commit must go through the timed commit()
+    with get_connection() as conn:
+        assert isinstance(conn, ProfiledConnection)
+        conn.execute("INSERT INTO settings (key, value) VALUES ('profiled', '1')")
+
+    stats = {s.sql: s for s in profiler.top(50)}
+    assert stats["COMMIT"].calls == 1
+    assert stats["COMMIT"].total > 0
+    assert stats["COMMIT"].top_caller.endswith("test_with_block_commit_is_timed")
+    with get_connection() as conn:
+        assert conn.execute("SELECT value FROM settings WHERE key = 'profiled'").fetchone() == ("1",)
+
+def test_with_block_rolls_back_on_error(bot_db, profiler):
+    with pytest.raises(RuntimeError):
+        with get_connection() as conn:
+            conn.execute("INSERT INTO settings (key, value) VALUES ('rolled_back', '1')")
+            raise RuntimeError
+    with get_connection() as conn:
+        assert conn.execute("SELECT 1 FROM settings WHERE key = 'rolled_back'").fetchone() is None
+
+@pytest.fixture
+def fights(bot_db):
+    for killer, victim in zip(PLAYERS, PLAYERS[1:] + PLAYERS[:1]):
+        add_frag(killer, victim)
+    return datetime.now(timezone.utc) - timedelta(days=1), get_default_event_id()
+
+def test_per_row_loop_is_flagged(fights):
+    since, event_id = fights
+    with command_trace("stats") as trace:
+        stats = {name: get_fight_stats(name, since, event_id) for name in PLAYERS}
+    assert stats["player00"] == (1, 1, 2)
+    assert trace.repeated, trace.to_dict()
+    assert any(n > REPEAT_LIMIT for n in trace.repeated.values())
+    assert trace.flags
+
+def test_bulk_query_is_not_flagged(fights):
+    since, event_id = fights
+    with command_trace("stats") as trace:
+        stats = get_fight_stats_bulk(PLAYERS, since, event_id)
+    assert stats["player00"] == (1, 1, 2)
+    assert trace.sql_calls <= 2
+    assert not trace.flags, trace.to_dict()
+
+def test_spawned_tasks_are_not_billed(fights):
+    since, event_id = fights
+
+    async def background():
+        await asyncio.sleep(0)
+        return current_trace(), get_fight_stats("player00", since, event_id)
+
+    async def command():
+        with command_trace("stats") as trace:
+            with untraced():
+                detached = asyncio.create_task(background())
+            leaked = asyncio.create_task(background())  # outlives the command with a copy of its context
+        assert await detached == (None, (1, 1, 2))
+        assert (await leaked)[0] is trace
+        return trace
+
+    trace = asyncio.run(command())
+    assert trace.sql_calls == 0, trace.to_dict()
+
+@pytest.fixture
+def slow_log(profiler, caplog):
+    profiler.configure(slow_ms=1e-6)  # every statement is "slow"
+    with caplog.at_level(logging.WARNING, logger="slow_queries"):
+        yield lambda sql: [r for r in caplog.records if r.name == "slow_queries" and sql in r.getMessage()]
+    profiler.configure(slow_ms=250)
+
+def test_slow_statement_is_logged_once(fights, slow_log):
+    sql = "SELECT killer_id, victim_id FROM frags ORDER BY id"
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql)
+        while cursor.fetchmany(3):
+            pass
+        cursor.execute(sql)
+        cursor.fetchone()  # left unfinished: reported at the next execute
+        cursor.execute("SELECT 1")
+        conn.execute(sql).fetchone()  # reported when the cursor is dropped
+    assert len(slow_log(sql)) == 3
+
+def test_iteration_is_timed(fights, slow_log, monkeypatch):
+    sql = "SELECT killer_id FROM frags ORDER BY id"
+    fetches = []
+    record = sql_profiler.record
+
+    def spy(statement, elapsed, steps, caller, count_call=True):
+        if not count_call:
+            fetches.append(statement)
+        return record(statement, elapsed, steps, caller, count_call)
+
+    monkeypatch.setattr(sql_profiler, "record", spy)
+    with get_connection() as conn:
+        rows = [row for row in conn.execute(sql)]
+    assert len(rows) == len(PLAYERS)
+    assert len(fetches) == len(PLAYERS) + 1  # every row and the end
+    assert len(slow_log(sql)) == 1
+
+def test_traces_without_profiler_are_light(fights):
+    since, event_id = fights
+    assert not sql_profiler.enabled
+    with command_trace("stats") as trace:
+        with get_connection() as conn:
+            assert isinstance(conn, TracedConnection)
+        get_fight_stats_bulk(PLAYERS, since, event_id)
+    assert trace.sql_calls == 1 and trace.sql_ms > 0
+    assert sql_profiler.top(50) == []
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# tests/test_replay.py
+#
+# The NumPy per-kill replay must match the day-by-day Player loop /mmrsync used to run,
+# where every player who sits out a day gets one pre_rating_period() at the end of it.
+
+import random
+
+from collections import defaultdict
+from datetime import date
+
+import numpy as np
+import pytest
+
+from db import get_connection
+from glicko2 import BASE_RATING, BASE_RD, BASE_VOL, Player, decay_rd
+from replay import date_to_julian, replay, replay_event
+
+TOLERANCE = 1e-6
+
+def player_loop(frags: list[tuple[str, str, int]]) -> tuple[dict[str, Player], dict[str, int], int]:
+    """The scalar reference: (players, day of each player's last fight, last day)."""
+    by_day = defaultdict(list)
+    for killer, victim, day in frags:
+        by_day[day].append((killer, victim))
+    players: dict[str, Player] = {}
+    last: dict[str, int] = {}
+    first_day, end_day = min(by_day), max(by_day)
+    for day in range(first_day, end_day + 1):
+        fought = set()
+        for killer, victim in by_day.get(day, []):
+            p1 = players.setdefault(killer, Player())
+            p2 = players.setdefault(victim, Player())
+            p1.update_player([p2.getRating()], [p2.getRd()], [1])
+            p2.update_player([p1.getRating()], [p1.getRd()], [0])
+            fought.update((killer, victim))
+        for name, player in players.items():
+            if name not in fought:
+                player.pre_rating_period()
+        for name in fought:
+            last[name] = day
+    return players, last, end_day
+
+def assert_matches(frags, ratings: dict[str, tuple[float, float, float]]):
+    """ratings: name -> (rating, rd as of the last fight, vol) from the lazy replay."""
+    players, last, end_day = player_loop(frags)
+    assert ratings.keys() == players.keys()
+    for name, player in players.items():
+        rating, rd, vol = ratings[name]
+        # the loop decays every day up to the end; the replay stops at the player's last fight
+        assert rating == pytest.approx(player.getRating(), abs=TOLERANCE), name
+        assert decay_rd(rd, end_day - last[name]) == pytest.approx(player.getRd(), abs=TOLERANCE), name
+        assert vol == pytest.approx(player.getVol(), abs=TOLERANCE), name
+
+def random_frags(seed: int, players: int = 12, days: int = 60, kills: int = 400) -> list[tuple[str, str, int]]:
+    """Kills on random days, with long idle stretches for some players and days without any kills."""
+    rng = random.Random(seed)
+    names = [f"p{i}" for i in range(players)]
+    start = date_to_julian(date(2024, 1, 1))
+    active_days = sorted(rng.sample(range(days), days // 2))
+    # every player is away for a random stretch of the season
+    away = {name: range(a, a + rng.randrange(3, days // 3)) for name in names for a in [rng.randrange(days)]}
+    frags = []
+    for day in sorted(rng.choice(active_days) for _ in range(kills)):
+        present = [name for name in names if day not in away[name]]
+        if len(present) < 2:
+            continue
+        if rng.random() < 0.02:
+            killer = victim = rng.choice(present)
+        else:
+            killer, victim = rng.sample(present, 2)
+        frags.append((killer, victim, start + day))
+    return frags
+
+@pytest.mark.parametrize("seed", [31, 32, 33])
+def test_replay_matches_player_loop(seed):
+    frags = random_frags(seed)
+    fight_days = defaultdict(set)
+    for killer, victim, day in frags:
+        fight_days[killer].add(day)
+        fight_days[victim].add(day)
+    # the lazy decay on return must run: someone comes back after more than a day away
+    assert any(max(np.diff(sorted(d)), default=0) > 1 for d in fight_days.values())
+    names = sorted({name for killer, victim, _ in frags for name in (killer, victim)})
+    index = {name: i for i, name in enumerate(names)}
+    killers = np.array([index[k] for k, _, _ in frags], dtype=np.int64)
+    victims = np.array([index[v] for _, v, _ in frags], dtype=np.int64)
+    days = np.array([day for _, _, day in frags], dtype=np.int64)
+    rating = np.full(len(names), BASE_RATING)
+    rd = np.full(len(names), BASE_RD)
+    vol = np.full(len(names), BASE_VOL)
+
+    replay(killers, victims, days, rating, rd, vol)
+
+    assert_matches(frags, {name: (rating[i], rd[i], vol[i]) for name, i in index.items()})
+
+def test_replay_event_matches_player_loop(fragged_db):
+    default_id, _, frags = fragged_db
+    # replay order: timestamp, then insertion order (frags come in id order, so a stable sort)
+    event_frags = sorted(
+        ((killer, victim, date_to_julian(date.fromisoformat(ts[:10])), ts) for killer, victim, ts, event_id in frags
+         if event_id == default_id),
+        key=lambda frag: frag[3]
+    )
+    with get_connection() as conn:
+        names = dict(conn.execute("SELECT id, name FROM characters"))
+
+    result = replay_event(default_id)
+
+    ratings = {names[cid]: values for cid, values in result.as_dict().items()}
+    assert_matches([frag[:3] for frag in event_frags], ratings)
+
+@pytest.mark.slow
+def test_replay_matches_player_loop_1m():
+    # A year of 1M kills between 2000 players; each day half of them (a rotating block) can play,
+    # so everyone sits out long stretches and comes back through the lazy decay
+    rng = np.random.default_rng(31)
+    players, season, kills = 2000, 365, 1_000_000
+    days = np.sort(rng.integers(0, season, kills))
+    base = days * (players // season)
+    killers = (base + rng.integers(0, players // 2, kills)) % players
+    victims = (killers + rng.integers(1, players // 2, kills)) % players
+    days += date_to_julian(date(2024, 1, 1))
+
+    rating = np.full(players, BASE_RATING)
+    rd = np.full(players, BASE_RD)
+    vol = np.full(players, BASE_VOL)
+    replay(killers, victims, days, rating, rd, vol)
+
+    frags = list(zip(killers.tolist(), victims.tolist(), days.tolist()))
+    fought = np.union1d(killers, victims)
+    assert_matches(frags, {i: (rating[i], rd[i], vol[i]) for i in fought.tolist()})
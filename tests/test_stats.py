@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# tests/test_stats.py
+
+import asyncio
+
+from types import SimpleNamespace
+
+from conftest import PLAYERS
+from profiler import REPEAT_LIMIT, command_trace
+from utils import generate_stats_pages
+
+class FakeGuild:
+    id = 1
+
+    def get_member(self, discord_id):
+        return None
+
+    async def fetch_member(self, discord_id):
+        raise LookupError(discord_id)
+
+def test_stats_pages_skip_inactive_characters_in_bulk(fragged_db):
+    default_id, _, _ = fragged_db
+    # ivan has an adjustment but no fights; the rest were never seen
+    characters = PLAYERS + ["ivan"] + [f"nobody{i}" for i in range(REPEAT_LIMIT)]
+    interaction = SimpleNamespace(guild=FakeGuild())
+
+    async def build():
+        with command_trace("stats") as trace:
+            pages = await generate_stats_pages(interaction, characters, 60, event_id=default_id)
+            embed = await pages.page(len(pages) - 1)
+        return trace, embed
+
+    trace, embed = asyncio.run(build())
+
+    assert not trace.flags, trace.to_dict()
+    assert f"{len(PLAYERS)} character(s)" in embed.author.name
+    # only the active characters' adjustments count: alice +3, bob -1
+    assert embed.fields[-1].value.endswith("Extra: `2`")
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+# tests/test_sync.py
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from db import add_frag, get_connection, get_glicko_rating_extended, intern_character
+from engines import ENGINES
+from replay import julian_to_date, latest_checkpoint, save_replay, save_replays, sync_event
+
+def ratings(event_id: int) -> dict[str, dict[int, tuple]]:
+    """Every rating table's rows for the event: table -> character_id -> values."""
+    tables = {"glicko_ratings": ("rating", "rd", "vol")}
+    tables.update({engine.table: engine.columns for engine in ENGINES.values()})
+    with get_connection() as conn:
+        return {
+            table: {cid: tuple(values) for cid, *values in conn.execute(
+                f"SELECT character_id, {', '.join(columns)} FROM {table} WHERE event_id = ?", (event_id,)
+            )}
+            for table, columns in tables.items()
+        }
+
+def test_resumed_sync_rebuilds_every_engine(fragged_db):
+    event_id = fragged_db[0]
+    save_replay(event_id, sync_event(event_id), clear=True)
+    checkpoint = latest_checkpoint(event_id)
+    assert checkpoint is not None
+
+    # frags imported after the checkpoint, which only a sync rates
+    day = julian_to_date(checkpoint + 1)
+    when = datetime(day.year, day.month, day.day, 12, tzinfo=timezone.utc)
+    late = [("alice", "newcomer"), ("newcomer", "bob"), ("erin", "alice"), ("newcomer", "alice")]
+    with get_connection() as conn:
+        conn.executemany(
+            "INSERT INTO frags (killer_id, victim_id, timestamp, event_id) VALUES (?, ?, ?, ?)",
+            [(intern_character(k), intern_character(v), (when + timedelta(minutes=i)).isoformat(), event_id)
+             for i, (k, v) in enumerate(late)]
+        )
+
+    resumed = sync_event(event_id, day)
+    assert resumed.restart_day == checkpoint
+    save_replay(event_id, resumed, clear=True)
+    after_resume = ratings(event_id)
+
+    save_replay(event_id, sync_event(event_id), clear=True)
+    full = ratings(event_id)
+
+    newcomer = intern_character("newcomer")
+    for table, rows in full.items():
+        assert newcomer in after_resume[table], table
+        assert after_resume[table].keys() == rows.keys(), table
+        for cid, values in rows.items():
+            assert after_resume[table][cid] == pytest.approx(values, abs=1e-9), (table, cid)
+
+@pytest.mark.parametrize("resume", [False, True])
+def test_frags_during_a_rebuild_survive_the_save(fragged_db, resume):
+    event_id = fragged_db[0]
+    save_replay(event_id, sync_event(event_id), clear=True)
+    from_day = julian_to_date(latest_checkpoint(event_id) + 1) if resume else None
+
+    result = sync_event(event_id, from_day)
+    # the live bot rates these while the worker's result waits to be saved
+    add_frag("alice", "livefresh")
+    add_frag("livefresh", "bob")
+    live = ratings(event_id)
+    save_replays({event_id: result}, True)
+    saved = ratings(event_id)
+
+    livefresh = intern_character("livefresh")
+    for table, rows in live.items():
+        assert saved[table].keys() == rows.keys(), table
+        assert livefresh in saved[table], table
+        for cid, values in rows.items():
+            assert saved[table][cid] == pytest.approx(values, abs=1e-9), (table, cid)
+    assert get_glicko_rating_extended("livefresh", event_id, decay=False)[:2] != (1500.0, 350.0)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# tests/test_top.py
+#
+# get_top_points() against the per-character path /top used before it (one query per step).
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from db import (
+    add_frag, adjust_wins, get_character_owner, get_connection, get_default_event_id, get_glicko_rating_extended,
+    get_top_points, get_user_glicko_mmr, get_win_sources, link_character
+)
+
+def old_top_points(event_id: int, since: datetime, limit: int) -> list[tuple]:
+    with get_connection() as conn:
+        raw_stats = conn.execute("""
+            SELECT ch.name, t.count FROM (
+                SELECT killer_id, COUNT(*) AS count FROM frags
+                WHERE timestamp >= ? AND event_id = ?
+                GROUP BY killer_id
+            ) t
+            JOIN characters ch ON ch.id = t.killer_id
+        """, (since, event_id)).fetchall()
+
+    user_points = {}
+    for character, frags in raw_stats:
+        manual, _ = get_win_sources(character, event_id=event_id)
+        discord_id = get_character_owner(character)
+        key = discord_id if discord_id else character
+        if key not in user_points:
+            user_points[key] = {"characters": set(), "frags": 0, "manual": 0}
+        user_points[key]["characters"].add(character)
+        user_points[key]["frags"] += frags
+        user_points[key]["manual"] += manual
+
+    aggregated = [
+        (key, data["characters"], data["frags"], data["manual"], data["frags"] + data["manual"])
+        for key, data in user_points.items()
+    ]
+    rows = []
+    for key, characters, frags, manual, total in sorted(aggregated, key=lambda x: x[4], reverse=True)[:limit]:
+        if isinstance(key, int):
+            mmr = get_user_glicko_mmr(key, event_id)
+        else:
+            mmr = get_glicko_rating_extended(key, event_id)[0]
+        rows.append((key, sorted(characters), frags, manual, total, mmr))
+    return rows
+
+@pytest.fixture
+def top_db(fragged_db):
+    default_id, duels_id, _ = fragged_db
+    # adjustments on characters without kills: linked (ivan, from fragged_db) and not
+    adjust_wins("ghost", 7, "never fought")
+    # linked characters that never fought, one of them in mixed case
+    link_character("Zed", 1002)
+    link_character("olga", 1001)
+    adjust_wins("olga", 4, "linked, never fought")
+    return default_id, duels_id
+
+@pytest.mark.parametrize("days", [1, 7, 30, 5000])
+@pytest.mark.parametrize("limit", [3, 10, 1000])
+@pytest.mark.parametrize("event", [0, 1])
+def test_matches_per_character_path(top_db, days, limit, event):
+    event_id = top_db[event]
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    new = get_top_points(event_id, since, limit)
+    old = old_top_points(event_id, since, limit)
+
+    assert [row[:5] for row in new] == [row[:5] for row in old]
+    for (key, *_, mmr), (_, *_, old_mmr) in zip(new, old):
+        assert isinstance(mmr, int), key
+        assert mmr == int(round(old_mmr)), key
+
+def test_adjustments_without_kills_are_not_ranked(top_db):
+    default_id, _ = top_db
+    rows = get_top_points(default_id, datetime.now(timezone.utc) - timedelta(days=5000), 1000)
+    keys = [key for key, *_ in rows]
+    assert "ghost" not in keys and 1003 not in keys
+    # olga's adjustment does not reach her owner: she has no kills, as in the old path
+    alice_row = next(row for row in rows if row[0] == 1001)
+    assert "olga" not in alice_row[1]
+
+def test_ties_keep_the_lowest_character_id_first(bot_db):
+    # every character has one kill: all but the owner of two tie, ordered by id (the order first seen)
+    names = [f"tied{i:02d}" for i in range(30)]
+    for killer, victim in zip(names, names[1:] + names[:1]):
+        add_frag(killer, victim)
+    link_character("tied07", 42)
+    link_character("tied21", 42)  # an owner ranks by their first character
+    rows = get_top_points(get_default_event_id(), datetime.now(timezone.utc) - timedelta(days=1), 1000)
+
+    assert {total for *_, total, _ in rows} == {1, 2}
+    tied = [key for key, *_, total, _ in rows if total == 1]
+    assert tied == [name for name in names if name not in ("tied07", "tied21")]
+    assert rows[0][0] == 42
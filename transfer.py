@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+# transfer.py
+
+import csv
+import gzip
+import json
+import logging
+import time
+
+from typing import Callable, Iterable, Iterator, Optional
+
+from db import get_connection, notify_change
+from engines import ENGINES
+
+# Rows per executemany() batch on import (and per fetchmany() on export)
+CHUNK_SIZE = 5000
+
+# Progress callback is invoked at most once per this many rows
+PROGRESS_EVERY = 50000
+
+FORMAT_VERSION = 1
+
+# table -> exported fields, in CSV column order (the first CSV column is always the table name)
+TABLES = {
+    "frags": ("timestamp", "killer", "victim"),
+    "manual_adjustments": ("timestamp", "character", "adjustment", "reason"),
+    "glicko_ratings": ("character", "rating", "rd", "vol", "last_activity"),
+    "glicko_history": ("timestamp", "character", "delta", "reason"),
+    "character_map": ("character", "discord_id"),
+}
+
+# Characters that took part in the event: the scope for character links
+_PARTICIPANTS = """
+    SELECT killer_id AS id FROM frags WHERE event_id = :event_id
+    UNION SELECT victim_id FROM frags WHERE event_id = :event_id
+    UNION SELECT character_id FROM manual_adjustments WHERE event_id = :event_id
+    UNION SELECT character_id FROM glicko_ratings WHERE event_id = :event_id
+"""
+
+_EXPORT_QUERIES = {
+    "frags": """
+        SELECT f.timestamp, k.name, v.name
+        FROM frags f
+        JOIN characters k ON k.id = f.killer_id
+        JOIN characters v ON v.id = f.victim_id
+        WHERE f.event_id = :event_id
+        ORDER BY f.id
+    """,
+    "manual_adjustments": """
+        SELECT m.timestamp, ch.name, m.adjustment, m.reason
+        FROM manual_adjustments m
+        JOIN characters ch ON ch.id = m.character_id
+        WHERE m.event_id = :event_id
+        ORDER BY m.rowid
+    """,
+    "glicko_ratings": """
+        SELECT ch.name, g.rating, g.rd, g.vol, g.last_activity
+        FROM glicko_ratings g
+        JOIN characters ch ON ch.id = g.character_id
+        WHERE g.event_id = :event_id
+    """,
+    "glicko_history": """
+        SELECT gh.timestamp, gh.character, gh.delta, gh.reason
+        FROM glicko_history gh
+        WHERE gh.event_id = :event_id
+        ORDER BY gh.rowid
+    """,
+    "character_map": f"""
+        SELECT cm.character, cm.discord_id
+        FROM character_map cm
+        WHERE cm.character IN (SELECT ch.name FROM characters ch WHERE ch.id IN ({_PARTICIPANTS}))
+    """,
+}
+
+ProgressCallback = Callable[[str, int], None]
+
+# --- Files ---
+
+def detect_format(path: str) -> tuple[str, Optional[str]]:
+    """
+    Returns (format, compression) from the file name:
+    'x.jsonl', 'x.csv', optionally followed by '.gz' or '.zst'.
+    """
+    name = path.lower()
+    compression = None
+    for suffix in (".gz", ".zst"):
+        if name.endswith(suffix):
+            compression = suffix[1:]
+            name = name[: -len(suffix)]
+    if name.endswith(".jsonl"):
+        return "jsonl", compression
+    if name.endswith(".csv"):
+        return "csv", compression
+    raise ValueError(f"Unsupported file type: {path} (expected .jsonl or .csv, optionally .gz/.zst)")
+
+def open_text(path: str, mode: str, compression: Optional[str]):
+    """Opens a (possibly compressed) UTF-8 text stream; mode is 'r' or 'w'."""
+    if compression == "gz":
+        return gzip.open(path, mode + "t", encoding="utf-8", newline="")
+    if compression == "zst":
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("zstandard is not installed; use .gz or no compression")
+        return zstandard.open(path, mode + "t", encoding="utf-8", newline="")
+    return open(path, mode, encoding="utf-8", newline="")
+
+# --- Export ---
+
+def _iter_table(conn, table: str, event_id: int) -> Iterator[tuple]:
+    cur = conn.execute(_EXPORT_QUERIES[table], {"event_id": event_id})
+    while True:
+        rows = cur.fetchmany(CHUNK_SIZE)
+        if not rows:
+            return
+        yield from rows
+
+def iter_event_records(event_id: int) -> Iterator[tuple[str, tuple]]:
+    """Yields (table, row) for every exported row of the event, one table after another."""
+    with get_connection() as conn:
+        for table in TABLES:
+            for row in _iter_table(conn, table, event_id):
+                yield table, row
+
+def _write_jsonl(f, event_name: str, records: Iterable[tuple[str, tuple]]) -> Iterator[str]:
+    f.write(json.dumps({"table": "header", "version": FORMAT_VERSION, "event": event_name}) + "\n")
+    for table, row in records:
+        record = {"table": table, **dict(zip(TABLES[table], row))}
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        yield table
+
+def _write_csv(f, event_name: str, records: Iterable[tuple[str, tuple]]) -> Iterator[str]:
+    writer = csv.writer(f)
+    writer.writerow(["header", FORMAT_VERSION, event_name])
+    for table, row in records:
+        writer.writerow([table, *("" if v is None else v for v in row)])
+        yield table
+
+def _count(tables: Iterable[str], progress: Optional[ProgressCallback]) -> dict[str, int]:
+    """Drains the pipeline, counting rows per table and reporting progress."""
+    counts: dict[str, int] = {}
+    done = 0
+    for table in tables:
+        counts[table] = counts.get(table, 0) + 1
+        done += 1
+        if progress and done % PROGRESS_EVERY == 0:
+            progress(table, done)
+    if progress:
+        progress("done", done)
+    return counts
+
+def export_event(event_id: int, event_name: str, path: str, progress: Optional[ProgressCallback] = None) -> dict[str, int]:
+    """
+    Streams the event's frags, adjustments, ratings, rating history and character links to path.
+    Format and compression follow the file name (see detect_format). Memory use is constant.
+    Returns row counts per table.
+    """
+    fmt, compression = detect_format(path)
+    writer = _write_jsonl if fmt == "jsonl" else _write_csv
+    start = time.perf_counter()
+    with open_text(path, "w", compression) as f:
+        counts = _count(writer(f, event_name, iter_event_records(event_id)), progress)
+    logging.info(f"📤 Exported event '{event_name}' to {path}: {counts} in {time.perf_counter() - start:.1f}s")
+    return counts
+
+# --- Import ---
+
+def _read_jsonl(f) -> Iterator[tuple[str, dict]]:
+    for line in f:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        table = record.pop("table")
+        if table == "header":
+            if record.get("version") != FORMAT_VERSION:
+                raise ValueError(f"Unsupported export version: {record.get('version')}")
+            continue
+        yield table, record
+
+def _read_csv(f) -> Iterator[tuple[str, dict]]:
+    for row in csv.reader(f):
+        if not row:
+            continue
+        table, values = row[0], row[1:]
+        if table == "header":
+            if values[:1] != [str(FORMAT_VERSION)]:
+                raise ValueError(f"Unsupported export version: {values[:1]}")
+            continue
+        yield table, {k: (v if v != "" else None) for k, v in zip(TABLES.get(table, ()), values)}
+
+def _chunks(records: Iterable[tuple[str, dict]]) -> Iterator[tuple[str, list[dict]]]:
+    """Groups consecutive records of the same table into lists of at most CHUNK_SIZE."""
+    table, chunk = None, []
+    for rec_table, record in records:
+        if rec_table not in TABLES:
+            raise ValueError(f"Unknown table in import file: {rec_table}")
+        if chunk and (rec_table != table or len(chunk) >= CHUNK_SIZE):
+            yield table, chunk
+            chunk = []
+        table = rec_table
+        chunk.append(record)
+    if chunk:
+        yield table, chunk
+
+class _CharacterIds:
+    """name -> characters.id for the import connection, interning unknown names a chunk at a time."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.ids: dict[str, int] = {}
+
+    def resolve(self, names: Iterable[str]):
+        missing = sorted({n.lower() for n in names} - self.ids.keys())
+        if not missing:
+            return
+        self.conn.executemany("INSERT OR IGNORE INTO characters (name) VALUES (?)", ((n,) for n in missing))
+        rows = self.conn.execute(
+            "SELECT name, id FROM characters WHERE name IN (SELECT value FROM json_each(?))",
+            (json.dumps(missing),)
+        )
+        self.ids.update(rows)
+
+    def __getitem__(self, name: str) -> int:
+        return self.ids[name.lower()]
+
+def _insert_chunk(conn, ids: _CharacterIds, table: str, chunk: list[dict], event_id: int, replace: bool):
+    if table == "frags":
+        ids.resolve(n for r in chunk for n in (r["killer"], r["victim"]))
+        conn.executemany(
+            "INSERT INTO frags (killer_id, victim_id, timestamp, event_id) VALUES (?, ?, ?, ?)",
+            ((ids[r["killer"]], ids[r["victim"]], r["timestamp"], event_id) for r in chunk)
+        )
+    elif table == "manual_adjustments":
+        ids.resolve(r["character"] for r in chunk)
+        conn.executemany(
+            "INSERT INTO manual_adjustments (character_id, adjustment, reason, timestamp, event_id) VALUES (?, ?, ?, ?, ?)",
+            ((ids[r["character"]], int(r["adjustment"]), r["reason"], r["timestamp"], event_id) for r in chunk)
+        )
+    elif table == "glicko_ratings":
+        ids.resolve(r["character"] for r in chunk)
+        conn.executemany(
+            """
+            INSERT INTO glicko_ratings (character_id, rating, rd, vol, last_activity, event_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(character_id, event_id) DO UPDATE SET
+                rating = excluded.rating, rd = excluded.rd, vol = excluded.vol, last_activity = excluded.last_activity
+            """,
+            ((ids[r["character"]], float(r["rating"]), float(r["rd"]), float(r["vol"]), r["last_activity"], event_id)
+             for r in chunk)
+        )
+    elif table == "glicko_history":
+        conn.executemany(
+            "INSERT INTO glicko_history (character, delta, reason, timestamp, event_id) VALUES (?, ?, ?, ?, ?)",
+            ((r["character"].lower(), float(r["delta"]), r["reason"], r["timestamp"], event_id) for r in chunk)
+        )
+    elif table == "character_map":
+        verb = "REPLACE" if replace else "INSERT OR IGNORE"
+        conn.executemany(
+            f"{verb} INTO character_map (character, discord_id) VALUES (?, ?)",
+            ((r["character"].lower(), int(r["discord_id"])) for r in chunk)
+        )
+
+def import_event(path: str, event_id: int, replace: bool = False, progress: Optional[ProgressCallback] = None) -> dict[str, int]:
+    """
+    Streams an export file into the event in one transaction, CHUNK_SIZE rows per executemany().
+    With replace=True the event's frags, adjustments and ratings are deleted first and existing
+    character links are overwritten; otherwise rows are appended and existing links are kept.
+    Returns row counts per table.
+    """
+    fmt, compression = detect_format(path)
+    reader = _read_jsonl if fmt == "jsonl" else _read_csv
+    counts: dict[str, int] = {}
+    done = 0
+    start = time.perf_counter()
+    with open_text(path, "r", compression) as f, get_connection() as conn:
+        if replace:
+            for table in ("frags", "manual_adjustments", "glicko_ratings", "glicko_history", "rating_history",
+                          "deathless_streaks", *(engine.table for engine in ENGINES.values())):
+                conn.execute(f"DELETE FROM {table} WHERE event_id = ?", (event_id,))
+        # imported frags may predate existing rating checkpoints
+        conn.execute("DELETE FROM glicko_checkpoints WHERE event_id = ?", (event_id,))
+        ids = _CharacterIds(conn)
+        for table, chunk in _chunks(reader(f)):
+            _insert_chunk(conn, ids, table, chunk, event_id, replace)
+            counts[table] = counts.get(table, 0) + len(chunk)
+            previous, done = done, done + len(chunk)
+            if progress and done // PROGRESS_EVERY != previous // PROGRESS_EVERY:
+                progress(table, done)
+        conn.commit()
+    notify_change("event", event_id)
+    notify_change("owners")
+    if progress:
+        progress("done", done)
+    logging.info(f"📥 Imported {path} into event {event_id}: {counts} in {time.perf_counter() - start:.1f}s")
+    return counts
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+# tuning.py
+#
+# Offline search for the live rating model's constants (cli.py tune). Every parameter set replays
+# the event history kill by kill with the semantics of replay.replay() and is scored on how well it
+# predicted each fight before rating it: log-loss and accuracy of P(killer wins).
+#
+# Parameter sets run side by side: the rating state is a (players × configs) array, so one NumPy
+# operation advances every config at once. Kills that share no player are independent, so they are
+# grouped into waves (a kill goes one wave after the latest kill of either of its players) and a
+# whole wave is rated with one set of operations; each player's kills still happen in order, so the
+# result is the same as the sequential replay. Batches of configs run in parallel worker processes.
+
+import itertools
+import math
+import multiprocessing
+import os
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Optional
+
+import numpy as np
+
+from glicko2 import BASE_RD, BASE_VOL, DECAY_C, Q, SCALE
+
+# The tunable constants of the per-kill model. The live model skips Glicko-2's volatility step,
+# so TAU has no effect on it; the fixed volatility (BASE_VOL) is what widens RD before each game.
+PARAMS = ("rd0", "c", "vol")  # initial RD (also the decay cap), RD decay per idle day, volatility
+CURRENT = (BASE_RD, DECAY_C, BASE_VOL)
+
+# Working memory per worker for the rating state (2 floats per player per config)
+MEMORY_PER_WORKER = 256 * 1024 * 1024
+
+# --- Parameter sets ---
+
+def parse_spec(spec: str) -> list[float]:
+    """'a,b,c' -> those values; 'lo:hi:n' -> n values evenly spaced from lo to hi."""
+    if ":" in spec:
+        lo, hi, n = spec.split(":")
+        return np.linspace(float(lo), float(hi), int(n)).tolist()
+    return [float(x) for x in spec.split(",")]
+
+def grid(*values: list[float]) -> np.ndarray:
+    """Every combination of the given values, one config per row."""
+    return np.array(list(itertools.product(*values)), dtype=np.float64)
+
+def random_configs(n: int, *values: list[float], seed: Optional[int] = None) -> np.ndarray:
+    """n configs drawn uniformly from [min, max] of each parameter's values."""
+    rng = np.random.default_rng(seed)
+    lows = [min(v) for v in values]
+    highs = [max(v) for v in values]
+    return rng.uniform(lows, highs, size=(n, len(values)))
+
+# --- History ---
+
+class History:
+    """The kills of one or more events in wave order, ready for evaluate()."""
+
+    __slots__ = ("players", "killers", "victims", "idle_k", "idle_v", "scored", "bounds", "self_kill")
+
+    def __init__(self, players, killers, victims, idle_k, idle_v, scored, bounds, self_kill):
+        self.players = players
+        self.killers = killers
+        self.victims = victims
+        self.idle_k = idle_k          # idle-day decay steps applied to the killer before the kill
+        self.idle_v = idle_v
+        self.scored = scored          # kill counts towards the score (after warm-up, not a self-kill)
+        self.bounds = bounds          # wave i is [bounds[i], bounds[i + 1])
+        self.self_kill = self_kill
+
+    def __len__(self):
+        return len(self.killers)
+
+def load_history(event_ids: list[int], warmup: float = 0.2) -> History:
+    """
+    Reads the events' frags (each event is its own set of players) and orders them into waves.
+    The first `warmup` fraction of each event's kills is replayed but not scored.
+    """
+    from replay import load_frags
+
+    killers, victims, idle_k, idle_v, scored = [], [], [], [], []
+    offset = 0
+    for event_id in event_ids:
+        k, v, days, _ = load_frags(event_id)
+        if not len(k):
+            continue
+        ids, dense = np.unique(np.concatenate((k, v)), return_inverse=True)
+        dense = dense.reshape(-1) + offset
+        k, v = dense[:len(k)], dense[len(k):]
+        # decay steps due at each kill: a player's first fight of a day brings the days since their
+        # previous fight forward, as replay.replay() does (lazily, once per day). Each side's
+        # previous fight is the preceding entry of the same player in (player, time) order.
+        sides = np.column_stack((k, v)).reshape(-1)  # killer before victim, so a self-kill decays once
+        order = np.argsort(sides, kind="stable")
+        player, day = sides[order], np.repeat(days, 2)[order]
+        idle = np.zeros(len(sides))
+        again = np.flatnonzero(player[1:] == player[:-1]) + 1
+        idle[order[again]] = np.maximum(day[again] - day[again - 1] - 1, 0)
+        killers.append(k)
+        victims.append(v)
+        idle_k.append(idle[0::2])
+        idle_v.append(idle[1::2])
+        scored.append((np.arange(len(k)) >= warmup * len(k)) & (k != v))
+        offset += len(ids)
+
+    if not killers:
+        empty = np.empty(0, dtype=np.int64)
+        return History(0, empty, empty, np.empty(0), np.empty(0), np.empty(0, dtype=bool), np.zeros(1, dtype=np.int64), np.empty(0, dtype=bool))
+
+    k = np.concatenate(killers)
+    v = np.concatenate(victims)
+    # events are interleaved freely: they share no players
+    wave = np.empty(len(k), dtype=np.int64)
+    last_wave = [0] * offset
+    for i, (a, b) in enumerate(zip(k.tolist(), v.tolist())):
+        w = max(last_wave[a], last_wave[b]) + 1
+        wave[i] = last_wave[a] = last_wave[b] = w
+    order = np.argsort(wave, kind="stable")
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(wave[order])) + 1, [len(k)]))
+    k, v = k[order], v[order]
+    return History(
+        offset, k, v,
+        np.concatenate(idle_k)[order], np.concatenate(idle_v)[order], np.concatenate(scored)[order],
+        bounds, k == v,
+    )
+
+# --- Evaluation (worker process) ---
+
+_history: Optional[History] = None
+
+def _init_worker(history: History):
+    global _history
+    _history = history
+
+def _decay(phi2, idle, c2, cap2):
+    """decay_rd() in φ² for the rows with idle days; idle is a column (rows × 1)."""
+    return np.where(idle > 0, np.minimum(phi2 + idle * c2, cap2), phi2)
+
+def evaluate(configs: np.ndarray, history: Optional[History] = None) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Replays the history once for every config (rows of rd0, c, vol) and returns
+    (log_loss, accuracy, final ratings, final RDs); ratings and RDs are (players × configs).
+    """
+    h = history if history is not None else _history
+    n = len(configs)
+    phi0 = configs[:, 0] / SCALE
+    cap2 = phi0 ** 2
+    c2 = (configs[:, 1] / SCALE) ** 2
+    vol2 = configs[:, 2] ** 2
+
+    mu = np.zeros((h.players, n))
+    phi2 = np.tile(cap2, (h.players, 1))
+    log_loss = np.zeros(n)
+    hits = np.zeros(n)
+    sqrt, exp = np.sqrt, np.exp
+
+    bounds = h.bounds.tolist()
+    for s, e in zip(bounds[:-1], bounds[1:]):
+        self_kill = h.self_kill[s:e]
+        rows = slice(s, e) if not self_kill.any() else s + np.flatnonzero(~self_kill)
+        k = h.killers[rows]
+        v = h.victims[rows]
+        if len(k):
+            mk = mu[k]
+            mv = mu[v]
+            pk = _decay(phi2[k], h.idle_k[rows][:, None], c2, cap2)
+            pv = _decay(phi2[v], h.idle_v[rows][:, None], c2, cap2)
+            d = mk - mv
+
+            # prediction before the fight: expected_score() with both players' RD
+            scored = h.scored[rows]
+            if scored.any():
+                ds = d[scored]
+                p = 1 / (1 + exp(-ds / sqrt(1 + Q * (pk[scored] + pv[scored]))))
+                log_loss -= np.log(p).sum(axis=0)
+                hits += (ds > 0).sum(axis=0) + 0.5 * (ds == 0).sum(axis=0)
+
+            # rate_1v1(): the winner against the loser, then the loser against the winner's new values
+            g = 1 / sqrt(1 + Q * pv)
+            ex = 1 / (1 + exp(-g * d))
+            pk = 1 / (1 / (pk + vol2) + g * g * ex * (1 - ex))
+            mk = mk + pk * g * (1 - ex)
+            g = 1 / sqrt(1 + Q * pk)
+            ex = 1 / (1 + exp(-g * (mv - mk)))
+            pv = 1 / (1 / (pv + vol2) + g * g * ex * (1 - ex))
+            mu[k] = mk
+            mu[v] = mv - pv * g * ex
+            phi2[k] = pk
+            phi2[v] = pv
+
+        if self_kill.any():
+            # a self-kill rates the player twice against themselves (win, then loss), as replay does
+            p_rows = s + np.flatnonzero(self_kill)
+            a = h.killers[p_rows]
+            m = mu[a]
+            pa = _decay(phi2[a], h.idle_k[p_rows][:, None], c2, cap2)
+            for score in (1.0, 0.0):
+                g = 1 / sqrt(1 + Q * pa)
+                ex = 0.5  # E against one's own rating
+                pa = 1 / (1 / (pa + vol2) + g * g * ex * (1 - ex))
+                m = m + pa * g * (score - ex)
+            mu[a] = m
+            phi2[a] = pa
+
+    scored_kills = max(int(h.scored.sum()), 1)
+    return log_loss / scored_kills, hits / scored_kills, SCALE * mu + 1500, SCALE * sqrt(phi2)
+
+def _evaluate_batch(start: int, configs: np.ndarray):
+    log_loss, accuracy, _, _ = evaluate(configs)
+    return start, log_loss, accuracy
+
+# --- Search ---
+
+def tune(
+    history: History,
+    configs: np.ndarray,
+    workers: Optional[int] = None,
+    on_batch: Optional[Callable[[int, int], None]] = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Scores every config (rows of rd0, c, vol) on the history in `workers` processes (default: every
+    core). Returns (log_loss, accuracy) aligned with configs; on_batch(done, total) reports progress.
+    """
+    workers = workers or os.cpu_count() or 1
+    per_worker = math.ceil(len(configs) / workers)
+    batch = max(1, min(per_worker, MEMORY_PER_WORKER // (16 * max(history.players, 1))))
+    log_loss = np.empty(len(configs))
+    accuracy = np.empty(len(configs))
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init_worker, initargs=(history,)) as executor:
+        futures = [
+            executor.submit(_evaluate_batch, start, configs[start:start + batch])
+            for start in range(0, len(configs), batch)
+        ]
+        done = 0
+        for future in as_completed(futures):
+            start, ll, acc = future.result()
+            log_loss[start:start + len(ll)] = ll
+            accuracy[start:start + len(acc)] = acc
+            done += len(ll)
+            if on_batch:
+                on_batch(done, len(configs))
+    return log_loss, accuracy
@@ -1,40 +1,170 @@
 # -*- coding: utf-8 -*-
 # utils.py
 
+import time
+import asyncio
 import discord
 import logging
-import sqlite3
 
 from discord import app_commands, Interaction, Member
-from typing import Optional, cast
+from discord.ext import commands
+from typing import Awaitable, Callable, Optional, cast
 from operator import itemgetter
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
 
+from discord.webhook.async_ import AsyncWebhookAdapter
+
 from db import *
 from settings import get_db_file_path
+from profiler import sql_profiler, current_trace, start_trace, finish_trace, record_http
+from cache import display_cache
+
+PAGE_SIZE = 10   # rows per leaderboard page
+PAGE_CACHE = 8   # rendered pages kept per result
+
+class LazyPages:
+    """
+    A paginated result whose pages are rendered when first shown: render(n) builds page n (0-based)
+    and the last PAGE_CACHE rendered pages are kept. locate(user_id) returns the page that holds the
+    user, or a message saying why there is none. Instances are shared through result_cache, so
+    everyone paging the same result reuses the pages already rendered.
+    """
+
+    def __init__(
+        self,
+        count: int,
+        render: Callable[[int], Awaitable[discord.Embed]],
+        locate: Optional[Callable[[int], Awaitable[int | str]]] = None
+    ):
+        self.count = count
+        self.render = render
+        self.locate = locate
+        self._pages: OrderedDict[int, discord.Embed] = OrderedDict()
+
+    def __len__(self):
+        return self.count
+
+    async def page(self, n: int) -> discord.Embed:
+        embed = self._pages.get(n)
+        if embed is not None:
+            self._pages.move_to_end(n)
+            return embed
+        embed = self._pages[n] = await self.render(n)
+        while len(self._pages) > PAGE_CACHE:
+            self._pages.popitem(last=False)
+        return embed
+
+def page_count(rows: int) -> int:
+    return -(-rows // PAGE_SIZE)
+
+class _JumpToPageModal(discord.ui.Modal, title="Go to page"):
+    page = discord.ui.TextInput(label="Page", max_length=6)
+
+    def __init__(self, paginator: "PaginatedStatsView"):
+        super().__init__()
+        self.paginator = paginator
+        self.page.placeholder = f"1-{len(paginator.pages)}"
+
+    async def on_submit(self, interaction: Interaction):
+        text = self.page.value.strip()
+        count = len(self.paginator.pages)
+        if not text.isdigit() or not 1 <= int(text) <= count:
+            await interaction.response.send_message(f"❌ Page must be between 1 and {count}.", ephemeral=True)
+            return
+        await self.paginator.show(interaction, int(text) - 1)
 
 class PaginatedStatsView(discord.ui.View):
     
-    def __init__(self, embeds, ephemeral: bool):
+    def __init__(self, pages: LazyPages, ephemeral: bool):
         super().__init__(timeout=120)
-        self.embeds = embeds
+        self.pages = pages
         self.index = 0
         self.ephemeral = ephemeral
+        self.jump.label = f"1/{len(pages)}"
+        if pages.locate is None:
+            self.remove_item(self.find_me)
 
     async def send_initial(self, interaction: Interaction):
-        await interaction.followup.send(embed=self.embeds[0], view=self, ephemeral=self.ephemeral)
+        await interaction.followup.send(embed=await self.pages.page(0), view=self, ephemeral=self.ephemeral)
+
+    async def show(self, interaction: Interaction, index: int):
+        self.index = index
+        self.jump.label = f"{index + 1}/{len(self.pages)}"
+        await interaction.response.edit_message(embed=await self.pages.page(index), view=self)
 
     @discord.ui.button(label="⏪ Prev", style=discord.ButtonStyle.grey)
     async def prev(self, interaction: Interaction, button: discord.ui.Button):
         if self.index > 0:
-            self.index -= 1
-            await interaction.response.edit_message(embed=self.embeds[self.index], view=self)
+            await self.show(interaction, self.index - 1)
+
+    @discord.ui.button(label="1/1", style=discord.ButtonStyle.grey)
+    async def jump(self, interaction: Interaction, button: discord.ui.Button):
+        await interaction.response.send_modal(_JumpToPageModal(self))
 
     @discord.ui.button(label="Next ⏩", style=discord.ButtonStyle.grey)
     async def next(self, interaction: Interaction, button: discord.ui.Button):
-        if self.index < len(self.embeds) - 1:
-            self.index += 1
-            await interaction.response.edit_message(embed=self.embeds[self.index], view=self)
+        if self.index < len(self.pages) - 1:
+            await self.show(interaction, self.index + 1)
+
+    @discord.ui.button(label="📍 Find me", style=discord.ButtonStyle.blurple)
+    async def find_me(self, interaction: Interaction, button: discord.ui.Button):
+        found = await self.pages.locate(interaction.user.id)
+        if isinstance(found, str):
+            await interaction.response.send_message(found, ephemeral=True)
+        else:
+            await self.show(interaction, found)
+
+# --- Command tracing (N+1 detector) ---
+
+class InstrumentedCommandTree(app_commands.CommandTree):
+    """
+    Command tree that opens a CommandTrace for every slash command invocation.
+    SQL statements and REST calls made while the command runs are counted into it;
+    the trace is closed on completion or error (see install_command_tracing).
+    """
+
+    async def interaction_check(self, interaction: Interaction) -> bool:
+        if sql_profiler.trace_commands and interaction.type is discord.InteractionType.application_command:
+            name = (interaction.data or {}).get("name", "?")
+            interaction.extras["trace"] = start_trace(name)
+        return True
+
+    async def on_error(self, interaction: Interaction, error: app_commands.AppCommandError):
+        trace = interaction.extras.get("trace")
+        if trace is not None:
+            finish_trace(trace, error)
+        await super().on_error(interaction, error)
+
+def _wrap_http(request):
+    async def traced_request(*args, **kwargs):
+        if current_trace() is None:
+            return await request(*args, **kwargs)
+        route = next((a for a in args if isinstance(a, discord.http.Route)), None)
+        start = time.perf_counter()
+        try:
+            return await request(*args, **kwargs)
+        finally:
+            label = f"{route.method} {route.path}" if route is not None else "?"
+            record_http(label, time.perf_counter() - start)
+    return traced_request
+
+def install_command_tracing(bot: commands.Bot):
+    """
+    Counts Discord REST calls into the active trace and closes traces of completed commands.
+    Interaction responses go through the webhook adapter rather than bot.http, so both are wrapped.
+    """
+    bot.http.request = _wrap_http(bot.http.request)
+    if not getattr(AsyncWebhookAdapter.request, "_traced", False):
+        AsyncWebhookAdapter.request = _wrap_http(AsyncWebhookAdapter.request)
+        AsyncWebhookAdapter.request._traced = True
+
+    async def on_app_command_completion(interaction: Interaction, command):
+        trace = interaction.extras.get("trace")
+        if trace is not None:
+            finish_trace(trace)
+
+    bot.add_listener(on_app_command_completion, "on_app_command_completion")
 
 def get_winrate_emoji(winrate: float) -> str:
     """Returns emoji based on win rate."""
@@ -78,47 +208,17 @@ async def send_embed_message(
     else:
         await interaction.response.send_message(embed=embed, ephemeral=ephemeral)
 
-async def resolve_display_data(character_name: str, guild: Optional[discord.Guild]) -> dict:
-    """
-    Returns display data for the character.
-    If guild is None, returns fallback data (no member lookup).
-    """
-    discord_id = get_discord_id_by_character(character_name)
-    if not discord_id or guild is None:
-        # no linked discord id OR no guild provided -> fallback
-        return {
-            "display_name": character_name,
-            "avatar_url": None,
-            "role": None,
-            "color": discord.Color.default()
-        }
-
-    # guild is provided and we have a discord_id
-    member = guild.get_member(discord_id)
-    if not member:
-        try:
-            member = await guild.fetch_member(discord_id)
-        except discord.NotFound:
-            logging.warning(f"User {discord_id} not found in guild.")
-            return {
-                "display_name": character_name,
-                "avatar_url": None,
-                "role": None,
-                "color": discord.Color.default()
-            }
-        except Exception as e:
-            logging.exception(f"Failed to fetch member {discord_id}: {e}")
-            return {
-                "display_name": character_name,
-                "avatar_url": None,
-                "role": None,
-                "color": discord.Color.default()
-            }
+def _fallback_display_data(character_name: str) -> dict:
+    return {
+        "display_name": character_name,
+        "avatar_url": None,
+        "role": None,
+        "color": discord.Color.default()
+    }
 
+def _member_display_data(member: discord.Member, configured_roles: list[str]) -> dict:
     # Use role color from PvP roles configured in DB
-    configured_roles = [name for _, name in get_all_rank_roles()]
     role = next((r for r in member.roles if r.name in configured_roles), None)
-
     return {
         "display_name": safe_display_name(member),
         "avatar_url": member.display_avatar.url if hasattr(member, "display_avatar") else None,
@@ -126,80 +226,138 @@ async def resolve_display_data(character_name: str, guild: Optional[discord.Guil
         "color": role.color if role else discord.Color.default()
     }
 
-async def generate_stats_embeds(
+async def _fetch_member(guild: discord.Guild, discord_id: int) -> tuple[Optional[discord.Member], bool]:
+    """
+    Member missing from the cache, from the API, and whether the answer may be cached: None and True
+    if they left the guild, None and False if the call failed.
+    """
+    try:
+        return await guild.fetch_member(discord_id), True
+    except discord.NotFound:
+        logging.warning(f"User {discord_id} not found in guild.")
+        return None, True
+    except Exception as e:
+        logging.exception(f"Failed to fetch member {discord_id}: {e}")
+    return None, False
+
+async def resolve_display_data(character_name: str, guild: Optional[discord.Guild]) -> dict:
+    """
+    Returns display data for the character.
+    If guild is None, returns fallback data (no member lookup).
+    """
+    if guild is None:
+        return _fallback_display_data(character_name)
+    return (await resolve_display_data_bulk([character_name], guild))[character_name]
+
+async def resolve_display_data_bulk(character_names: list[str], guild: Optional[discord.Guild]) -> dict[str, dict]:
+    """
+    resolve_display_data() for many characters. Answers come from display_cache where possible; for
+    the rest, one owner lookup and one read of the rank roles, and members missing from the client
+    cache are fetched concurrently, once per owner.
+    """
+    if guild is None:
+        return {name: _fallback_display_data(name) for name in character_names}
+
+    result = {}
+    for name in character_names:
+        cached = display_cache.get(guild.id, name)
+        if cached is not None:
+            result[name] = cached
+    todo = [name for name in dict.fromkeys(character_names) if name not in result]
+    if not todo:
+        return result
+
+    version = display_cache.version
+    owners = get_character_owners_bulk([name.lower() for name in todo])
+    members = {discord_id: guild.get_member(discord_id) for discord_id in set(owners.values()) if discord_id}
+    missing = [discord_id for discord_id, member in members.items() if member is None]
+    cacheable = dict.fromkeys(members, True)
+    if missing:
+        fetched = await asyncio.gather(*(_fetch_member(guild, d) for d in missing))
+        for discord_id, (member, ok) in zip(missing, fetched):
+            members[discord_id] = member
+            cacheable[discord_id] = ok
+
+    configured_roles = [name for _, name in get_all_rank_roles()] if any(members.values()) else []
+    for name in todo:
+        discord_id = owners[name.lower()]
+        member = members.get(discord_id) if discord_id else None
+        result[name] = _member_display_data(member, configured_roles) if member else _fallback_display_data(name)
+        if not discord_id or cacheable[discord_id]:
+            display_cache.put(guild.id, name, discord_id, result[name], version, negative=bool(discord_id and not member))
+    return result
+
+async def generate_stats_pages(
     interaction: discord.Interaction,
     characters: list[str],
     days: int,
     event_id: Optional[int] = None,
     avatar_url=None,
     target_user_id: Optional[int] = None
-):
+) -> Optional[LazyPages]:
+    """
+    /stats and /mystats pages: per-opponent results sorted by winrate, PAGE_SIZE opponents per page
+    followed by the summary, for the characters with fights in the event and window. The numbers
+    are read up front; display data only for the page shown.
+    """
     if not interaction.guild:
         await interaction.response.send_message("❌ This command must be used in a server (guild).", ephemeral=True)
         return
     guild = interaction.guild
 
+    # 📥 Everything the pages show, read once: fights per opponent, MMR, points
     since = datetime.now(timezone.utc) - timedelta(days=days)
-    with sqlite3.connect(get_db_path()) as conn:
-        c = conn.cursor()
-        victories = {}
-        defeats = {}
-        characters = [name.lower() for name in characters]
-        for character in characters:
-            # победы
-            c.execute("""
-                SELECT victim, COUNT(*) FROM frags
-                WHERE killer = ? AND timestamp >= ? AND (? IS NULL OR event_id = ?)
-                GROUP BY victim
-            """, (character, since, event_id, event_id))
-            for victim, count in c.fetchall():
-                victories[victim] = victories.get(victim, 0) + count
-
-            # поражения
-            c.execute("""
-                SELECT killer, COUNT(*) FROM frags
-                WHERE victim = ? AND timestamp >= ? AND (? IS NULL OR event_id = ?)
-                GROUP BY killer
-            """, (character, since, event_id, event_id))
-            for killer, count in c.fetchall():
-                defeats[killer] = defeats.get(killer, 0) + count
+    fights = get_fight_stats_bulk(characters, since, event_id)
+    characters = [name.lower() for name in characters if fights[name][2] > 0]
+    if not characters:
+        return LazyPages(0, None)
+    opponents = get_opponent_stats_bulk(characters, since, event_id)
+
+    chars = get_user_characters(target_user_id) if target_user_id else characters
+    mmrs = [rating for rating, _, _, _ in get_glicko_ratings_bulk(chars, event_id).values()]
+    manual = sum(m for m, _ in get_win_sources_bulk(characters, event_id).values())
+
+    event_name = "arena"
+    if event_id:
+        try:
+            with get_connection() as conn:
+                row = conn.execute("SELECT name FROM events WHERE id = ?", (event_id,)).fetchone()
+                if row:
+                    event_name = row[0]
+        except Exception:
+            pass
 
     # 📊 Stats computation
-    all_opponents = set(victories) | set(defeats)
     stats = []
-    for opponent in all_opponents:
-        wins = victories.get(opponent, 0)
-        losses = defeats.get(opponent, 0)
+    for opponent, (wins, losses) in opponents.items():
         total = wins + losses
         winlos = wins / losses if losses > 0 else wins
         winrate = (wins / total) * 100 if total else 0
         stats.append((opponent, wins, losses, winlos, winrate))
 
-    stats.sort(key=itemgetter(4))  # by winrate
+    stats.sort(key=itemgetter(4, 0))  # by winrate
 
-    total_wins = sum(victories.values())
-    total_losses = sum(defeats.values())
+    total_wins = sum(wins for _, wins, _, _, _ in stats)
+    total_losses = sum(losses for _, _, losses, _, _ in stats)
     total_matches = total_wins + total_losses
     overall_winlos = total_wins / total_losses if total_losses > 0 else total_wins
     overall_winrate = (total_wins / total_matches) * 100 if total_matches else 0
     emoji_summary = get_winrate_emoji(overall_winrate)
 
-    page_size = 10
-    embeds = []
-    for start in range(0, len(stats), page_size):
-        # Get event name for display
-        event_name = "arena"
-        if event_id:
-            try:
-                # Get event name by querying the database
-                with sqlite3.connect(get_db_path()) as conn:
-                    c = conn.cursor()
-                    c.execute("SELECT name FROM events WHERE id = ?", (event_id,))
-                    row = c.fetchone()
-                    if row:
-                        event_name = row[0]
-            except Exception:
-                pass
+    avg_mmr = round(sum(mmrs) / len(mmrs)) if mmrs else None
+    mmr_line = f"`{avg_mmr}`\n" if avg_mmr is not None else ""
+
+    summary = (
+        f"Total Wins: `{total_wins}`\n"
+        f"Total Losses: `{total_losses}`\n"
+        f"Overall Winlos: `{overall_winlos:.1f}`\n"
+        f"Overall Winrate: {emoji_summary} `{overall_winrate:.1f}%`\n"
+        f"MMR: {mmr_line}"
+    )
+
+    async def render(page: int) -> discord.Embed:
+        rows = stats[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]
+        display = await resolve_display_data_bulk([opponent for opponent, *_ in rows], guild)
 
         embed = discord.Embed(color=discord.Color.blue())
         embed.set_author(
@@ -207,76 +365,62 @@ async def generate_stats_embeds(
             icon_url=avatar_url if avatar_url else None
         )
 
-        for opponent, wins, losses, winlos, winrate in sorted(stats[start:start + page_size], key=itemgetter(4), reverse=False):
-            display_data = await resolve_display_data(opponent, guild)
+        for opponent, wins, losses, winlos, winrate in rows:
             emoji = get_winrate_emoji(winrate)
             embed.add_field(
-                name=f"{emoji} **{display_data['display_name'].upper()}**",
+                name=f"{emoji} **{display[opponent]['display_name'].upper()}**",
                 value=f"Wins: `{wins}`\tLosses: `{losses}`\nWinlos: `{winlos:.1f}`\tWinrate: `{winrate:.1f}%`",
                 inline=False
             )
 
-        chars = get_user_characters(target_user_id) if target_user_id else characters
-
-        mmrs = []
-        for c in chars:
-            glicko_data = get_glicko_rating_extended(c, event_id)
-            if glicko_data:
-                mmrs.append(glicko_data[0])
-
-        avg_mmr = round(sum(mmrs) / len(mmrs)) if mmrs else None
-        mmr_line = f"`{avg_mmr}`\n" if avg_mmr is not None else ""
-
-        summary = (
-            f"Total Wins: `{total_wins}`\n"
-            f"Total Losses: `{total_losses}`\n"
-            f"Overall Winlos: `{overall_winlos:.1f}`\n"
-            f"Overall Winrate: {emoji_summary} `{overall_winrate:.1f}%`\n"
-            f"MMR: {mmr_line}"
-        )
-
         embed.add_field(name="**🔍 SUMMARY: **", value=summary, inline=False)
 
-        # 🧮 Aggregate manual points
-        manual = 0
-        natural = 0
-        for char in characters:
-            m, n = get_win_sources(char, event_id=event_id)
-            manual += m
-            natural += n
-
         # 🏁 Add final points summary
         embed.add_field(
             name=f"\n**🏅 TOTAL POINTS: **`{total_wins + manual}`",
             value=f"Frags: `{total_wins}`\nExtra: `{manual}`",
             inline=False
         )
-
-        embeds.append(embed)
-
-    return embeds
-
-async def generate_topmmr_embeds(interaction: Interaction, leaderboard_data: list, public: bool = False, details: bool = False, event_name: str = "arena"):
+        return embed
+
+    async def locate(user_id: int) -> int | str:
+        # the page with the first of the user's characters among the opponents
+        own = set(get_user_characters(user_id))
+        for i, (opponent, *_) in enumerate(stats):
+            if opponent in own:
+                return i // PAGE_SIZE
+        return "📍 None of your characters fought them in this period."
+
+    return LazyPages(page_count(len(stats)), render, locate)
+
+def generate_topmmr_pages(
+    leaderboard_data: list,
+    details: bool = False,
+    event_name: str = "arena",
+    rating_label: str = "MMR",
+    title: Optional[str] = None,
+    locate: Optional[Callable[[int], Awaitable[int | str]]] = None
+) -> LazyPages:
     """
     leaderboard_data: list of tuples
     [(display_name, avatar_url, characters, mmr, fights, wins, losses, winrate, recent_days),...]
+    rating_label names the rating system (MMR is Glicko-2).
     """
-    embeds = []
     medals = {1: "🥇", 2: "🥈", 3: "🥉"}
 
-    author_text = f"🏆 Top MMR - Event: {event_name}"
+    author_text = f"🏆 Top {rating_label} - Event: {event_name}"
     color = discord.Color.gold()
 
-    page_size = 10
-    for start in range(0, len(leaderboard_data), page_size):
-        embed = discord.Embed(color=color)
+    async def render(page: int) -> discord.Embed:
+        start = page * PAGE_SIZE
+        embed = discord.Embed(color=color, title=title)
         embed.set_author(name=author_text)
 
         if leaderboard_data[start][1]:
             embed.set_thumbnail(url=leaderboard_data[start][1])
 
         for j, (name, avatar_url, chars, mmr, fights, wins, losses, winrate, recent_days) in enumerate(
-            leaderboard_data[start:start+page_size]
+            leaderboard_data[start:start + PAGE_SIZE]
         ):
             i = start + j + 1
             char_text = ", ".join(chars)
@@ -294,7 +438,7 @@ async def generate_topmmr_embeds(interaction: Interaction, leaderboard_data: lis
             if details:
                 value = (
                     f"`{char_text}`\n"
-                    f"⚔️ `MMR: {round(mmr)}`\n"
+                    f"⚔️ `{rating_label}: {round(mmr)}`\n"
                     f"Fights: `{fights}`\n"
                     f"Win/Los: `{winlos}`\n"
                     f"Winrate: `{winrate_str}`\n"
@@ -311,7 +455,6 @@ async def generate_topmmr_embeds(interaction: Interaction, leaderboard_data: lis
                 value=value,
                 inline=False
             )
+        return embed
 
-        embeds.append(embed)
-
-    return embeds
+    return LazyPages(page_count(len(leaderboard_data)), render, locate)